@@ -1,3 +1,4 @@
 source /opt/envs/klamu/bin/activate
 # flask run &
-exec gunicorn -b :8006 --access-logfile - --error-logfile - fromflask:app &
+# Workers, worker class, threads, preload and max requests are set in gunicorn.conf.py.
+exec gunicorn -c gunicorn.conf.py fromflask:app &
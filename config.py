@@ -13,6 +13,8 @@ class Config(object):
     SECRET_KEY = os.urandom(24)
     LOGDIR = os.environ["LOGDIR"]
     LOGLEVEL = os.environ["LOGLEVEL"]
+    # Write the logfile as JSON lines, with request id, route, duration and SQL count, see klamu.lib.logcontext.
+    LOG_JSON = os.environ.get("LOG_JSON", "").lower() in ("1", "true", "yes")
 
     # SQL Config
     SQLALCHEMY_DATABASE_URI = os.environ["SQLALCHEMY_DATABASE_URI"]
@@ -23,6 +25,85 @@ class Config(object):
     # errors in the log: https://help.pythonanywhere.com/pages/UsingSQLAlchemywithMySQL (from: PythonAnywhere -
     # some tips for specific web frameworks: Flask
     SQLALCHEMY_POOL_RECYCLE = 280
+    # Read replica for the GET requests, e.g. a copy of the database file that is refreshed periodically:
+    # sqlite:///file:/data/klamu-replica.db?mode=ro&uri=true. See klamu.lib.replica.
+    if os.environ.get("SQLALCHEMY_REPLICA_URI"):
+        SQLALCHEMY_BINDS = {'replica': os.environ["SQLALCHEMY_REPLICA_URI"]}
+    # Seconds after an edit that the GET requests of the user read from the primary database.
+    READ_YOUR_WRITES = 30
+    # Pragmas for every new SQLite connection, see klamu.lib.sqlite. A value None leaves the SQLite default.
+    # WAL lets readers continue while a gunicorn worker writes, synchronous NORMAL is safe in WAL mode. Cache size is
+    # in KiB when negative, mmap size in bytes, busy timeout in milliseconds.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -20000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY'
+    }
+
+    # Request instrumentation: Server-Timing header and a log line per request, see klamu.lib.instrument.
+    SQL_INSTRUMENT = True
+    # An identical statement executed more than SQL_REPEAT_LIMIT times in one request is reported as N+1 pattern.
+    SQL_REPEAT_LIMIT = 10
+    # Raise NPlusOneError on an N+1 pattern instead of a warning in the log.
+    SQL_STRICT = False
+    # Metrics in Prometheus text format on /metrics, see klamu.lib.metrics. With gunicorn set METRICS_DIR to a directory
+    # for all workers, every worker writes its metrics in the directory at most every METRICS_FLUSH seconds.
+    METRICS = True
+    METRICS_DIR = os.environ.get("METRICS_DIR")
+    METRICS_FLUSH = 1
+    # Maximum duration in seconds of the database query of the readiness probe on /ready.
+    READY_TIMEOUT = 1
+
+    # Templates: directory for the compiled templates, shared by all workers, see klamu.lib.jinja. Set
+    # JINJA_PRECOMPILE to load all templates when the application is created instead of on the first request.
+    JINJA_CACHE_DIR = os.environ.get("JINJA_CACHE_DIR")
+    JINJA_PRECOMPILE = True
+
+    # Fill the connection pool and the caches when the application is created, see klamu.lib.warmup. Not needed with
+    # gunicorn.conf.py, the workers warm up after the fork. WARMUP_CONNECTIONS is the number of connections per engine.
+    WARMUP = os.environ.get("WARMUP", "").lower() in ("1", "true", "yes")
+    WARMUP_CONNECTIONS = 1
+
+    # Lists
+    # Set DATATABLES_SERVER_SIDE to False to render all rows of a list in the page instead of paging on the server.
+    DATATABLES_SERVER_SIDE = True
+    # List pages that are streamed to the browser while the rows are collected, by endpoint. Only used if the rows
+    # are rendered in the page (DATATABLES_SERVER_SIDE False).
+    STREAM_ROUTES = [
+        'main.show_cds',
+        'main.show_dirigent',
+        'main.show_dirigenten',
+        'main.show_komponist',
+        'main.show_komponisten',
+        'main.show_kompositie',
+        'main.show_komposities',
+        'main.show_uitgevers',
+        'main.show_uitvoerders',
+        'main.show_uitvoerders_uitvoeringen',
+        'main.show_uitvoeringen'
+    ]
+    # Number of rows fetched from the database per chunk, and number of template fragments sent per chunk.
+    STREAM_ROWS = 500
+    STREAM_BUFFER = 100
+    # Maximum number of komposities in one response of the kompositie lookup, if no komponist is selected.
+    KOMPOSITIE_LOOKUP_LIMIT = 500
+    # Number of empty rows for new uitvoeringen in the tracklist editor, request argument nieuw overrides this.
+    TRACKLIST_NEW_ROWS = 3
+    # Duplicate finder page: number of processes for the scoring and maximum number of pairs.
+    DUPLICATE_WORKERS = 1
+    DUPLICATE_LIMIT = 500
+
+    # Page cache for anonymous visitors
+    # Maximum number of pages in the cache, 0 to disable the cache.
+    PAGE_CACHE_SIZE = 500
+    # Time to live in seconds per endpoint, default for endpoints that are not listed. 0 to not cache the endpoint.
+    PAGE_CACHE_TTL = {
+        'default': 300,
+        'main.search': 60
+    }
 
     if os.environ.get("WTF_CSR_ENABLED"):
         WTF_CSRF_ENABLED = os.environ["WTF_CSR_ENABLED"]
@@ -32,3 +113,8 @@ class Config(object):
 
 class TestConfig(Config):
     TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    # The tests create many applications, templates are compiled when a test needs them.
+    JINJA_PRECOMPILE = False
+    PAGE_CACHE_SIZE = 0
+    SQL_STRICT = True
@@ -0,0 +1,50 @@
+"""
+Gunicorn configuration for klamu: gunicorn -c gunicorn.conf.py fromflask:app
+
+The settings are read from the environment, the defaults are the settings of boot.sh. With GUNICORN_PRELOAD the
+application is created once in the master process, so templates are compiled once and the workers start fast. Every
+worker drops the database connections of the master after the fork, then fills its connection pool and caches before
+it accepts requests, see klamu.lib.warmup. Workers are restarted after max_requests requests, with a random jitter so
+they do not restart at the same time.
+"""
+
+import os
+
+
+def env_bool(name, default):
+    return os.environ.get(name, default).lower() in ("1", "true", "yes")
+
+
+bind = os.environ.get("GUNICORN_BIND", ":8006")
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+# sync handles one request per worker, gthread handles GUNICORN_THREADS requests per worker.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+preload_app = env_bool("GUNICORN_PRELOAD", "true")
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+errorlog = os.environ.get("GUNICORN_ERRORLOG", "-")
+
+
+def on_starting(server):
+    # Metrics files of the workers of a previous run.
+    directory = os.environ.get("METRICS_DIR")
+    if directory and os.path.isdir(directory):
+        from klamu.lib import metrics
+        metrics.clear(directory)
+
+
+def post_fork(server, worker):
+    # The connections of a preloaded application belong to the master.
+    if server.cfg.preload_app:
+        from klamu.lib import warmup
+        warmup.dispose(worker.app.wsgi())
+
+
+def post_worker_init(worker):
+    # Runs in the worker after the application is loaded, before the worker accepts requests.
+    from klamu.lib import warmup
+    result = warmup.warm(worker.wsgi, connections=worker.cfg.threads)
+    worker.log.info(f"Worker {worker.pid} warmed up in {result['seconds']} seconds")
@@ -3,10 +3,11 @@ from flask import Flask
 from flask_bootstrap import Bootstrap
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from klamu.lib import my_env
+from klamu.lib import instrument, jinja, logcontext, metrics, my_env, replica, sqlite
 
 bootstrap = Bootstrap()
-db = SQLAlchemy()
+# The session sends the reads of GET requests to the read replica, if configured.
+db = SQLAlchemy(session_options={'class_': replica.RoutingSession})
 lm = LoginManager()
 lm.login_view = 'main.login'
 
@@ -24,16 +25,24 @@ def create_app(config_class=Config):
     # import configuration
     app.config.from_object(config_class)
 
-    # Configure Logger, except for Test
+    # Configure Logger, except for Test. The application logger writes through the handlers of the root logger.
     if not app.testing:
-        hdl = my_env.init_loghandler(__name__)
-        app.logger.addHandler(hdl)
+        my_env.init_loghandler(__name__, json_lines=app.config.get('LOG_JSON'),
+                               filters=[logcontext.RequestFilter()])
 
     app.logger.info("Start Application")
 
     # initialize extensions
     bootstrap.init_app(app)
     db.init_app(app)
+    logcontext.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            sqlite.configure(engine, app.config.get('SQLITE_PRAGMAS'))
+        instrument.init_app(app, db.engines.values())
+    sqlite.init_app(app)
+    metrics.init_app(app)
+    replica.init_app(app)
     lm.init_app(app)
 
     # import blueprints
@@ -44,5 +53,11 @@ def create_app(config_class=Config):
     # add Jinja Filters
     app.jinja_env.filters['datestamp'] = my_env.datestamp
     app.jinja_env.filters['datetimestamp'] = my_env.datetimestamp
+    jinja.init_app(app)
+
+    # Warm up for servers without a warmup hook, gunicorn warms up every worker after the fork, see gunicorn.conf.py.
+    if app.config.get('WARMUP'):
+        from klamu.lib import warmup
+        warmup.warm(app)
 
     return app
@@ -0,0 +1,428 @@
+"""
+This module measures the pages and the main database functions of klamu on a synthetic catalog, see
+klamu.lib.synthetic. For every page and function the median and the 95th percentile of the duration, the number of SQL
+statements and the peak memory are measured. The results can be saved as baseline. Results that are slower than the
+baseline by more than the tolerance, or that need more statements, are reported as regression.
+The benchmark runs in its own application on its own database file, the configured database is not used. Pages are
+requested with the test client by a logged in user, so the page cache is not used. The templates are measured as in a
+new process: compiling all templates, without and with the bytecode cache, and the import of the macros.
+"""
+
+import os
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+import weakref
+from config import Config
+from flask import url_for
+from jinja2 import FileSystemBytecodeCache
+from klamu import create_app, db
+from klamu.lib import db_model as ds, duplicates, export, jinja, migrations, search, synthetic
+from sqlalchemy import event, func, inspect, select, text
+
+# Pages with the function that returns the url arguments for the sample records. Every GET endpoint of the application
+# is in ROUTES or in SKIP, see function unlisted.
+ROUTES = [
+    ('main.index', lambda ids: {}),
+    ('main.login', lambda ids: {}),
+    ('main.pwd_update', lambda ids: {}),
+    ('main.show_cd', lambda ids: dict(nid=ids['cd'])),
+    ('main.show_cds', lambda ids: {}),
+    ('main.show_cds', lambda ids: dict(nid=ids['uitgever'])),
+    ('main.show_dirigent', lambda ids: dict(nid=ids['dirigent'])),
+    ('main.show_dirigenten', lambda ids: {}),
+    ('main.show_komponist', lambda ids: dict(nid=ids['komponist'])),
+    ('main.show_komponisten', lambda ids: {}),
+    ('main.show_kompositie', lambda ids: dict(nid=ids['kompositie'])),
+    ('main.show_komposities', lambda ids: {}),
+    ('main.show_uitgevers', lambda ids: {}),
+    ('main.show_uitvoerders_uitvoeringen', lambda ids: dict(nid=ids['uitvoerders'])),
+    ('main.show_uitvoerders', lambda ids: {}),
+    ('main.show_uitvoeringen', lambda ids: {}),
+    ('main.table_cds', lambda ids: dict(draw=1, start=0, length=50)),
+    ('main.table_dirigenten', lambda ids: dict(draw=1, start=0, length=50)),
+    ('main.table_komponisten', lambda ids: dict(draw=1, start=0, length=50)),
+    ('main.table_komposities', lambda ids: dict(draw=1, start=0, length=50)),
+    ('main.table_uitgevers', lambda ids: dict(draw=1, start=0, length=50)),
+    ('main.table_uitvoerders', lambda ids: dict(draw=1, start=0, length=50)),
+    ('main.table_uitvoeringen', lambda ids: dict(draw=1, start=0, length=50)),
+    ('main.table_uitvoeringen', lambda ids: {'draw': 1, 'start': 1000, 'length': 50, 'order[0][column]': 1,
+                                             'order[0][dir]': 'desc', 'search[value]': 'symfonie'}),
+    ('main.table_uitvoeringen', lambda ids: dict(draw=1, start=0, length=50, komponist=ids['komponist'])),
+    ('main.kompositie_lookup', lambda ids: dict(komponist=ids['komponist'])),
+    ('main.kompositie_lookup', lambda ids: {}),
+    ('main.search', lambda ids: dict(search='symfonie')),
+    ('main.export_uitvoeringen', lambda ids: dict(fmt='csv', komponist=ids['komponist'])),
+    ('main.export_uitvoeringen', lambda ids: dict(fmt='jsonl', komponist=ids['komponist'])),
+    ('main.export_uitvoeringen', lambda ids: dict(fmt='xlsx', komponist=ids['komponist'])),
+    ('main.update_cd', lambda ids: dict(nid=ids['cd'])),
+    ('main.update_dirigent', lambda ids: dict(nid=ids['dirigent'])),
+    ('main.update_komponist', lambda ids: dict(nid=ids['komponist'])),
+    ('main.update_kompositie', lambda ids: dict(nid=ids['kompositie'])),
+    ('main.update_uitgever', lambda ids: dict(nid=ids['uitgever'])),
+    ('main.update_uitvoerders', lambda ids: dict(nid=ids['uitvoerders'])),
+    ('main.update_uitvoering', lambda ids: dict(nid=ids['uitvoering'])),
+    ('main.update_uitvoering', lambda ids: dict(cid=ids['cd'])),
+    ('main.update_tracklist', lambda ids: dict(nid=ids['cd'])),
+    ('main.import_tracklist', lambda ids: {}),
+    ('main.show_duplicates', lambda ids: dict(kind='komponist')),
+    ('main.merge', lambda ids: dict(kind='komponist', loser=ids['loser'], winner=ids['komponist'])),
+    ('main.cache_stats', lambda ids: {}),
+    ('main.database_stats', lambda ids: {}),
+    ('main.show_metrics', lambda ids: {}),
+    ('main.health', lambda ids: {}),
+    ('main.ready', lambda ids: {})
+]
+# GET endpoints that change the database or the login, these are not measured.
+SKIP = ['main.delete_cd', 'main.delete_dirigent', 'main.delete_komponist', 'main.delete_kompositie',
+        'main.delete_uitgever', 'main.delete_uitvoerders', 'main.delete_uitvoering', 'main.logout', 'static',
+        'bootstrap.static']
+
+# Database functions with the function that calls them for the sample records. Queries are fetched.
+HELPERS = [
+    ('get_cd_uitvoeringen', lambda ids: ds.get_cd_uitvoeringen(ids['cd'])),
+    ('get_dirigent_uitvoeringen', lambda ids: ds.get_dirigent_uitvoeringen(ids['dirigent']).all()),
+    ('get_komponist_uitvoeringen', lambda ids: ds.get_komponist_uitvoeringen(ids['komponist']).all()),
+    ('get_kompositie_uitvoeringen', lambda ids: ds.get_kompositie_uitvoeringen(ids['kompositie']).all()),
+    ('get_uitvoerders_uitvoeringen', lambda ids: ds.get_uitvoerders_uitvoeringen(ids['uitvoerders']).all()),
+    ('uitvoeringen_query', lambda ids: ds.uitvoeringen_query().all()),
+    ('cds_query', lambda ids: ds.cds_query().all()),
+    ('komposities_query', lambda ids: ds.komposities_query().all()),
+    ('get_kompositie_json', lambda ids: ds.get_kompositie_json(ids['komponist'])),
+    ('load_pairs komponist', lambda ids: ds.load_pairs('komponist')),
+    ('load_pairs kompositie', lambda ids: ds.load_pairs('kompositie', -1)),
+    ('rebuild_counters', lambda ids: ds.rebuild_counters()),
+    ('search', lambda ids: search.search('symfonie')),
+    ('export csv', lambda ids: sum(len(chunk) for chunk in export.export('csv'))),
+    ('duplicates komponist', lambda ids: duplicates.find('komponist')),
+    ('duplicates kompositie', lambda ids: duplicates.find('kompositie'))
+]
+
+# Template measurements with the function that is called in a request context of the application: compile all
+# templates without and with the bytecode cache, and a render that imports the macros with and without context.
+TEMPLATES = [
+    ('compile', lambda app: compile_templates(app, None)),
+    ('compile bytecode cache', lambda app: compile_templates(app, os.path.join(tempfile.gettempdir(),
+                                                                               'klamu_benchmark_jinja'))),
+    ('render macros with context', lambda app: render_macros(app, ' with context')),
+    ('render macros', lambda app: render_macros(app, ''))
+]
+
+# Compiled templates of function render_macros per Jinja environment.
+macro_templates = weakref.WeakKeyDictionary()
+
+# Name and password of the user that requests the pages. The user is created first in a new database, it marks the
+# database as created by the benchmark.
+USER = 'benchmark'
+PASSWORD = 'benchmark'
+
+
+class Counter:
+    """
+    This class counts the SQL statements of the engines.
+    """
+
+    def __init__(self):
+        self.cnt = 0
+
+    def __call__(self, *args, **kwargs):
+        self.cnt += 1
+
+
+def config(database):
+    """
+    This function returns the configuration for the benchmark application.
+
+    :param database: Path of the database file.
+    :return: Config class.
+    """
+    return type('BenchmarkConfig', (Config,), dict(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{database}",
+        SQLALCHEMY_BINDS={},
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        PAGE_CACHE_SIZE=0,
+        SQL_STRICT=False,
+        METRICS_DIR=None
+    ))
+
+
+def database_path(uitvoeringen, seed):
+    """
+    This function returns the default database file for a catalog size and seed. The file is kept, so the next
+    benchmark with the same catalog does not generate it again.
+    """
+    return os.path.join(tempfile.gettempdir(), f"klamu_benchmark_{uitvoeringen}_{seed}.db")
+
+
+def owned():
+    """
+    This function checks if the database can be used by the benchmark: the database is empty, or the benchmark created
+    it. A database of the benchmark has the benchmark user.
+
+    :return: True if the database is empty or has the benchmark user.
+    """
+    inspector = inspect(db.session.connection())
+    tables = [table for table in inspector.get_table_names() if not table.startswith('sqlite_')]
+    if not tables:
+        return True
+    if 'users' in tables and db.session.execute(text("SELECT 1 FROM users WHERE username = :name"),
+                                                dict(name=USER)).first():
+        return True
+    return not any(db.session.execute(text(f"SELECT 1 FROM {table} LIMIT 1")).first() for table in tables)
+
+
+def prepare(uitvoeringen, seed, force=False, report=print):
+    """
+    This function brings the database to the latest schema version, and creates the synthetic catalog and the user
+    unless the database has them. The catalog of a database that the benchmark created is replaced if it has another
+    number of uitvoeringen. A database with other data is not changed, unless force is set.
+
+    :param uitvoeringen: Number of uitvoeringen in the catalog.
+    :param seed: Seed of the catalog.
+    :param force: True to replace the catalog of a database that the benchmark did not create.
+    :param report: Function to report progress.
+    :return:
+    """
+    if not (force or owned()):
+        raise ValueError(f"De database {db.engine.url.database} is niet door de benchmark aangemaakt, gebruik --force "
+                         f"om de gegevens te vervangen.")
+    migrations.upgrade()
+    if ds.User.query.filter_by(username=USER).first() is None:
+        ds.User.register(USER, PASSWORD)
+    if db.session.execute(select(func.count()).select_from(ds.Uitvoering)).scalar() != uitvoeringen:
+        for model in reversed(synthetic.TABLES):
+            db.session.query(model).delete()
+        db.session.commit()
+        synthetic.generate(uitvoeringen, seed, report=report)
+    return
+
+
+def samples():
+    """
+    This function returns the sample record per table: the record with the most uitvoeringen, so the pages are
+    measured with the longest lists. The komponist with the fewest uitvoeringen is the loser for the merge page.
+
+    :return: Dictionary with table name and ID, and loser.
+    """
+    ids = {model.__tablename__: db.session.execute(select(model.id).order_by(model.items_cnt.desc(), model.id)
+                                                   .limit(1)).scalar()
+           for model in synthetic.TABLES[:-1]}
+    ids['uitvoering'] = db.session.execute(select(ds.Uitvoering.id).where(ds.Uitvoering.cd_id == ids['cd'])
+                                           .limit(1)).scalar()
+    ids['loser'] = db.session.execute(select(ds.Komponist.id).where(ds.Komponist.id != ids['komponist'])
+                                      .order_by(ds.Komponist.items_cnt, ds.Komponist.id).limit(1)).scalar()
+    return ids
+
+
+def measure(call, repeat, counter):
+    """
+    This function measures a call: the duration of repeat calls after one call to warm up, then the statements and
+    the peak memory of one more call. Memory is traced in a separate call, because tracing slows down the call.
+
+    :param call: Function to measure. It returns an error text, or None if the call is fine.
+    :param repeat: Number of timed calls.
+    :param counter: Statement counter of the engines.
+    :return: Dictionary with median and 95th percentile in milliseconds, statements, peak memory in KiB and error.
+    """
+    error = call()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - start) * 1000)
+    counter.cnt = 0
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dict(
+        ms=round(statistics.median(times), 3),
+        p95_ms=round(statistics.quantiles(times, n=20)[-1] if len(times) > 1 else times[0], 3),
+        statements=counter.cnt,
+        peak_kb=round(peak / 1024, 1),
+        error=error
+    )
+
+
+def page(client, url):
+    """
+    This function returns the call that requests a page and reads the complete response.
+    """
+    def call():
+        response = client.get(url)
+        response.get_data()
+        response.close()
+        return None if response.status_code < 400 else f"status {response.status_code}"
+    return call
+
+
+def helper(app, function, ids):
+    """
+    This function returns the call for a database function. Changes by the function are rolled back.
+    """
+    def call():
+        with app.app_context():
+            try:
+                function(ids)
+            finally:
+                db.session.rollback()
+    return call
+
+
+def compile_templates(app, directory):
+    """
+    This function compiles all templates as in a new process: the templates that are loaded are removed. With a
+    bytecode cache directory the compiled code is loaded from the cache, the first call fills the cache.
+
+    :param app: Flask application.
+    :param directory: Bytecode cache directory, None for no cache.
+    :return:
+    """
+    env = app.jinja_env
+    previous = env.bytecode_cache
+    env.bytecode_cache = FileSystemBytecodeCache(directory) if directory else None
+    try:
+        env.cache.clear()
+        jinja.precompile(app)
+    finally:
+        env.bytecode_cache = previous
+    return
+
+
+def render_macros(app, context):
+    """
+    This function renders a template that imports the macros and calls one macro. The template is compiled once, so
+    the render measures the import of the macros.
+
+    :param app: Flask application.
+    :param context: ' with context' for an import with context, empty string for an import without context.
+    :return: Output of the template.
+    """
+    compiled = macro_templates.setdefault(app.jinja_env, {})
+    if context not in compiled:
+        compiled[context] = app.jinja_env.from_string(
+            f'{{% import "macros.html" as macros{context} %}}{{{{ macros.table_foot() }}}}')
+    return compiled[context].render()
+
+
+def template(app, function):
+    """
+    This function returns the call for a template measurement.
+    """
+    def call():
+        with app.test_request_context():
+            function(app)
+    return call
+
+
+def unlisted(app):
+    """
+    This function returns the GET endpoints of the application that are not in ROUTES and not in SKIP, so a new page
+    is not forgotten in the benchmark.
+
+    :param app: Flask application.
+    :return: Sorted list of endpoints.
+    """
+    listed = {endpoint for endpoint, _ in ROUTES} | set(SKIP)
+    return sorted({rule.endpoint for rule in app.url_map.iter_rules() if 'GET' in rule.methods} - listed)
+
+
+def run(uitvoeringen, seed=1, repeat=10, database=None, pages=True, helpers=True, templates=True, force=False,
+        report=print):
+    """
+    This function runs the benchmark.
+
+    :param uitvoeringen: Number of uitvoeringen in the synthetic catalog.
+    :param seed: Seed of the synthetic catalog.
+    :param repeat: Number of timed calls per page or function.
+    :param database: Path of the database file, default a file in the temporary directory per catalog.
+    :param pages: True to measure the pages.
+    :param helpers: True to measure the database functions.
+    :param templates: True to measure the compilation of the templates and the import of the macros.
+    :param force: True to replace the data of a database that the benchmark did not create.
+    :param report: Function to report progress.
+    :return: Dictionary with the settings and the results per page or function.
+    """
+    app = create_app(config(database or database_path(uitvoeringen, seed)))
+    with app.app_context():
+        prepare(uitvoeringen, seed, force=force, report=report)
+        ids = samples()
+        engines = list(db.engines.values())
+        db.session.remove()
+    with app.test_request_context():
+        urls = [url_for(endpoint, **args(ids)) for endpoint, args in ROUTES]
+    # Every call runs in its own application context, so every call has a new session like a request.
+    calls = []
+    if pages:
+        client = app.test_client()
+        # The update pages return to the referring page, like from a browser.
+        client.environ_base['HTTP_REFERER'] = 'http://localhost/'
+        client.post('/login', data=dict(username=USER, password=PASSWORD))
+        calls += [(f"GET {url}", page(client, url)) for url in urls]
+    if helpers:
+        calls += [(f"db {name}", helper(app, function, ids)) for name, function in HELPERS]
+    if templates:
+        os.makedirs(os.path.join(tempfile.gettempdir(), 'klamu_benchmark_jinja'), exist_ok=True)
+        calls += [(f"tpl {name}", template(app, function)) for name, function in TEMPLATES]
+    counter = Counter()
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', counter)
+    results = {}
+    try:
+        for name, call in calls:
+            results[name] = measure(call, repeat, counter)
+            report(line(name, results[name]))
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', counter)
+    return dict(
+        uitvoeringen=uitvoeringen,
+        seed=seed,
+        repeat=repeat,
+        python=platform.python_version(),
+        sqlite=sqlite3.sqlite_version,
+        unlisted=unlisted(app),
+        results=results
+    )
+
+
+def line(name, result):
+    """
+    This function returns the report line for a result.
+    """
+    text = f"{result['ms']:10.2f} ms {result['p95_ms']:10.2f} ms p95 {result['statements']:6d} stmts " \
+           f"{result['peak_kb']:10.1f} KiB  {name}"
+    return f"{text}  ({result['error']})" if result.get('error') else text
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    This function compares the results with the baseline.
+
+    :param results: Results of a benchmark run.
+    :param baseline: Results of an earlier run.
+    :param tolerance: Fraction that a result can be slower than the baseline without regression.
+    :return: List of dictionaries with name, ms, baseline ms, ratio, statements, baseline statements and status:
+    regression, faster, same or new.
+    """
+    rows = []
+    for name, result in results['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            rows.append(dict(name=name, ms=result['ms'], base_ms=None, ratio=None, statements=result['statements'],
+                             base_statements=None, status='new'))
+            continue
+        ratio = result['ms'] / base['ms'] if base['ms'] else 1
+        if ratio > 1 + tolerance or result['statements'] > base['statements']:
+            status = 'regression'
+        elif ratio < 1 / (1 + tolerance):
+            status = 'faster'
+        else:
+            status = 'same'
+        rows.append(dict(name=name, ms=result['ms'], base_ms=base['ms'], ratio=round(ratio, 2),
+                         statements=result['statements'], base_statements=base['statements'], status=status))
+    return rows
@@ -0,0 +1,208 @@
+"""
+This module caches the choice lists for the select fields on the uitvoering form: komponisten, komposities per
+komponist (or all komposities), uitvoerders and dirigenten. For each list the (id, label) pairs and the rendered
+option html are kept. The cache is invalidated by the update() and delete() methods of the models.
+Every gunicorn worker has its own cache, and a worker only invalidates its own cache. Each list is therefore kept with
+the data version of its table, see klamu.lib.db_model.get_versions, and a list with another data version is loaded
+again, so a change by another worker is seen on the next request.
+"""
+
+import threading
+from collections import OrderedDict
+from markupsafe import Markup
+
+# Maximum number of results per choice list in the memo, see ChoiceCache.memo.
+MEMO_SIZE = 20
+
+
+def option(value, label):
+    """
+    This function returns the html for one option of a select field.
+
+    :param value: Value of the option.
+    :param label: Label of the option.
+    :return: Option html.
+    """
+    return Markup('<option value="{value}">{label}</option>').format(value=value, label=label)
+
+
+class ChoiceCache:
+    """
+    This class handles the choice list cache. A choice list is identified by kind (komponist, kompositie, uitvoerders,
+    dirigent) and komponist ID. Komponist ID is only used for kompositie lists, -1 is the list of all komposities.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = {}
+        self.misses = {}
+        self.stale = {}
+        # Number of invalidations per key and of clear() calls, to detect an invalidation during a load.
+        self.generations = {}
+        self.cleared = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(kind, komponist_id=None):
+        """
+        This method returns the cache key for a choice list.
+
+        :param kind: Kind of choice list.
+        :param komponist_id: ID of the komponist for a kompositie list.
+        :return: Cache key.
+        """
+        if kind == 'kompositie':
+            komponist_id = int(komponist_id)
+            return kind, komponist_id if komponist_id > 0 else -1
+        return kind, None
+
+    def get(self, key, loader, version=None):
+        """
+        This method returns the cache entry for a choice list. If the list is not in the cache, or the data version of
+        the list changed, it is collected with the loader function. The data version is read before the list is
+        loaded, so an entry never has a newer version than its pairs. The loaded list is not stored if the list was
+        invalidated or the data version changed during the load.
+
+        :param key: Cache key.
+        :param loader: Function that gets kind and komponist ID and returns the list of (id, label) pairs.
+        :param version: Function that gets kind and returns the data version of the table of the list, None to not
+        check the version.
+        :return: Cache entry, dictionary with pairs, version and html (None until the options are rendered).
+        """
+        kind = key[0]
+        current = version(kind) if version else None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry['version'] == current:
+                self.hits[kind] = self.hits.get(kind, 0) + 1
+                return entry
+            if entry:
+                self.stale[kind] = self.stale.get(kind, 0) + 1
+                del self.entries[key]
+            self.misses[kind] = self.misses.get(kind, 0) + 1
+            generation = (self.cleared, self.generations.get(key, 0))
+        entry = dict(pairs=tuple(loader(*key)), version=current, html=None)
+        if version and version(kind) != current:
+            return entry
+        with self.lock:
+            if generation == (self.cleared, self.generations.get(key, 0)):
+                self.entries[key] = entry
+        return entry
+
+    def pairs(self, kind, loader, komponist_id=None, version=None):
+        """
+        This method returns the (id, label) pairs for a choice list.
+
+        :param kind: Kind of choice list.
+        :param loader: Function to collect the pairs from the database.
+        :param komponist_id: ID of the komponist for a kompositie list.
+        :param version: Function that returns the data version of the list, see method get.
+        :return: New list of (id, label) pairs, the caller can modify the list.
+        """
+        return list(self.get(self.key(kind, komponist_id), loader, version)['pairs'])
+
+    def options(self, kind, loader, komponist_id=None, first=None, version=None):
+        """
+        This method returns the option html for a choice list.
+
+        :param kind: Kind of choice list.
+        :param loader: Function to collect the pairs from the database.
+        :param komponist_id: ID of the komponist for a kompositie list.
+        :param first: Optional (id, label) pair for the first option, e.g. (-1, '(kies komponist)').
+        :param version: Function that returns the data version of the list, see method get.
+        :return: Option html.
+        """
+        entry = self.get(self.key(kind, komponist_id), loader, version)
+        if entry['html'] is None:
+            entry['html'] = Markup('').join(option(value, label) for value, label in entry['pairs'])
+        if first:
+            return option(*first) + entry['html']
+        return entry['html']
+
+    def count(self, kind, loader, komponist_id=None, version=None):
+        """
+        This method returns the number of items in a choice list, e.g. to check a page number before a memo is made.
+
+        :param kind: Kind of choice list.
+        :param loader: Function to collect the pairs from the database.
+        :param komponist_id: ID of the komponist for a kompositie list.
+        :param version: Function that returns the data version of the list, see method get.
+        :return: Number of (id, label) pairs.
+        """
+        return len(self.get(self.key(kind, komponist_id), loader, version)['pairs'])
+
+    def memo(self, kind, loader, name, build, komponist_id=None, version=None):
+        """
+        This method returns a result that is derived from the pairs of a choice list, e.g. a json document. The result
+        is calculated once and kept with the choice list, so it is removed when the choice list is invalidated. At
+        most MEMO_SIZE results are kept per list, the least recently used result is removed first.
+
+        :param kind: Kind of choice list.
+        :param loader: Function to collect the pairs from the database.
+        :param name: Name of the result, unique for the choice list.
+        :param build: Function that gets the tuple of pairs and returns the result.
+        :param komponist_id: ID of the komponist for a kompositie list.
+        :param version: Function that returns the data version of the list, see method get.
+        :return: Result of the build function.
+        """
+        entry = self.get(self.key(kind, komponist_id), loader, version)
+        with self.lock:
+            memo = entry.setdefault('memo', OrderedDict())
+            if name in memo:
+                memo.move_to_end(name)
+                return memo[name]
+        result = build(entry['pairs'])
+        with self.lock:
+            memo[name] = result
+            while len(memo) > MEMO_SIZE:
+                memo.popitem(last=False)
+        return result
+
+    def invalidate(self, kind, *komponist_ids):
+        """
+        This method removes choice lists from the cache. For kind kompositie the lists of the komponisten and the list
+        of all komposities are removed. For the other kinds the list of the kind is removed.
+
+        :param kind: Kind of choice list.
+        :param komponist_ids: IDs of the komponisten with changed komposities.
+        :return:
+        """
+        if kind == 'kompositie':
+            keys = [self.key(kind, nid) for nid in komponist_ids if nid is not None] + [self.key(kind, -1)]
+        else:
+            keys = [self.key(kind)]
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+                self.generations[key] = self.generations.get(key, 0) + 1
+        return
+
+    def clear(self):
+        """
+        This method removes all choice lists from the cache.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.cleared += 1
+        return
+
+    def stats(self):
+        """
+        This method returns the cache statistics.
+
+        :return: Dictionary with entries, hits and misses in total and per kind. Misses include the stale lists, the
+        lists that were loaded again for a new data version.
+        """
+        with self.lock:
+            return dict(
+                entries=len(self.entries),
+                hits=sum(self.hits.values()),
+                misses=sum(self.misses.values()),
+                stale=sum(self.stale.values()),
+                kinds={kind: dict(hits=self.hits.get(kind, 0), misses=self.misses.get(kind, 0),
+                                  stale=self.stale.get(kind, 0))
+                       for kind in sorted(set(self.hits) | set(self.misses))}
+            )
+
+
+cache = ChoiceCache()
@@ -0,0 +1,149 @@
+"""
+This module handles conditional GET for the read-only pages. The ETag and Last-Modified of a page are calculated from
+the data versions of the tables that are shown on the page, see DataVersion in klamu.lib.db_model. A request with a
+matching If-None-Match or If-Modified-Since is answered with 304 Not Modified, before the view function is called.
+Pages for anonymous visitors are served from the page cache, see klamu.lib.pagecache.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from klamu.lib import db_model as ds, pagecache
+from werkzeug.http import is_resource_modified
+
+
+def page_etag(tables, versions):
+    """
+    This function returns the ETag for the current request. The page is different for every url, for every user, for
+    every data version of the tables on the page and for every version of the templates, see klamu.lib.jinja.
+
+    :param tables: Names of the tables that are shown on the page.
+    :param versions: Dictionary with table name and (version, modified), from get_versions().
+    :return: ETag string.
+    """
+    user = current_user.get_id() if current_user.is_authenticated else '-'
+    parts = [request.full_path, user, current_app.config.get('TEMPLATE_VERSION', '')] + \
+        [f"{table}:{versions.get(table, (0, None))[0]}" for table in tables]
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def last_modified(tables, versions):
+    """
+    This function returns the epoch of the last change in the tables.
+
+    :param tables: Names of the tables that are shown on the page.
+    :param versions: Dictionary with table name and (version, modified), from get_versions().
+    :return: Epoch of the last change, or None if the tables have no data version.
+    """
+    epochs = [versions[table][1] for table in tables if table in versions]
+    return max(epochs) if epochs else None
+
+
+def page_ttl(endpoint):
+    """
+    This function returns the time to live in the page cache for the endpoint.
+
+    :param endpoint: Endpoint of the page.
+    :return: Time to live in seconds, 0 if the page is not cached.
+    """
+    if current_app.config.get('PAGE_CACHE_SIZE', 0) <= 0:
+        return 0
+    ttl = current_app.config.get('PAGE_CACHE_TTL', {})
+    return ttl.get(endpoint, ttl.get('default', 0))
+
+
+def render_page(view, args, kwargs, tables, versions):
+    """
+    This function returns the response of the view function. For anonymous visitors the page is taken from the page
+    cache, or added to the page cache after rendering.
+
+    :param view: View function.
+    :param args: Positional arguments of the view function.
+    :param kwargs: Keyword arguments of the view function.
+    :param tables: Names of the tables that are shown on the page.
+    :param versions: Dictionary with table name and (version, modified), from get_versions().
+    :return: Response object.
+    """
+    ttl = 0 if current_user.is_authenticated else page_ttl(request.endpoint)
+    if ttl <= 0:
+        return make_response(view(*args, **kwargs))
+    page_versions = tuple(versions.get(table, (0, None))[0] for table in tables)
+    entry = pagecache.cache.get(request.endpoint, request.full_path, page_versions)
+    if entry:
+        return current_app.response_class(entry['data'], mimetype=entry['mimetype'])
+    resp = make_response(view(*args, **kwargs))
+    if resp.status_code != 200:
+        return resp
+    endpoint, url, size = request.endpoint, request.full_path, current_app.config['PAGE_CACHE_SIZE']
+
+    def store(data):
+        pagecache.cache.put(endpoint, url, page_versions, tables, data, resp.mimetype, ttl, size)
+
+    if resp.is_streamed:
+        resp.response = collect(resp.response, store)
+    else:
+        store(resp.get_data())
+    return resp
+
+
+def collect(chunks, store):
+    """
+    This function passes the chunks of a streamed page, and stores the page when the last chunk has been sent. A page
+    that is not sent completely is not stored.
+
+    :param chunks: Iterator over the chunks of the page.
+    :param store: Function that gets the complete page as bytes.
+    :return: Iterator over the chunks of the page.
+    """
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+        yield chunk
+    store(b''.join(parts))
+
+
+def set_headers(resp, etag, modified):
+    """
+    This function adds the validators and the cache control to the response. The browser needs to revalidate the page
+    on every visit, and the page is private because it depends on the user.
+
+    :param resp: Response object.
+    :param etag: ETag of the page.
+    :param modified: Datetime of the last change, or None.
+    :return: Response object.
+    """
+    resp.set_etag(etag, weak=True)
+    if modified:
+        resp.last_modified = modified
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    resp.vary.add('Cookie')
+    return resp
+
+
+def conditional(*tables):
+    """
+    Decorator for a read-only view function that sends ETag and Last-Modified headers, and answers a conditional
+    request with 304 Not Modified if none of the tables has changed. Pages with flashed messages are not handled,
+    the messages need to be shown once.
+
+    :param tables: Names of the tables that are shown on the page.
+    :return: Decorated view function.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if '_flashes' in session:
+                return view(*args, **kwargs)
+            versions = ds.get_versions()
+            etag = page_etag(tables, versions)
+            modified = last_modified(tables, versions)
+            if modified:
+                modified = datetime.fromtimestamp(modified, tz=timezone.utc)
+            if not is_resource_modified(request.environ, etag=etag, last_modified=modified):
+                return set_headers(make_response('', 304), etag, modified)
+            return set_headers(render_page(view, args, kwargs, tables, versions), etag, modified)
+        return wrapper
+    return decorator
@@ -0,0 +1,124 @@
+"""
+This module implements the DataTables server-side processing protocol (https://datatables.net/manual/server-side).
+The paging, sorting and filtering requested by the DataTable in the browser is translated into the SQL query, so only
+one page of rows is collected and rendered.
+"""
+
+from sqlalchemy import and_, func, or_
+
+# Maximum number of rows that will be returned for one draw, also if the client asks for all rows (length -1).
+MAX_LENGTH = 1000
+
+
+class Column:
+    """
+    This class describes one column of a server-side table.
+    """
+
+    def __init__(self, render, order=None, search=None):
+        """
+        Initialization of a table column.
+
+        :param render: Function that gets the row and returns the html content of the cell.
+        :param order: Column expression or list of column expressions to sort on. None if the column can't be sorted.
+        :param search: Column expression or list of column expressions to search in. None if the column is not
+        searchable.
+        """
+        self.render = render
+        self.order = as_list(order)
+        self.search = as_list(search)
+
+
+def as_list(exprs):
+    """
+    Function to return a column expression or list of column expressions as a list.
+
+    :param exprs: None, Column expression or list of column expressions.
+    :return: List of column expressions.
+    """
+    if exprs is None:
+        return []
+    elif isinstance(exprs, (list, tuple)):
+        return list(exprs)
+    else:
+        return [exprs]
+
+
+def get_int(args, key, default):
+    """
+    Function to return an integer request parameter.
+
+    :param args: Request arguments (request.args).
+    :param key: Name of the parameter.
+    :param default: Value to return if the parameter is not available or not an integer.
+    :return: Integer value of the parameter.
+    """
+    try:
+        return int(args.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def search_filter(exprs, value):
+    """
+    Function to return the filter condition for a search value. The value is split in words. Every word needs to
+    be found (case insensitive) in at least one of the column expressions.
+
+    :param exprs: List of column expressions to search in.
+    :param value: Search string.
+    :return: Filter condition or None if there is nothing to search for.
+    """
+    conditions = []
+    for word in value.lower().split():
+        word = word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append(or_(*[func.lower(expr).like(f"%{word}%", escape='\\') for expr in exprs]))
+    if conditions:
+        return and_(*conditions)
+    return None
+
+
+def process(query, columns, args):
+    """
+    Function to handle a DataTables server-side processing request on a query.
+
+    :param query: Query object with all rows of the table.
+    :param columns: List of Column objects, in the order of the table columns.
+    :param args: Request arguments (request.args) from the DataTable.
+    :return: Dictionary with the DataTables response: draw, recordsTotal, recordsFiltered and data.
+    """
+    draw = get_int(args, 'draw', 0)
+    start = max(get_int(args, 'start', 0), 0)
+    length = get_int(args, 'length', 10)
+    if length < 0 or length > MAX_LENGTH:
+        length = MAX_LENGTH
+    records_total = query.order_by(None).count()
+    # Global search on all searchable columns
+    searchable = [expr for column in columns for expr in column.search]
+    condition = search_filter(searchable, args.get('search[value]', ''))
+    if condition is not None:
+        query = query.filter(condition)
+    # Search per column
+    for pos, column in enumerate(columns):
+        value = args.get(f'columns[{pos}][search][value]', '')
+        if column.search and value:
+            query = query.filter(search_filter(column.search, value))
+    records_filtered = query.order_by(None).count()
+    # Sorting, in the order of the DataTable sort columns
+    order_by = []
+    cnt = 0
+    while f'order[{cnt}][column]' in args:
+        pos = get_int(args, f'order[{cnt}][column]', -1)
+        if 0 <= pos < len(columns):
+            desc = args.get(f'order[{cnt}][dir]') == 'desc'
+            order_by += [expr.desc() if desc else expr.asc() for expr in columns[pos].order]
+        cnt += 1
+    if order_by:
+        query = query.order_by(*order_by)
+    rows = query.offset(start).limit(length)
+    data = [[str(column.render(row)) for column in columns] for row in rows]
+    return dict(
+        draw=draw,
+        recordsTotal=records_total,
+        recordsFiltered=records_filtered,
+        data=data
+    )
@@ -1,14 +1,25 @@
 # import logging
+import hashlib
+import json
+import math
 import time
+from contextlib import contextmanager
+from config import Config
 from klamu import db, lm
 from flask import current_app
 from flask_login import UserMixin
+from klamu.lib import choices, pagecache, replica, search, sqlite
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import contains_eager, joinedload, sessionmaker
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 
+# Tables that are shown with an uitvoering. A change of an uitvoering changes the counters in the other tables.
+UITVOERING_TABLES = ('uitvoering', 'cd', 'kompositie', 'komponist', 'uitvoerders', 'dirigent')
+
+
 class Cd(db.Model):
     """
     Table with CD Information
@@ -19,8 +30,9 @@ class Cd(db.Model):
     modified = db.Column(db.Integer, nullable=False)
     identificatie = db.Column(db.Text)
     titel = db.Column(db.Text, nullable=False)
-    uitgever_id = db.Column(db.Integer, db.ForeignKey('uitgever.id'))
+    uitgever_id = db.Column(db.Integer, db.ForeignKey('uitgever.id'), index=True)
     uitgever = db.relationship("Uitgever", backref='cd')
+    items_cnt = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     """
     def __init__(self):
@@ -30,12 +42,12 @@ class Cd(db.Model):
     @hybrid_property
     def items(self):
         """
-        Returns the number of uitvoeringen on a CD.
+        Returns the number of uitvoeringen on a CD, from counter column items_cnt.
         """
-        uit_list = [uit.id for uit in self.uitvoering]
-        return len(uit_list)
+        return self.items_cnt
 
     @staticmethod
+    @replica.writes
     def delete(nid):
         """
         This method will delete the CD on condition that there is no link to uitvoeringen.
@@ -58,7 +70,10 @@ class Cd(db.Model):
             msg = f"CD {cd.titel} is verwijderd."
             current_app.logger.info(msg)
             db.session.delete(cd)
-            db.session.commit()
+            db.session.flush()
+            refresh_counters(uitgever=[cd.uitgever_id])
+            search.remove('cd', cd.id)
+            save('cd', 'uitgever')
             return dict(nid=-1, msg=msg, status="success")
         else:
             msg = f"CD {cd.titel} is nog verbonden met {cnt} uitvoering(en)."
@@ -66,6 +81,7 @@ class Cd(db.Model):
             return dict(nid=nid, msg=msg, status="error")
 
     @staticmethod
+    @replica.writes
     def update(**params):
         """
         This method will add or edit the CD.
@@ -79,9 +95,11 @@ class Cd(db.Model):
             params["uitgever_id"] = None
         if len(params['identificatie']) == 0:
             params['identificatie'] = None
+        uitgevers = [params["uitgever_id"]]
         if 'id' in params:
             # Update record
             cd = db.session.query(Cd).filter_by(id=params['id']).one()
+            uitgevers.append(cd.uitgever_id)
             cd.titel = params["titel"]
             cd.identificatie = params["identificatie"]
             cd.uitgever_id = params["uitgever_id"]
@@ -90,9 +108,12 @@ class Cd(db.Model):
             params['created'] = now
             cd = Cd(**params)
             db.session.add(cd)
-        db.session.commit()
-        db.session.refresh(cd)
-        return cd.id
+        db.session.flush()
+        refresh_counters(uitgever=uitgevers)
+        search.index('cd', cd.id)
+        nid = cd.id
+        save('cd', 'uitgever')
+        return nid
 
 
 class Dirigent(db.Model):
@@ -104,16 +125,17 @@ class Dirigent(db.Model):
     naam = db.Column(db.Text, nullable=False)
     voornaam = db.Column(db.Text)
     fnaam = db.column_property(naam + " " + voornaam)
+    items_cnt = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     @hybrid_property
     def items(self):
         """
-        Returns the number of uitvoeringen.
+        Returns the number of uitvoeringen, from counter column items_cnt.
         """
-        uit_list = [uit.id for uit in self.uitvoering]
-        return len(uit_list)
+        return self.items_cnt
 
     @staticmethod
+    @replica.writes
     def delete(nid):
         """
         This method will delete the Dirigent on condition that there is no link to uitvoeringen.
@@ -136,7 +158,8 @@ class Dirigent(db.Model):
             msg = f"Dirigent {dirigent.voornaam} {dirigent.naam} is verwijderd."
             current_app.logger.info(msg)
             db.session.delete(dirigent)
-            db.session.commit()
+            search.remove('dirigent', dirigent.id)
+            save('dirigent', invalidate=[('dirigent',)])
             return dict(nid=-1, msg=msg, status="success")
         else:
             msg = f"Dirigent {dirigent.voornaam} {dirigent.naam} is nog verbonden met {cnt} uitvoering(en)."
@@ -144,6 +167,7 @@ class Dirigent(db.Model):
             return dict(nid=nid, msg=msg, status="error")
 
     @staticmethod
+    @replica.writes
     def update(**params):
         """
         This method will add or edit the Dirigent. It will add only if Dirigent naam+voornaam did not exist before.
@@ -187,9 +211,11 @@ class Dirigent(db.Model):
                 msg = f"Dirigent {voornaam} {naam} is toegevoegd."
                 dirigent = Dirigent(**params)
                 db.session.add(dirigent)
-        db.session.commit()
-        db.session.refresh(dirigent)
-        return dict(nid=dirigent.id, msg=msg, status="success")
+        db.session.flush()
+        search.index('dirigent', dirigent.id)
+        nid = dirigent.id
+        save('dirigent', invalidate=[('dirigent',)])
+        return dict(nid=nid, msg=msg, status="success")
 
 class Komponist(db.Model):
     """"
@@ -202,27 +228,25 @@ class Komponist(db.Model):
     naam = db.Column(db.Text, nullable=False)
     voornaam = db.Column(db.Text)
     fnaam = db.column_property(naam + " " + voornaam)
+    komposities_cnt = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    items_cnt = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     @hybrid_property
     def komposities(self):
         """
-        Returns the number of komposities per komponist.
+        Returns the number of komposities per komponist, from counter column komposities_cnt.
         """
-        komp_list = [komp.id for komp in self.kompositie]
-        return len(komp_list)
+        return self.komposities_cnt
 
     @hybrid_property
     def items(self):
         """
-        Returns the number of uitvoeringen per komponist.
+        Returns the number of uitvoeringen per komponist, from counter column items_cnt.
         """
-        cnt = 0
-        for kompositie in self.kompositie:
-            for _ in kompositie.uitvoering:
-                cnt += 1
-        return cnt
+        return self.items_cnt
 
     @staticmethod
+    @replica.writes
     def delete(nid):
         """
         This method will delete the Komponist on condition that there is no link to komposities.
@@ -245,7 +269,8 @@ class Komponist(db.Model):
             msg = f"Komponist {komponist.voornaam} {komponist.naam} verwijderd."
             current_app.logger.info(msg)
             db.session.delete(komponist)
-            db.session.commit()
+            search.remove('komponist', komponist.id)
+            save('komponist', invalidate=[('komponist',)])
             return dict(nid=-1, msg=msg, status="success")
         else:
             msg = f"Komponist {komponist.voornaam} {komponist.naam} nog verbonden met {cnt} uitvoering(en)."
@@ -253,6 +278,7 @@ class Komponist(db.Model):
             return dict(nid=nid, msg=msg, status="error")
 
     @staticmethod
+    @replica.writes
     def update(**params):
         """
         This method will add or edit the Komponist. It will add only if Komponist naam+voornaam did not exist before.
@@ -300,9 +326,11 @@ class Komponist(db.Model):
                 params['modified'] = now
                 komponist = Komponist(**params)
                 db.session.add(komponist)
-        db.session.commit()
-        db.session.refresh(komponist)
-        return dict(nid=komponist.id, msg=msg, status="success")
+        db.session.flush()
+        search.index('komponist', komponist.id)
+        nid = komponist.id
+        save('komponist', invalidate=[('komponist',)])
+        return dict(nid=nid, msg=msg, status="success")
 
 class Kompositie(db.Model):
     """
@@ -311,18 +339,19 @@ class Kompositie(db.Model):
     __tablename__ = 'kompositie'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     naam = db.Column(db.Text, nullable=False)
-    komponist_id = db.Column(db.Integer, db.ForeignKey('komponist.id'))
+    komponist_id = db.Column(db.Integer, db.ForeignKey('komponist.id'), index=True)
     komponist = db.relationship('Komponist', backref='kompositie')
+    items_cnt = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     @hybrid_property
     def items(self):
         """
-        Returns the number of uitvoeringen on a CD.
+        Returns the number of uitvoeringen for the kompositie, from counter column items_cnt.
         """
-        uit_list = [uit.id for uit in self.uitvoering]
-        return len(uit_list)
+        return self.items_cnt
 
     @staticmethod
+    @replica.writes
     def delete(nid):
         """
         This method will delete the Kompositie on condition that there is no link to uitvoering.
@@ -345,7 +374,10 @@ class Kompositie(db.Model):
             msg = f"Kompositie {kompositie.naam} verwijderd."
             current_app.logger.info(msg)
             db.session.delete(kompositie)
-            db.session.commit()
+            db.session.flush()
+            refresh_counters(komponist=[kompositie.komponist_id])
+            search.remove('kompositie', kompositie.id)
+            save('kompositie', 'komponist', invalidate=[('kompositie', kompositie.komponist_id)])
             return dict(nid=-1, msg=msg, status="success")
         else:
             msg = f"Kompositie {kompositie.naam} nog verbonden met {cnt} uitvoering(en)."
@@ -353,6 +385,7 @@ class Kompositie(db.Model):
             return dict(nid=nid, msg=msg, status="error")
 
     @staticmethod
+    @replica.writes
     def update(**params):
         """
         This method will add or edit the Kompositie.
@@ -363,10 +396,12 @@ class Kompositie(db.Model):
         if params['komponist_id'] == -1:
             # Komponist Not set, use 'Anoniem'.
             params['komponist_id'] = 500
+        komponisten = [params['komponist_id']]
         if 'id' in params:
             nid = int(params['id'])
             # Update record
             kompositie = Kompositie.query.filter_by(id=nid).one()
+            komponisten.append(kompositie.komponist_id)
             kompositie.naam = params['naam']
             kompositie.komponist_id = params['komponist_id']
             msg = "Kompositie is aangepast."
@@ -375,9 +410,12 @@ class Kompositie(db.Model):
             msg = "Kompositie is toegevoegd."
             kompositie = Kompositie(**params)
             db.session.add(kompositie)
-        db.session.commit()
-        db.session.refresh(kompositie)
-        return dict(nid=kompositie.id, msg=msg, status="success")
+        db.session.flush()
+        refresh_counters(komponist=komponisten)
+        search.index('kompositie', kompositie.id)
+        nid = kompositie.id
+        save('kompositie', 'komponist', invalidate=[('kompositie', *komponisten)])
+        return dict(nid=nid, msg=msg, status="success")
 
 class Uitgever(db.Model):
     """
@@ -386,16 +424,17 @@ class Uitgever(db.Model):
     __tablename__ = "uitgever"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     naam = db.Column(db.Text, nullable=False)
+    items_cnt = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     @hybrid_property
     def items(self):
         """
-        Returns the number of CDs for an Uitgever.
+        Returns the number of CDs for an Uitgever, from counter column items_cnt.
         """
-        uit_list = [uit.id for uit in self.cd]
-        return len(uit_list)
+        return self.items_cnt
 
     @staticmethod
+    @replica.writes
     def delete(nid):
         """
         This method will delete the Uitgever on condition that there is no link to CDs.
@@ -418,7 +457,7 @@ class Uitgever(db.Model):
             msg = f"Uitgever {uitgever.naam} verwijderd."
             current_app.logger.info(msg)
             db.session.delete(uitgever)
-            db.session.commit()
+            save('uitgever')
             return dict(nid=-1, msg=msg, status="success")
         else:
             msg = f"Uitgever {uitgever.naam} nog verbonden met {cnt} cd(s)."
@@ -426,6 +465,7 @@ class Uitgever(db.Model):
             return dict(nid=nid, msg=msg, status="error")
 
     @staticmethod
+    @replica.writes
     def update(**params):
         """
         This method will add or edit the Uitgever. It will add only if Uitgever naam did not exist before.
@@ -465,9 +505,10 @@ class Uitgever(db.Model):
                 msg = f"Uitgever {params['naam']} is toegevoegd."
                 uitgever = Uitgever(**params)
                 db.session.add(uitgever)
-        db.session.commit()
-        db.session.refresh(uitgever)
-        return dict(nid=uitgever.id, msg=msg, status="success")
+        db.session.flush()
+        nid = uitgever.id
+        save('uitgever')
+        return dict(nid=nid, msg=msg, status="success")
 
 class Uitvoerders(db.Model):
     """
@@ -476,16 +517,17 @@ class Uitvoerders(db.Model):
     __tablename__ = "uitvoerders"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     naam = db.Column(db.Text, nullable=False)
+    items_cnt = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     @hybrid_property
     def items(self):
         """
-        Returns the number of uitvoeringen on a CD.
+        Returns the number of uitvoeringen for the uitvoerders, from counter column items_cnt.
         """
-        uit_list = [uit.id for uit in self.uitvoering]
-        return len(uit_list)
+        return self.items_cnt
 
     @staticmethod
+    @replica.writes
     def delete(nid):
         """
         This method will delete the Uitvoerders on condition that there is no link to uitvoeringen.
@@ -508,7 +550,8 @@ class Uitvoerders(db.Model):
             msg = f"Uitvoerders {uitvoerders.naam} verwijderd."
             current_app.logger.info(msg)
             db.session.delete(uitvoerders)
-            db.session.commit()
+            search.remove('uitvoerders', uitvoerders.id)
+            save('uitvoerders', invalidate=[('uitvoerders',)])
             return dict(nid=-1, msg=msg, status="success")
         else:
             msg = f"Uitvoerders {uitvoerders.naam} nog verbonden met {cnt} uitvoering(en)."
@@ -516,6 +559,7 @@ class Uitvoerders(db.Model):
             return dict(nid=nid, msg=msg, status="error")
 
     @staticmethod
+    @replica.writes
     def update(**params):
         """
         This method will add or edit the Uitvoerders. It will add only if Uitvoerders naam did not exist before.
@@ -556,29 +600,48 @@ class Uitvoerders(db.Model):
                 msg = f"Uitvoerders {naam} is toegevoegd."
                 uitvoerders = Uitvoerders(**params)
                 db.session.add(uitvoerders)
-        db.session.commit()
-        db.session.refresh(uitvoerders)
-        return dict(nid=uitvoerders.id, msg=msg, status="success")
+        db.session.flush()
+        search.index('uitvoerders', uitvoerders.id)
+        nid = uitvoerders.id
+        save('uitvoerders', invalidate=[('uitvoerders',)])
+        return dict(nid=nid, msg=msg, status="success")
 
 class Uitvoering(db.Model):
     """
     Table with Uitvoering Information
     """
     __tablename__ = "uitvoering"
+    # Index on cd_id and volgnummer for the CD content in volgnummer order, this index is used for cd_id lookups too.
+    __table_args__ = (db.Index('ix_uitvoering_cd_volgnummer', 'cd_id', 'volgnummer'),)
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     created = db.Column(db.Integer, nullable=False)
     modified = db.Column(db.Integer, nullable=False)
     volgnummer = db.Column(db.Integer)
     cd_id = db.Column(db.Integer, db.ForeignKey('cd.id'))
     cd = db.relationship('Cd', backref='uitvoering')
-    uitvoerders_id = db.Column(db.Integer, db.ForeignKey('uitvoerders.id'))
+    uitvoerders_id = db.Column(db.Integer, db.ForeignKey('uitvoerders.id'), index=True)
     uitvoerders = db.relationship('Uitvoerders', backref='uitvoering')
-    dirigent_id = db.Column(db.Integer, db.ForeignKey('dirigent.id'))
+    dirigent_id = db.Column(db.Integer, db.ForeignKey('dirigent.id'), index=True)
     dirigent = db.relationship('Dirigent', backref='uitvoering')
-    kompositie_id = db.Column(db.Integer, db.ForeignKey('kompositie.id'), nullable=False)
+    kompositie_id = db.Column(db.Integer, db.ForeignKey('kompositie.id'), nullable=False, index=True)
     kompositie = db.relationship('Kompositie', backref='uitvoering')
 
+    def counted_by(self):
+        """
+        Returns the IDs of the records that count this uitvoering in their counter columns. The komponist counters
+        are derived from the kompositie.
+
+        :return: Dictionary with list of IDs per table, to be used in refresh_counters.
+        """
+        return dict(
+            cd=[self.cd_id],
+            dirigent=[self.dirigent_id],
+            kompositie=[self.kompositie_id],
+            uitvoerders=[self.uitvoerders_id]
+        )
+
     @staticmethod
+    @replica.writes
     def delete(nid):
         """
         This method will delete the Uitvoering.
@@ -595,11 +658,15 @@ class Uitvoering(db.Model):
         else:
             msg = f"Uitvoering met ID {nid} verwijderd."
             current_app.logger.info(msg)
+            counted_by = uitvoering.counted_by()
             db.session.delete(uitvoering)
-            db.session.commit()
+            db.session.flush()
+            refresh_counters(**counted_by)
+            save(*UITVOERING_TABLES)
             return dict(nid=-1, msg=msg, status="success")
 
     @staticmethod
+    @replica.writes
     def update(**params):
         """
         This method will add or edit the Uitvoering.
@@ -613,10 +680,12 @@ class Uitvoering(db.Model):
             params['uitvoerders_id'] = None
         if params['dirigent_id'] == -1:
             params['dirigent_id'] = None
+        counted_by = dict(cd=[], dirigent=[], kompositie=[], uitvoerders=[])
         if 'id' in params:
             nid = int(params['id'])
             # Update record
             uitvoering = Uitvoering.query.filter_by(id=nid).one()
+            counted_by = uitvoering.counted_by()
             uitvoering.volgnummer = params['volgnummer']
             uitvoering.cd_id = params['cd_id']
             uitvoering.uitvoerders_id = params['uitvoerders_id']
@@ -629,9 +698,100 @@ class Uitvoering(db.Model):
             params['created'] = now
             uitvoering = Uitvoering(**params)
             db.session.add(uitvoering)
-        db.session.commit()
-        db.session.refresh(uitvoering)
-        return dict(nid=uitvoering.id, msg=msg, status="success")
+        db.session.flush()
+        for table, ids in uitvoering.counted_by().items():
+            counted_by[table] += ids
+        refresh_counters(**counted_by)
+        nid = uitvoering.id
+        save(*UITVOERING_TABLES)
+        return dict(nid=nid, msg=msg, status="success")
+
+    @staticmethod
+    @replica.writes
+    def update_tracklist(cd_id, tracks, renumber=False):
+        """
+        This method applies the tracklist of a CD in one transaction: uitvoeringen are inserted, updated and deleted
+        with one bulk statement each. Counters are recalculated once for all records that counted the uitvoeringen
+        before or after the change.
+
+        :param cd_id: ID of the CD.
+        :param tracks: List of dictionaries with id (None for a new uitvoering), volgnummer, kompositie_id,
+        uitvoerders_id, dirigent_id and delete. Uitvoerders and dirigent -1 or None for none. New tracks without
+        kompositie are ignored.
+        :param renumber: True to renumber the remaining uitvoeringen 1, 2, 3, ... in volgnummer order.
+        :return: Dictionary with nid (ID of the CD), msg and status for flash.
+        """
+        now = int(time.time())
+        cols = ('volgnummer', 'kompositie_id', 'uitvoerders_id', 'dirigent_id')
+        query = select(Uitvoering.id, Uitvoering.cd_id, *[getattr(Uitvoering, col) for col in cols])
+        existing = {row.id: row for row in db.session.execute(query.where(Uitvoering.cd_id == cd_id))}
+        deletes, keep = [], []
+        for pos, track in enumerate(tracks):
+            nid = int(track['id']) if track.get('id') else None
+            if nid is not None and nid not in existing:
+                msg = f"Uitvoering met ID {nid} hoort niet bij CD {cd_id}."
+                current_app.logger.error(msg)
+                return dict(nid=cd_id, msg=msg, status="error")
+            if track.get('delete'):
+                if nid is not None:
+                    deletes.append(nid)
+                continue
+            values = dict(
+                volgnummer=track.get('volgnummer'),
+                kompositie_id=track.get('kompositie_id'),
+                uitvoerders_id=track.get('uitvoerders_id'),
+                dirigent_id=track.get('dirigent_id')
+            )
+            for col in cols[1:]:
+                if values[col] is not None and int(values[col]) < 1:
+                    values[col] = None
+            if values['kompositie_id'] is None:
+                if nid is None:
+                    continue
+                msg = f"Uitvoering met ID {nid} heeft geen kompositie."
+                current_app.logger.error(msg)
+                return dict(nid=cd_id, msg=msg, status="error")
+            keep.append((pos, nid, values))
+        if renumber:
+            # Tracks without volgnummer stay in place after the numbered tracks, in form order.
+            keep.sort(key=lambda item: (item[2]['volgnummer'] is None, item[2]['volgnummer'] or 0, item[0]))
+            for volgnummer, (_, _, values) in enumerate(keep, start=1):
+                values['volgnummer'] = volgnummer
+        updates = [dict(id=nid, modified=now, **values) for _, nid, values in keep
+                   if nid is not None and any(values[col] != getattr(existing[nid], col) for col in cols)]
+        inserts = [dict(created=now, modified=now, cd_id=cd_id, **values) for _, nid, values in keep if nid is None]
+        if not (updates or inserts or deletes):
+            return dict(nid=cd_id, msg="Tracklist is niet gewijzigd.", status="info")
+        counted_by = dict(cd=[cd_id], dirigent=[], kompositie=[], uitvoerders=[])
+        for row in [existing[nid] for nid in deletes] + [existing[values['id']] for values in updates] + \
+                updates + inserts:
+            row = row if isinstance(row, dict) else row._asdict()
+            counted_by['dirigent'].append(row['dirigent_id'])
+            counted_by['kompositie'].append(row['kompositie_id'])
+            counted_by['uitvoerders'].append(row['uitvoerders_id'])
+        if deletes:
+            db.session.execute(delete(Uitvoering).where(Uitvoering.id.in_(deletes)))
+        if updates:
+            db.session.execute(update(Uitvoering), updates)
+        if inserts:
+            db.session.execute(insert(Uitvoering), inserts)
+        refresh_counters(**counted_by)
+        save(*UITVOERING_TABLES)
+        msg = f"Tracklist is aangepast: {len(inserts)} toegevoegd, {len(updates)} aangepast, " \
+              f"{len(deletes)} verwijderd."
+        current_app.logger.info(f"CD {cd_id}: {msg}")
+        return dict(nid=cd_id, msg=msg, status="success")
+
+class DataVersion(db.Model):
+    """
+    Table with the data version of the catalog tables. The version of a table is incremented by the update() and
+    delete() methods of the models, in the same transaction as the change. Modified is the epoch of the last change.
+    """
+    __tablename__ = "data_version"
+    name = db.Column(db.Text, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    modified = db.Column(db.Integer, nullable=False)
+
 
 class User(UserMixin, db.Model):
     __tablename__ = "users"
@@ -663,9 +823,238 @@ class User(UserMixin, db.Model):
         return "<User: {user}>".format(user=self.username)
 
 
+def bump_versions(*tables):
+    """
+    This function increments the data version of the tables. The function does not commit, so the new versions are
+    committed together with the change. Cached pages that show the tables are removed.
+
+    :param tables: Names of the changed tables.
+    :return:
+    """
+    now = int(time.time())
+    for name in sorted(set(tables)):
+        stmt = insert(DataVersion).values(name=name, version=1, modified=now)
+        stmt = stmt.on_conflict_do_update(index_elements=[DataVersion.name],
+                                          set_=dict(version=DataVersion.version + 1, modified=now))
+        db.session.execute(stmt)
+    pagecache.cache.invalidate(*tables)
+    return
+
+
+def save(*tables, invalidate=()):
+    """
+    This function ends a change by an update() or delete() method of a model. Outside a unit of work the data versions
+    of the tables are incremented, the change is committed and the choice list is invalidated. In a unit of work the
+    change is flushed only, so IDs are assigned, and the tables and choice lists are kept for the end of the unit of
+    work, see unit_of_work().
+
+    :param tables: Names of the changed tables.
+    :param invalidate: List of arguments for choices.cache.invalidate, each a tuple of kind and komponist IDs.
+    :return:
+    """
+    unit = db.session.info.get('unit_of_work')
+    if unit is not None:
+        db.session.flush()
+        unit['tables'].update(tables)
+        unit['invalidate'].extend(invalidate)
+        return
+    bump_versions(*tables)
+    db.session.commit()
+    for args in invalidate:
+        choices.cache.invalidate(*args)
+    return
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Context manager to group update() and delete() calls of the models into one transaction. The model methods flush
+    their changes, the data versions are incremented and the transaction is committed once at the end of the block.
+    On an exception the transaction is rolled back and nothing is changed. A unit of work in a unit of work is part of
+    the outer unit of work.
+
+    Note that a model method that returns status error has not changed anything, the other changes in the unit of work
+    are committed. Raise an exception in the block to undo them.
+
+    :return: Dictionary with the changed tables, available after the block.
+    """
+    if db.session.info.get('unit_of_work') is not None:
+        yield db.session.info['unit_of_work']
+        return
+    unit = dict(tables=set(), invalidate=[])
+    db.session.info['unit_of_work'] = unit
+    try:
+        yield unit
+        if unit['tables']:
+            bump_versions(*unit['tables'])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.info.pop('unit_of_work', None)
+    for args in unit['invalidate']:
+        choices.cache.invalidate(*args)
+    return
+
+
+# Kind of record that can be merged: model, foreign key column that points to the record and changed tables.
+MERGES = dict(
+    komponist=(Komponist, Kompositie.__table__.c.komponist_id, ('komponist', 'kompositie')),
+    dirigent=(Dirigent, Uitvoering.__table__.c.dirigent_id, ('dirigent', 'uitvoering')),
+    uitvoerders=(Uitvoerders, Uitvoering.__table__.c.uitvoerders_id, ('uitvoerders', 'uitvoering')),
+    uitgever=(Uitgever, Cd.__table__.c.uitgever_id, ('uitgever', 'cd')),
+    kompositie=(Kompositie, Uitvoering.__table__.c.kompositie_id, ('kompositie', 'komponist', 'uitvoering'))
+)
+
+
+@replica.writes
+def merge(kind, loser, winner, dry_run=False):
+    """
+    This function merges two records of the same kind: all references to the loser are moved to the winner with one
+    UPDATE statement, then the loser is deleted. Counters, search index, data versions and choice lists are updated in
+    the same transaction.
+
+    :param kind: Kind of record: komponist, dirigent, uitvoerders, uitgever or kompositie.
+    :param loser: ID of the record that is removed.
+    :param winner: ID of the record that remains.
+    :param dry_run: If True then only the number of affected rows is reported, nothing is changed.
+    :return: Dictionary with nid (ID of the winner), msg and status for flash, and rows: number of rows per table
+    that are changed or deleted.
+    """
+    model, column, tables = MERGES[kind]
+    loser, winner = int(loser), int(winner)
+    if loser == winner:
+        msg = f"Samenvoegen van {kind} {loser} met zichzelf is niet mogelijk."
+        return dict(nid=winner, msg=msg, status="error", rows={})
+    records = {record.id: record for record in model.query.filter(model.id.in_([loser, winner]))}
+    for nid in (loser, winner):
+        if nid not in records:
+            msg = f"{kind.capitalize()} (id: {nid}) is niet gevonden!"
+            current_app.logger.error(msg)
+            return dict(nid=winner, msg=msg, status="error", rows={})
+    cnt = db.session.execute(select(func.count()).select_from(column.table).where(column == loser)).scalar()
+    rows = {column.table.name: cnt, model.__tablename__: 1}
+    msg = f"{kind.capitalize()} {loser} samenvoegen met {winner}: {cnt} {column.table.name} aangepast, " \
+          f"{kind} {loser} verwijderd."
+    if dry_run:
+        return dict(nid=winner, msg=msg, status="info", rows=rows)
+    values = {column.name: winner}
+    if 'modified' in column.table.c:
+        values['modified'] = int(time.time())
+    db.session.execute(update(column.table).where(column == loser).values(**values))
+    db.session.execute(delete(model.__table__).where(model.__table__.c.id == loser))
+    counters = {kind: [winner]}
+    invalidate = [(kind,)]
+    if kind == 'komponist':
+        invalidate = [(kind,), ('kompositie', loser, winner)]
+    elif kind == 'kompositie':
+        counters['komponist'] = [records[loser].komponist_id]
+        invalidate = [(kind, records[loser].komponist_id, records[winner].komponist_id)]
+    elif kind == 'uitgever':
+        invalidate = []
+    refresh_counters(**counters)
+    if kind in search.KINDS:
+        search.remove(kind, loser)
+    db.session.expunge(records[loser])
+    current_app.logger.info(msg)
+    save(*tables, invalidate=invalidate)
+    return dict(nid=winner, msg=msg, status="success", rows=rows)
+
+
+def get_versions():
+    """
+    This function returns the data version of all tables. Only the data_version table is read, no model objects are
+    loaded.
+
+    :return: Dictionary with table name and (version, modified).
+    """
+    rows = db.session.execute(select(DataVersion.name, DataVersion.version, DataVersion.modified))
+    return {name: (version, modified) for name, version, modified in rows}
+
+
+def choice_version(kind):
+    """
+    This function returns the data version of the table of a choice list, for the choice list cache. The table of a
+    choice list has the name of the kind.
+
+    :param kind: Kind of choice list: komponist, kompositie, uitvoerders or dirigent.
+    :return: Data version, None if the table was not changed yet.
+    """
+    with replica.primary():
+        return db.session.execute(select(DataVersion.version).where(DataVersion.name == kind)).scalar()
+
+
+def refresh_counters(cd=(), dirigent=(), komponist=(), kompositie=(), uitgever=(), uitvoerders=()):
+    """
+    This function recalculates the counter columns for the records with the IDs in the lists. The counters are set
+    with one UPDATE statement per table, so this function can be used after a single model update as well as after
+    bulk changes. Komponist counters are recalculated for the komponist of every kompositie in the list.
+    The function flushes no changes and does not commit, this is left to the caller.
+
+    :param cd: List of CD IDs to recalculate items_cnt (uitvoeringen per CD).
+    :param dirigent: List of Dirigent IDs to recalculate items_cnt (uitvoeringen per dirigent).
+    :param komponist: List of Komponist IDs to recalculate komposities_cnt and items_cnt.
+    :param kompositie: List of Kompositie IDs to recalculate items_cnt (uitvoeringen per kompositie).
+    :param uitgever: List of Uitgever IDs to recalculate items_cnt (CDs per uitgever).
+    :param uitvoerders: List of Uitvoerders IDs to recalculate items_cnt (uitvoeringen per uitvoerders).
+    :return:
+    """
+    kompositie = set(nid for nid in kompositie if nid is not None)
+    komponist = set(nid for nid in komponist if nid is not None and int(nid) > 0)
+    if kompositie:
+        query = select(Kompositie.komponist_id).where(Kompositie.id.in_(kompositie))
+        komponist.update(nid for nid, in db.session.execute(query) if nid is not None)
+    for model, ids in ((Cd, cd), (Dirigent, dirigent), (Komponist, komponist), (Kompositie, kompositie),
+                       (Uitgever, uitgever), (Uitvoerders, uitvoerders)):
+        ids = set(int(nid) for nid in ids if nid is not None and int(nid) > 0)
+        if ids:
+            query = update(model.__table__).where(model.__table__.c.id.in_(ids)).values(**counter_values(model))
+            db.session.execute(query)
+    return
+
+
+def rebuild_counters():
+    """
+    This function recalculates the counter columns for all records. The function does not commit.
+
+    :return:
+    """
+    for model in (Cd, Dirigent, Komponist, Kompositie, Uitgever, Uitvoerders):
+        db.session.execute(update(model.__table__).values(**counter_values(model)))
+    return
+
+
+def counter_values(model):
+    """
+    This function returns the correlated count subqueries that calculate the counter columns for a model.
+
+    :param model: Model class with counter columns.
+    :return: Dictionary with counter column name as key and count subquery as value.
+    """
+    table = model.__table__
+    uitvoering = Uitvoering.__table__
+    if model is Komponist:
+        kompositie = Kompositie.__table__
+        komposities = select(func.count(kompositie.c.id)).where(kompositie.c.komponist_id == table.c.id)
+        items = select(func.count(uitvoering.c.id))\
+            .select_from(uitvoering.join(kompositie, uitvoering.c.kompositie_id == kompositie.c.id))\
+            .where(kompositie.c.komponist_id == table.c.id)
+        return dict(komposities_cnt=komposities.scalar_subquery(), items_cnt=items.scalar_subquery())
+    elif model is Uitgever:
+        cd = Cd.__table__
+        items = select(func.count(cd.c.id)).where(cd.c.uitgever_id == table.c.id)
+    else:
+        fk = dict(cd=uitvoering.c.cd_id, dirigent=uitvoering.c.dirigent_id, kompositie=uitvoering.c.kompositie_id,
+                  uitvoerders=uitvoering.c.uitvoerders_id)[table.name]
+        items = select(func.count(uitvoering.c.id)).where(fk == table.c.id)
+    return dict(items_cnt=items.scalar_subquery())
+
+
 def init_session(dbconn, echo=False):
     """
-    This function configures the connection to the database and returns the session object.
+    This function configures the connection to the database and returns the session object. The SQLite pragmas from
+    the configuration are applied on every connection.
 
     :param dbconn: Name of the sqlite3 database.
     :param echo: True / False, depending if echo is required. Default: False
@@ -677,8 +1066,17 @@ def init_session(dbconn, echo=False):
     return session
 
 
-def set_engine(conn_string, echo=False):
+def set_engine(conn_string, echo=False, pragmas=None):
+    """
+    This function creates the engine for the database. For SQLite the pragmas are applied on every new connection.
+
+    :param conn_string: Database URL.
+    :param echo: True / False, depending if echo is required. Default: False
+    :param pragmas: Dictionary with SQLite pragmas, default SQLITE_PRAGMAS from Config.
+    :return: engine object.
+    """
     engine = create_engine(conn_string, echo=echo)
+    sqlite.configure(engine, Config.SQLITE_PRAGMAS if pragmas is None else pragmas)
     return engine
 
 
@@ -688,17 +1086,165 @@ def set_session4engine(engine):
     return session
 
 
+def load_pairs(kind, komponist_id=None):
+    """
+    Function to collect a choice list from the database, for the choice list cache. Only the id and label columns are
+    selected. The list is read from the primary database, a replica may not have the last changes yet.
+
+    :param kind: Kind of choice list: komponist, kompositie, uitvoerders or dirigent.
+    :param komponist_id: For kompositie: ID of the komponist, -1 for all komposities.
+    :return: List of (id, label) pairs, sorted on label.
+    """
+    if kind == 'komponist':
+        query = db.session.query(Komponist.id, Komponist.fnaam).order_by(Komponist.naam.asc())
+    elif kind == 'dirigent':
+        query = db.session.query(Dirigent.id, Dirigent.fnaam).order_by(Dirigent.naam.asc())
+    elif kind == 'uitvoerders':
+        query = db.session.query(Uitvoerders.id, Uitvoerders.naam).order_by(Uitvoerders.naam.asc())
+    else:
+        query = db.session.query(Kompositie.id, Kompositie.naam).order_by(Kompositie.naam.asc())
+        if int(komponist_id) > 0:
+            query = query.filter(Kompositie.komponist_id == komponist_id)
+    with replica.primary():
+        return [(nid, f"{label}") for nid, label in query]
+
+
 @lm.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+def display_options(query):
+    """
+    Function to add the eager load options for all relations that are shown for an uitvoering: cd, kompositie with
+    komponist, uitvoerders and dirigent. All relations are many-to-one, so they are joined in the same SELECT
+    statement instead of a lazy load SELECT per row.
+
+    :param query: Query object on Uitvoering.
+    :return: Query object with eager load options.
+    """
+    return query.options(
+        joinedload(Uitvoering.cd),
+        joinedload(Uitvoering.kompositie).joinedload(Kompositie.komponist),
+        joinedload(Uitvoering.uitvoerders),
+        joinedload(Uitvoering.dirigent)
+    )
+
+def display_uitvoeringen(query):
+    """
+    Function to return the uitvoeringen from the query as a list, with all relations loaded that are required by the
+    uitvoeringen and cd_content macros. The list is collected in one statement.
+
+    :param query: Query object on Uitvoering.
+    :return: List of uitvoering records.
+    """
+    return display_options(query).all()
+
+def uitvoeringen_query(**filters):
+    """
+    Function to return a query on all uitvoeringen, joined with the cd, kompositie, komponist, uitvoerders and
+    dirigent tables. The joined relations are loaded from the same statement, and the joined columns can be used to
+    filter and sort.
+
+    :param filters: Optional IDs to filter on: cd, dirigent, komponist, kompositie, uitgever, uitvoerders.
+    :return: Query object on Uitvoering.
+    """
+    query = db.session.query(Uitvoering) \
+        .outerjoin(Uitvoering.cd) \
+        .join(Uitvoering.kompositie) \
+        .outerjoin(Kompositie.komponist) \
+        .outerjoin(Uitvoering.uitvoerders) \
+        .outerjoin(Uitvoering.dirigent) \
+        .options(
+            contains_eager(Uitvoering.cd),
+            contains_eager(Uitvoering.kompositie).contains_eager(Kompositie.komponist),
+            contains_eager(Uitvoering.uitvoerders),
+            contains_eager(Uitvoering.dirigent)
+        )
+    return filter_uitvoeringen(query, filters)
+
+
+def filter_uitvoeringen(query, filters):
+    """
+    Function to add filters to a query or select statement on uitvoeringen that is joined with the cd and kompositie
+    tables.
+
+    :param query: Query object or select statement.
+    :param filters: Dictionary with optional IDs to filter on: cd, dirigent, komponist, kompositie, uitgever,
+    uitvoerders.
+    :return: Filtered query object or select statement.
+    """
+    columns = dict(
+        cd=Uitvoering.cd_id,
+        dirigent=Uitvoering.dirigent_id,
+        komponist=Kompositie.komponist_id,
+        kompositie=Uitvoering.kompositie_id,
+        uitgever=Cd.uitgever_id,
+        uitvoerders=Uitvoering.uitvoerders_id
+    )
+    for key, nid in filters.items():
+        if nid is not None:
+            query = query.filter(columns[key] == nid)
+    return query
+
+
+def export_query(**filters):
+    """
+    Function to return the select statement for the export of uitvoeringen. Only the columns for the export are
+    selected, no model objects are created. The uitvoeringen are sorted on cd_id and volgnummer, which follows the
+    index on uitvoering, so the rows can be streamed without sorting the result first.
+
+    :param filters: Optional IDs to filter on: cd, dirigent, komponist, kompositie, uitgever, uitvoerders.
+    :return: Select statement, the column labels are the field names of a tracklist.
+    """
+    query = select(
+        Cd.titel.label('cd_titel'),
+        Cd.identificatie.label('cd_identificatie'),
+        Uitgever.naam.label('uitgever'),
+        Uitvoering.volgnummer.label('volgnummer'),
+        Komponist.naam.label('komponist_naam'),
+        Komponist.voornaam.label('komponist_voornaam'),
+        Kompositie.naam.label('kompositie'),
+        Uitvoerders.naam.label('uitvoerders'),
+        Dirigent.naam.label('dirigent_naam'),
+        Dirigent.voornaam.label('dirigent_voornaam')
+    ) \
+        .select_from(Uitvoering) \
+        .outerjoin(Cd, Uitvoering.cd_id == Cd.id) \
+        .outerjoin(Uitgever, Cd.uitgever_id == Uitgever.id) \
+        .join(Kompositie, Uitvoering.kompositie_id == Kompositie.id) \
+        .outerjoin(Komponist, Kompositie.komponist_id == Komponist.id) \
+        .outerjoin(Uitvoerders, Uitvoering.uitvoerders_id == Uitvoerders.id) \
+        .outerjoin(Dirigent, Uitvoering.dirigent_id == Dirigent.id) \
+        .order_by(Uitvoering.cd_id, Uitvoering.volgnummer)
+    return filter_uitvoeringen(query, filters)
+
+def cds_query(uitgever=None):
+    """
+    Function to return a query on all CDs, joined with the uitgever.
+
+    :param uitgever: Optional ID of the uitgever to filter on.
+    :return: Query object on Cd.
+    """
+    query = db.session.query(Cd).outerjoin(Cd.uitgever).options(contains_eager(Cd.uitgever))
+    if uitgever is not None:
+        query = query.filter(Cd.uitgever_id == uitgever)
+    return query
+
+def komposities_query():
+    """
+    Function to return a query on all komposities, joined with the komponist.
+
+    :return: Query object on Kompositie.
+    """
+    return db.session.query(Kompositie).outerjoin(Kompositie.komponist).options(contains_eager(Kompositie.komponist))
+
 def get_cd(nid):
     """
     Function to return information on a single CD.
 
     :param nid: ID of the CD.
     """
-    cd = Cd.query.filter_by(id=nid).one()
+    cd = Cd.query.options(joinedload(Cd.uitgever)).filter_by(id=nid).one()
     return cd
 
 def get_cds(nid=None):
@@ -720,11 +1266,17 @@ def get_dirigent(nid):
 def get_dirigent_pairs():
     """
     Function to return list of dirigenten in pairs dirigent.id, dirigent.voornaam + naam.
-    This can be used in a SelectField.
+    This can be used in a SelectField. The list is kept in the choice list cache.
     """
-    dirigenten = Dirigent.query.order_by(Dirigent.naam.asc())
-    res = [(dirigent.id, f"{dirigent.fnaam}") for dirigent in dirigenten]
-    return res
+    return choices.cache.pairs('dirigent', load_pairs, version=choice_version)
+
+def get_dirigent_options(first=None):
+    """
+    Function to return the option html for the dirigenten select field, from the choice list cache.
+
+    :param first: Optional (id, label) pair for the first option.
+    """
+    return choices.cache.options('dirigent', load_pairs, first=first, version=choice_version)
 
 def get_dirigenten():
     """
@@ -739,7 +1291,7 @@ def get_dirigent_uitvoeringen(dirigent_id):
     :param dirigent_id: Id of the dirigent
     """
     uitvoeringen = Uitvoering.query.filter_by(dirigent_id=dirigent_id)
-    return uitvoeringen
+    return display_options(uitvoeringen)
 
 def get_komponist(nid):
     komponist = Komponist.query.filter_by(id=nid).one()
@@ -748,11 +1300,17 @@ def get_komponist(nid):
 def get_komponist_pairs():
     """
     Function to return list of komponisten in pairs komponist.id, komponist.voornaam + naam.
-    This can be used in a SelectField.
+    This can be used in a SelectField. The list is kept in the choice list cache.
     """
-    komponisten = Komponist.query.order_by(Komponist.naam.asc())
-    res = [(komponist.id, f"{komponist.fnaam}") for komponist in komponisten]
-    return res
+    return choices.cache.pairs('komponist', load_pairs, version=choice_version)
+
+def get_komponist_options(first=None):
+    """
+    Function to return the option html for the komponisten select field, from the choice list cache.
+
+    :param first: Optional (id, label) pair for the first option.
+    """
+    return choices.cache.options('komponist', load_pairs, first=first, version=choice_version)
 
 def get_komponist_uitvoeringen(komponist_id):
     """
@@ -761,7 +1319,7 @@ def get_komponist_uitvoeringen(komponist_id):
     :param komponist_id: Id of the komponist
     """
     uitvoeringen = db.session.query(Uitvoering).join(Kompositie).filter(Kompositie.komponist_id==komponist_id)
-    return uitvoeringen
+    return display_options(uitvoeringen)
 
 def get_komponisten():
     """
@@ -784,12 +1342,54 @@ def get_kompositie_pairs(komponist_id):
 
     :param komponist_id: ID of the komponist for which pairs are required. Komponist_id > 0 for valid komponist.
     """
-    if int(komponist_id) > 0:
-        komposities = Kompositie.query.filter_by(komponist_id=komponist_id).order_by(Kompositie.naam.asc())
-    else:
-        komposities = Kompositie.query.order_by(Kompositie.naam.asc())
-    res = [(kompositie.id, kompositie.naam) for kompositie in komposities]
-    return res
+    return choices.cache.pairs('kompositie', load_pairs, komponist_id, version=choice_version)
+
+def get_kompositie_options(komponist_id, first=None):
+    """
+    Function to return the option html for the komposities select field, from the choice list cache.
+
+    :param komponist_id: ID of the komponist for which options are required, -1 for all komposities.
+    :param first: Optional (id, label) pair for the first option.
+    """
+    return choices.cache.options('kompositie', load_pairs, komponist_id, first=first,
+                                 version=choice_version)
+
+def get_kompositie_json(komponist_id, page=1, limit=500):
+    """
+    Function to return the komposities of a komponist as json document, with a strong ETag for the document.
+    The list of all komposities (komponist_id -1) is returned in pages of limit komposities. The document is kept in
+    the choice list cache, so it is calculated only once until the komposities of the komponist are changed.
+
+    :param komponist_id: ID of the komponist, -1 for all komposities.
+    :param page: Page number, starting from 1. Only used for all komposities.
+    :param limit: Maximum number of komposities on a page. Only used for all komposities.
+    :return: json document (bytes) and ETag, None for a page after the last page.
+    """
+    komponist_id = int(komponist_id) if int(komponist_id) > 0 else -1
+    if komponist_id > 0:
+        page = 1
+    elif page > max(math.ceil(choices.cache.count('kompositie', load_pairs, -1, version=choice_version) / limit), 1):
+        return None
+
+    def build(pairs):
+        if komponist_id > 0:
+            rows = pairs
+            next_page = None
+        else:
+            rows = pairs[(page - 1) * limit:page * limit]
+            next_page = page + 1 if page * limit < len(pairs) else None
+        doc = dict(
+            komponist_id=komponist_id,
+            page=page,
+            next=next_page,
+            total=len(pairs),
+            komposities=rows
+        )
+        body = json.dumps(doc, separators=(',', ':')).encode('utf-8')
+        return body, hashlib.sha1(body).hexdigest()
+
+    return choices.cache.memo('kompositie', load_pairs, f"json-{page}-{limit}", build, komponist_id,
+                              version=choice_version)
 
 def get_kompositie_uitvoeringen(kompositie_id):
     """
@@ -798,7 +1398,7 @@ def get_kompositie_uitvoeringen(kompositie_id):
     :param kompositie_id: Id of the kompositie
     """
     uitvoeringen = Uitvoering.query.filter_by(kompositie_id=kompositie_id)
-    return uitvoeringen
+    return display_options(uitvoeringen)
 
 def get_komposities():
     """
@@ -813,7 +1413,7 @@ def get_cd_uitvoeringen(cd):
     :param cd: Id of the CD
     """
     uitvoeringen = Uitvoering.query.filter_by(cd_id=cd)
-    return uitvoeringen
+    return display_uitvoeringen(uitvoeringen)
 
 def get_last_uitvoering(cd):
     """
@@ -883,7 +1483,8 @@ def get_uitvoerders_uitvoeringen(uitvoerders_id):
 
     :param uitvoerders_id: Id of the uitvoerders
     """
-    return Uitvoering.query.filter_by(uitvoerders_id=uitvoerders_id)
+    uitvoeringen = Uitvoering.query.filter_by(uitvoerders_id=uitvoerders_id)
+    return display_options(uitvoeringen)
 
 def get_uitvoerders():
     """
@@ -894,22 +1495,30 @@ def get_uitvoerders():
 def get_uitvoerders_pairs():
     """
     Function to return list of uitvoerders in pairs uitvoerders.id, uitvoerders.naam.
-    This can be used in a SelectField.
+    This can be used in a SelectField. The list is kept in the choice list cache.
+    """
+    return choices.cache.pairs('uitvoerders', load_pairs, version=choice_version)
+
+def get_uitvoerders_options(first=None):
+    """
+    Function to return the option html for the uitvoerders select field, from the choice list cache.
+
+    :param first: Optional (id, label) pair for the first option.
     """
-    uitvoerders = Uitvoerders.query.order_by(Uitvoerders.naam.asc())
-    return [(uitvoerder.id, uitvoerder.naam) for uitvoerder in uitvoerders]
+    return choices.cache.options('uitvoerders', load_pairs, first=first, version=choice_version)
 
 def get_uitvoeringen():
     """
-    Function to get uitvoeringen.
+    Function to get uitvoeringen. The query is returned, so the caller can iterate the uitvoeringen or fetch them in
+    chunks. The relations for the uitvoeringen macros are loaded in the same statement.
     """
-    return Uitvoering.query
+    return display_options(Uitvoering.query)
 
 def get_uitvoering(nid):
     """
     Functionto return the uitvoering as a record.
     """
-    return Uitvoering.query.filter_by(id=nid).one()
+    return display_options(Uitvoering.query).filter_by(id=nid).one()
 
 def get_uitvoering_dict(nid):
     """
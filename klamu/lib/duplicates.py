@@ -0,0 +1,199 @@
+"""
+This module finds probable duplicates in the catalog: komponisten, dirigenten, uitvoerders, uitgevers and komposities
+with names that are written differently, e.g. "Beethoven, Ludwig van" and "van Beethoven, Ludwig".
+Names are normalized (lower case, no accents or punctuation, words sorted) and split in character n-grams. Only records
+that share enough n-grams in the n-gram index are compared, so the number of comparisons grows with the number of
+similar names instead of with the square of the number of records. Komposities are only compared with komposities of
+the same komponist.
+The comparisons can be spread over a pool of processes. The review page keeps the last result per kind with the data
+version of the table, so the scan only runs again after the table has changed.
+"""
+
+import difflib
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from klamu import db
+from sqlalchemy import text
+
+# Length of the n-grams.
+NGRAM = 3
+# Minimum fraction of the n-grams of the shorter name that must be in the other name to compare the names.
+OVERLAP = 0.5
+# N-grams in more records than this are too common to find candidates, e.g. 'sym' in komposities.
+MAX_POSTING = 1000
+# Minimum score for the review list.
+THRESHOLD = 0.8
+# Number of candidate pairs per task for the process pool.
+CHUNK_SIZE = 5000
+
+# Kind of record with query for id, label and block. Records are only compared within the same block.
+SOURCES = dict(
+    komponist="SELECT id, trim(coalesce(voornaam, '') || ' ' || naam) AS label, 0 AS block FROM komponist",
+    dirigent="SELECT id, trim(coalesce(voornaam, '') || ' ' || naam) AS label, 0 AS block FROM dirigent",
+    uitvoerders="SELECT id, naam AS label, 0 AS block FROM uitvoerders",
+    uitgever="SELECT id, naam AS label, 0 AS block FROM uitgever",
+    kompositie="SELECT id, naam AS label, komponist_id AS block FROM kompositie"
+)
+
+# Last result per kind for function cached: data version, threshold, limit and pairs.
+results = {}
+results_lock = threading.Lock()
+
+
+def normalize(label):
+    """
+    This function returns the name in the form that is compared: lower case, without accents and punctuation, with
+    the words in alphabetical order.
+
+    :param label: Name of the record.
+    :return: Normalized name.
+    """
+    label = unicodedata.normalize('NFKD', label or '')
+    label = ''.join(char for char in label if not unicodedata.combining(char)).lower()
+    return ' '.join(sorted(re.findall(r"\w+", label)))
+
+
+def ngrams(name, n=NGRAM):
+    """
+    This function returns the character n-grams of a normalized name. The name is padded with a space, so the start
+    and the end of the name are n-grams too.
+
+    :param name: Normalized name.
+    :param n: Length of the n-grams.
+    :return: Set of n-grams.
+    """
+    padded = f" {name} "
+    return {padded[pos:pos + n] for pos in range(max(len(padded) - n + 1, 1))}
+
+
+def score(name_a, name_b, threshold=0):
+    """
+    This function returns the similarity of two normalized names, from 0 (different) to 1 (equal). The score is the
+    mean of the n-gram Jaccard similarity and the difflib ratio. The difflib ratio is only calculated if the upper
+    bounds of the ratio can reach the threshold, else 0 is returned.
+
+    :param name_a: Normalized name.
+    :param name_b: Normalized name.
+    :param threshold: Minimum score that is of interest.
+    :return: Similarity score.
+    """
+    grams_a, grams_b = ngrams(name_a), ngrams(name_b)
+    jaccard = len(grams_a & grams_b) / len(grams_a | grams_b)
+    matcher = difflib.SequenceMatcher(None, name_a, name_b, autojunk=False)
+    for ratio in (matcher.real_quick_ratio, matcher.quick_ratio):
+        if (jaccard + ratio()) / 2 < threshold:
+            return 0
+    return round((jaccard + matcher.ratio()) / 2, 3)
+
+
+def score_pairs(pairs, threshold=0):
+    """
+    This function scores a list of pairs of names. It is the task for the process pool.
+
+    :param pairs: List of (normalized name, normalized name).
+    :param threshold: Minimum score that is of interest.
+    :return: List of scores.
+    """
+    return [score(name_a, name_b, threshold) for name_a, name_b in pairs]
+
+
+def candidates(names, blocks, overlap=OVERLAP, min_jaccard=0, max_posting=MAX_POSTING):
+    """
+    This function returns the pairs of records that need to be compared. The n-gram index is built while the records
+    are read, every record is looked up in the index of the records before it. The Jaccard similarity of a pair
+    follows from the number of shared n-grams, so pairs that can't reach the threshold are not returned.
+
+    :param names: List of normalized names.
+    :param blocks: List of block keys, same length as names.
+    :param overlap: Minimum fraction of the n-grams of the shorter name that must be shared.
+    :param min_jaccard: Minimum n-gram Jaccard similarity.
+    :param max_posting: N-grams in more records are skipped in the lookup.
+    :return: Iterator over (position, position) pairs, lowest position first.
+    """
+    index = defaultdict(list)
+    sizes = []
+    for pos, (name, block) in enumerate(zip(names, blocks)):
+        grams = ngrams(name)
+        sizes.append(len(grams))
+        shared = Counter()
+        skipped = 0
+        for gram in grams:
+            posting = index[(block, gram)]
+            if len(posting) <= max_posting:
+                shared.update(posting)
+            else:
+                skipped += 1
+            posting.append(pos)
+        for other, cnt in shared.items():
+            # Skipped n-grams may be shared, so they count for the upper bound of the Jaccard similarity.
+            most = cnt + skipped
+            if cnt >= overlap * min(sizes[other], sizes[pos]) and \
+                    most >= min_jaccard * (sizes[other] + sizes[pos] - most):
+                yield other, pos
+
+
+def find(kind, threshold=THRESHOLD, workers=1, limit=None):
+    """
+    This function returns the probable duplicates for a kind of record, best score first.
+
+    :param kind: Kind of record: komponist, dirigent, uitvoerders, uitgever or kompositie.
+    :param threshold: Minimum score.
+    :param workers: Number of processes for the scoring, 1 to score in this process.
+    :param limit: Maximum number of pairs, None for all pairs.
+    :return: List of dictionaries with score and nid and label of both records.
+    """
+    records = db.session.execute(text(SOURCES[kind])).all()
+    names = [normalize(record.label) for record in records]
+    # The difflib ratio is at most 1, so the Jaccard similarity must be at least 2 * threshold - 1.
+    pairs = list(candidates(names, [record.block for record in records], min_jaccard=max(2 * threshold - 1, 0)))
+    tasks = [[(names[a], names[b]) for a, b in pairs[pos:pos + CHUNK_SIZE]]
+             for pos in range(0, len(pairs), CHUNK_SIZE)]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            scores = [value for chunk in pool.map(score_pairs, tasks, repeat(threshold)) for value in chunk]
+    else:
+        scores = [value for task in tasks for value in score_pairs(task, threshold)]
+    result = [dict(score=value, nid_a=records[a].id, label_a=records[a].label,
+                   nid_b=records[b].id, label_b=records[b].label)
+              for (a, b), value in zip(pairs, scores) if value >= threshold]
+    result.sort(key=lambda pair: (-pair['score'], pair['label_a'].lower(), pair['nid_b']))
+    return result[:limit] if limit else result
+
+
+def cached(kind, version, threshold=THRESHOLD, workers=1, limit=None):
+    """
+    This function returns the probable duplicates for a kind of record from the last result, if the table has the same
+    data version and the same threshold and limit were used. Otherwise the duplicates are found again. Only one result
+    per kind is kept.
+
+    :param kind: Kind of record: komponist, dirigent, uitvoerders, uitgever or kompositie.
+    :param version: Data version of the table of the kind, see get_versions in klamu.lib.db_model.
+    :param threshold: Minimum score.
+    :param workers: Number of processes for the scoring, 1 to score in this process.
+    :param limit: Maximum number of pairs, None for all pairs.
+    :return: List of dictionaries with score and nid and label of both records.
+    """
+    key = (version, threshold, limit)
+    with results_lock:
+        entry = results.get(kind)
+    if entry and entry[0] == key:
+        return entry[1]
+    pairs = find(kind, threshold=threshold, workers=workers, limit=limit)
+    with results_lock:
+        results[kind] = (key, pairs)
+    return pairs
+
+
+def review(kinds=None, **kwargs):
+    """
+    This function returns the review list of probable duplicates for every kind of record.
+
+    :param kinds: List of kinds, default all kinds.
+    :param kwargs: Arguments for function find: threshold, workers, limit.
+    :return: Dictionary with the list of pairs per kind.
+    """
+    return {kind: find(kind, **kwargs) for kind in (kinds or SOURCES)}
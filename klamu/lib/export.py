@@ -0,0 +1,182 @@
+"""
+This module handles the export of uitvoeringen to CSV, JSON Lines and XLSX. The rows are fetched from the database in
+chunks and every chunk is written and returned before the next chunk is fetched, so memory use does not depend on the
+number of uitvoeringen. The fields are the fields of a tracklist, so an export can be imported again, see
+klamu.lib.importer.
+XLSX is written with the standard library: the workbook is a zip file that is written to the output stream member by
+member, the worksheet is streamed with inline strings.
+"""
+
+import csv
+import io
+import json
+import zipfile
+from klamu import db
+from klamu.lib.db_model import export_query
+from klamu.lib.importer import FIELDS
+from xml.sax.saxutils import escape
+
+# Number of rows that are fetched and written per chunk.
+CHUNK_SIZE = 1000
+
+
+def fetch(**filters):
+    """
+    This function returns the rows for the export, in chunks.
+
+    :param filters: Optional IDs to filter on: cd, dirigent, komponist, kompositie, uitgever, uitvoerders.
+    :return: Iterator over lists of rows.
+    """
+    result = db.session.execute(export_query(**filters).execution_options(yield_per=CHUNK_SIZE))
+    for partition in result.partitions():
+        yield partition
+
+
+def csv_chunks(chunks):
+    """
+    This function writes the rows as CSV with a header line.
+
+    :param chunks: Iterator over lists of rows.
+    :return: Iterator over bytes.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # Byte order mark, so spreadsheet programs recognize the file as UTF-8.
+    buffer.write('\ufeff')
+    writer.writerow(FIELDS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def jsonl_chunks(chunks):
+    """
+    This function writes the rows as JSON Lines, one object per uitvoering.
+
+    :param chunks: Iterator over lists of rows.
+    :return: Iterator over bytes.
+    """
+    for rows in chunks:
+        lines = [json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) for row in rows]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class Drain(io.RawIOBase):
+    """
+    Write-only stream that collects the bytes written by the zip file, until they are taken with method take().
+    The stream is not seekable, so the zip file writes the sizes after the data of each member.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>',
+    'xl/workbook.xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Uitvoeringen" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>',
+    'xl/_rels/workbook.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+}
+
+
+def xlsx_row(values):
+    """
+    This function returns the worksheet xml for one row. Numbers are numeric cells, text is an inline string.
+
+    :param values: Values of the row.
+    :return: Row xml.
+    """
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append('<c/>')
+        elif isinstance(value, (int, float)):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>"
+
+
+def xlsx_chunks(chunks):
+    """
+    This function writes the rows as XLSX workbook with one worksheet.
+
+    :param chunks: Iterator over lists of rows.
+    :return: Iterator over bytes.
+    """
+    drain = Drain()
+    with zipfile.ZipFile(drain, mode='w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        with workbook.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            sheet.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        '<sheetData>'.encode('utf-8'))
+            sheet.write(xlsx_row(FIELDS).encode('utf-8'))
+            for rows in chunks:
+                sheet.write(''.join(xlsx_row(row) for row in rows).encode('utf-8'))
+                yield drain.take()
+            sheet.write('</sheetData></worksheet>'.encode('utf-8'))
+    yield drain.take()
+
+
+# Export formats: writer function, mimetype and file extension.
+FORMATS = dict(
+    csv=(csv_chunks, 'text/csv', 'csv'),
+    jsonl=(jsonl_chunks, 'application/x-ndjson', 'jsonl'),
+    xlsx=(xlsx_chunks, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx')
+)
+
+
+def export(fmt, **filters):
+    """
+    This function returns the export of the uitvoeringen in the format.
+
+    :param fmt: Format: csv, jsonl or xlsx.
+    :param filters: Optional IDs to filter on: cd, dirigent, komponist, kompositie, uitgever, uitvoerders.
+    :return: Iterator over bytes.
+    """
+    writer = FORMATS[fmt][0]
+    return writer(fetch(**filters))
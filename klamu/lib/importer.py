@@ -0,0 +1,310 @@
+"""
+This module handles the bulk import of tracklists from CSV or JSON files. A tracklist has one row per uitvoering with
+the CD, the kompositie with komponist, the uitvoerders and the dirigent by name.
+Names are resolved against lookup maps that are collected once at the start of the import, instead of a query per
+name. Missing records are added with one INSERT per table per batch of rows, and the uitvoeringen of a batch are added
+with one INSERT. The import is done in one transaction, so a failing import leaves the database unchanged.
+"""
+
+import csv
+import io
+import itertools
+import json
+import time
+from klamu import db
+from klamu.lib import choices, my_env, search
+from klamu.lib.db_model import *
+from sqlalchemy import insert, select, text
+
+# Fields of a tracklist row, in the order of the CSV header.
+FIELDS = ['cd_titel', 'cd_identificatie', 'uitgever', 'volgnummer', 'komponist_naam', 'komponist_voornaam',
+          'kompositie', 'uitvoerders', 'dirigent_naam', 'dirigent_voornaam']
+REQUIRED = ['cd_titel', 'komponist_naam', 'kompositie']
+# Number of rows that are added in one batch.
+BATCH_SIZE = 1000
+
+
+def file_format(filename):
+    """
+    This function returns the format of a tracklist file from the file extension.
+
+    :param filename: Name of the file.
+    :return: csv or json, None if the format is not supported.
+    """
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext == 'csv':
+        return 'csv'
+    elif ext in ['json', 'jsonl']:
+        return 'json'
+    return None
+
+
+def read_csv(stream):
+    """
+    This function returns the rows of a CSV tracklist. The first line has the field names. The delimiter (comma,
+    semicolon or tab) is taken from the first line.
+
+    :param stream: Text stream.
+    :return: Iterator over the rows, as dictionaries.
+    """
+    first = stream.readline()
+    try:
+        dialect = csv.Sniffer().sniff(first, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    return csv.DictReader(itertools.chain([first], stream), dialect=dialect)
+
+
+def read_json(stream):
+    """
+    This function returns the rows of a JSON tracklist. The document is a list of rows, or a list of CDs with the
+    rows in attribute uitvoeringen and the CD fields titel, identificatie and uitgever. A file with one row per line
+    (JSON Lines) is accepted as well.
+
+    :param stream: Text stream.
+    :return: Iterator over the rows, as dictionaries.
+    """
+    content = stream.read()
+    if content.lstrip().startswith('['):
+        docs = json.loads(content)
+    else:
+        docs = [json.loads(line) for line in content.splitlines() if line.strip()]
+    for doc in docs:
+        if 'uitvoeringen' in doc:
+            cd = dict(cd_titel=doc.get('titel'), cd_identificatie=doc.get('identificatie'),
+                      uitgever=doc.get('uitgever'))
+            for row in doc['uitvoeringen']:
+                yield dict(cd, **row)
+        else:
+            yield doc
+
+
+def read_rows(stream, fmt):
+    """
+    This function returns the rows of a tracklist file.
+
+    :param stream: Text stream.
+    :param fmt: csv or json.
+    :return: Iterator over the rows, as dictionaries.
+    """
+    if fmt == 'csv':
+        return read_csv(stream)
+    elif fmt == 'json':
+        return read_json(stream)
+    raise ValueError(f"Formaat {fmt} wordt niet ondersteund.")
+
+
+def text_stream(stream):
+    """
+    This function returns a text stream for an uploaded file. A byte order mark is removed.
+
+    :param stream: Binary stream.
+    :return: Text stream.
+    """
+    return io.TextIOWrapper(stream, encoding='utf-8-sig')
+
+
+def lower(value):
+    """
+    This function returns the lookup key for a name.
+    """
+    return (value or '').lower()
+
+
+class Importer:
+    """
+    This class handles the import of tracklist rows.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, report=print):
+        """
+        Initialization of the import. The lookup maps are collected from the database.
+
+        :param batch_size: Number of rows per batch.
+        :param report: Function to report progress messages.
+        """
+        self.batch_size = batch_size
+        self.report = report
+        self.counts = dict(cd=0, uitgever=0, komponist=0, kompositie=0, uitvoerders=0, dirigent=0, uitvoering=0,
+                           skipped=0)
+        self.errors = []
+        self.now = int(time.time())
+        self.last_ids = {kind: db.session.execute(text(f"SELECT coalesce(max(id), 0) FROM {kind}")).scalar()
+                         for kind in search.KINDS}
+        self.uitgever = {lower(naam): nid for nid, naam in db.session.execute(select(Uitgever.id, Uitgever.naam))}
+        self.cd = {(lower(titel), lower(identificatie)): nid
+                   for nid, titel, identificatie in db.session.execute(select(Cd.id, Cd.titel, Cd.identificatie))}
+        self.komponist = {(lower(naam), lower(voornaam)): nid for nid, naam, voornaam
+                          in db.session.execute(select(Komponist.id, Komponist.naam, Komponist.voornaam))}
+        self.kompositie = {(komponist_id, lower(naam)): nid for nid, komponist_id, naam
+                           in db.session.execute(select(Kompositie.id, Kompositie.komponist_id, Kompositie.naam))}
+        self.uitvoerders = {lower(naam): nid
+                            for nid, naam in db.session.execute(select(Uitvoerders.id, Uitvoerders.naam))}
+        self.dirigent = {(lower(naam), lower(voornaam)): nid for nid, naam, voornaam
+                         in db.session.execute(select(Dirigent.id, Dirigent.naam, Dirigent.voornaam))}
+        self.tracks = set((cd_id, volgnummer) for cd_id, volgnummer
+                          in db.session.execute(select(Uitvoering.cd_id, Uitvoering.volgnummer)
+                                                .where(Uitvoering.volgnummer.is_not(None))))
+
+    def clean(self, lineno, row):
+        """
+        This method strips the fields of a row and checks the required fields.
+
+        :param lineno: Number of the row in the file, for the error message.
+        :param row: Dictionary with the fields of the row.
+        :return: Dictionary with all fields, empty fields are None. None if the row can't be imported.
+        """
+        clean = {}
+        for field in FIELDS:
+            value = row.get(field)
+            value = str(value).strip() if value is not None else ''
+            clean[field] = value if value else None
+        missing = [field for field in REQUIRED if clean[field] is None]
+        if missing:
+            self.errors.append(f"Rij {lineno}: {', '.join(missing)} ontbreekt.")
+            return None
+        if clean['volgnummer'] is not None:
+            try:
+                clean['volgnummer'] = int(clean['volgnummer'])
+            except ValueError:
+                self.errors.append(f"Rij {lineno}: volgnummer {clean['volgnummer']} is geen getal.")
+                return None
+        return clean
+
+    def add_missing(self, table, model, lookup, candidates):
+        """
+        This method adds the records that are not in the lookup map, with one INSERT statement. The IDs of the new
+        records are added to the lookup map.
+
+        :param table: Name of the table, for the counts.
+        :param model: Model class.
+        :param lookup: Lookup map, key to ID.
+        :param candidates: Dictionary with key and the values for the record, for all records in the batch.
+        :return:
+        """
+        new = [(key, values) for key, values in candidates.items() if key not in lookup]
+        if new:
+            query = insert(model).returning(model.id, sort_by_parameter_order=True)
+            ids = db.session.scalars(query, [values for _, values in new]).all()
+            for (key, _), nid in zip(new, ids):
+                lookup[key] = nid
+            self.counts[table] += len(new)
+        return
+
+    def add_batch(self, batch):
+        """
+        This method adds the rows of a batch. The missing records are added first, then the uitvoeringen. Counters are
+        recalculated for the records that got uitvoeringen.
+
+        :param batch: List of cleaned rows.
+        :return:
+        """
+        now = self.now
+        uitgevers, cds, komponisten, komposities, uitvoerders, dirigenten = {}, {}, {}, {}, {}, {}
+        for row in batch:
+            if row['uitgever']:
+                uitgevers.setdefault(lower(row['uitgever']), dict(naam=row['uitgever']))
+            key = (lower(row['komponist_naam']), lower(row['komponist_voornaam']))
+            komponisten.setdefault(key, dict(naam=row['komponist_naam'], voornaam=row['komponist_voornaam'],
+                                             created=now, modified=now))
+            if row['uitvoerders']:
+                uitvoerders.setdefault(lower(row['uitvoerders']), dict(naam=row['uitvoerders']))
+            if row['dirigent_naam']:
+                key = (lower(row['dirigent_naam']), lower(row['dirigent_voornaam']))
+                dirigenten.setdefault(key, dict(naam=row['dirigent_naam'], voornaam=row['dirigent_voornaam']))
+        self.add_missing('uitgever', Uitgever, self.uitgever, uitgevers)
+        self.add_missing('komponist', Komponist, self.komponist, komponisten)
+        self.add_missing('uitvoerders', Uitvoerders, self.uitvoerders, uitvoerders)
+        self.add_missing('dirigent', Dirigent, self.dirigent, dirigenten)
+        for row in batch:
+            key = (lower(row['cd_titel']), lower(row['cd_identificatie']))
+            cds.setdefault(key, dict(titel=row['cd_titel'], identificatie=row['cd_identificatie'],
+                                     uitgever_id=self.uitgever.get(lower(row['uitgever'])),
+                                     created=now, modified=now))
+            komponist_id = self.komponist[(lower(row['komponist_naam']), lower(row['komponist_voornaam']))]
+            komposities.setdefault((komponist_id, lower(row['kompositie'])),
+                                   dict(naam=row['kompositie'], komponist_id=komponist_id))
+        self.add_missing('cd', Cd, self.cd, cds)
+        self.add_missing('kompositie', Kompositie, self.kompositie, komposities)
+        uitvoeringen = []
+        for row in batch:
+            cd_id = self.cd[(lower(row['cd_titel']), lower(row['cd_identificatie']))]
+            if row['volgnummer'] is not None:
+                if (cd_id, row['volgnummer']) in self.tracks:
+                    self.counts['skipped'] += 1
+                    continue
+                self.tracks.add((cd_id, row['volgnummer']))
+            komponist_id = self.komponist[(lower(row['komponist_naam']), lower(row['komponist_voornaam']))]
+            uitvoeringen.append(dict(
+                created=now,
+                modified=now,
+                volgnummer=row['volgnummer'],
+                cd_id=cd_id,
+                kompositie_id=self.kompositie[(komponist_id, lower(row['kompositie']))],
+                uitvoerders_id=self.uitvoerders.get(lower(row['uitvoerders'])) if row['uitvoerders'] else None,
+                dirigent_id=self.dirigent.get((lower(row['dirigent_naam']), lower(row['dirigent_voornaam'])))
+                if row['dirigent_naam'] else None
+            ))
+        if uitvoeringen:
+            db.session.execute(insert(Uitvoering), uitvoeringen)
+            self.counts['uitvoering'] += len(uitvoeringen)
+            refresh_counters(
+                cd=[uitvoering['cd_id'] for uitvoering in uitvoeringen],
+                dirigent=[uitvoering['dirigent_id'] for uitvoering in uitvoeringen],
+                kompositie=[uitvoering['kompositie_id'] for uitvoering in uitvoeringen],
+                uitgever=[values['uitgever_id'] for values in cds.values()],
+                uitvoerders=[uitvoering['uitvoerders_id'] for uitvoering in uitvoeringen]
+            )
+        return
+
+    def run(self, rows):
+        """
+        This method imports the rows and commits the import. Rows with errors are skipped and reported in attribute
+        errors. On a database error the import is rolled back.
+
+        :param rows: Iterator over the rows, as dictionaries.
+        :return: Dictionary with the number of added records per table, skipped uitvoeringen, errors, seconds and
+        rows per second.
+        """
+        loop = my_env.LoopInfo('rows', self.batch_size, report=self.report)
+        batch = []
+        try:
+            for lineno, row in enumerate(rows, start=1):
+                row = self.clean(lineno, row)
+                if row:
+                    batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self.add_batch(batch)
+                    loop.info_loop(len(batch))
+                    batch = []
+            if batch:
+                self.add_batch(batch)
+                loop.info_loop(len(batch))
+            # Add the new records to the search index.
+            for kind in search.KINDS:
+                db.session.execute(text(f"{search.insert_query(kind)} WHERE id > :last"),
+                                   dict(last=self.last_ids[kind]))
+            bump_versions(*[table for table, cnt in self.counts.items() if cnt and table != 'skipped'],
+                          *(UITVOERING_TABLES + ('uitgever',) if self.counts['uitvoering'] else ()))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        choices.cache.clear()
+        loop.end_loop()
+        return dict(self.counts, errors=len(self.errors), seconds=round(loop.elapsed(), 3),
+                    rate=round(loop.throughput()))
+
+
+def summary(result):
+    """
+    This function returns the result of an import as message.
+
+    :param result: Dictionary from Importer.run().
+    :return: Message string.
+    """
+    return f"{result['uitvoering']} uitvoeringen op {result['cd']} nieuwe CDs toegevoegd in {result['seconds']}s " \
+           f"({result['rate']} rijen/s), {result['skipped']} bestaande uitvoeringen overgeslagen, " \
+           f"{result['errors']} rijen met fouten. Nieuw: {result['komponist']} komponisten, " \
+           f"{result['kompositie']} komposities, {result['uitvoerders']} uitvoerders, {result['dirigent']} dirigenten, " \
+           f"{result['uitgever']} uitgevers."
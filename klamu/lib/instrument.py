@@ -0,0 +1,152 @@
+"""
+This module measures the cost of every request: the number of SQL statements, the time spent in SQL, in template
+rendering and in total. The measurements are sent to the browser in the Server-Timing header and written to the log
+when the request ends, for streamed pages this includes the SQL of the streamed rows. The log line has the
+measurements also as fields for the JSON lines of the logfile.
+An identical statement that is executed many times in one request is reported as a probable N+1 pattern: a query in a
+loop that should be one query or an eager load. With SQL_STRICT the N+1 pattern raises NPlusOneError, so the tests
+fail on it.
+"""
+
+import time
+from collections import Counter
+from flask import current_app, g, has_app_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+
+class NPlusOneError(Exception):
+    """
+    Raised in strict mode when a statement is executed more than SQL_REPEAT_LIMIT times in one request.
+    """
+    pass
+
+
+def shape(statement):
+    """
+    This function returns the shape of a statement: the statement text with normalized white space. The parameters
+    are not in the text, so a query in a loop has the same shape for every execution.
+
+    :param statement: SQL statement as sent to the database.
+    :return: Shape of the statement.
+    """
+    return ' '.join(statement.split())
+
+
+def stats():
+    """
+    This function returns the measurements of the current request.
+
+    :return: Dictionary with the measurements, None outside a request.
+    """
+    if not has_app_context():
+        return None
+    return g.get('instrument')
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if stats() is not None:
+        conn.info.setdefault('instrument_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    measure = stats()
+    if measure is None or not conn.info.get('instrument_start'):
+        return
+    measure['sql'] += time.perf_counter() - conn.info['instrument_start'].pop()
+    measure['statements'] += 1
+    key = shape(statement)
+    measure['shapes'][key] += 1
+    if measure['shapes'][key] == measure['limit'] + 1:
+        msg = f"Probable N+1 in {request.endpoint}: statement executed more than {measure['limit']} times: {key}"
+        if measure['strict']:
+            raise NPlusOneError(msg)
+        current_app.logger.warning(msg)
+
+
+def handle_error(context):
+    # after_cursor_execute is not called for a failed statement, e.g. a lock timeout or an integrity error.
+    conn = context.connection
+    if conn is not None and conn.info.get('instrument_start'):
+        conn.info['instrument_start'].pop()
+
+
+def before_render(sender, template, context, **extra):
+    measure = stats()
+    if measure is not None:
+        measure['render_start'].append(time.perf_counter())
+
+
+def after_render(sender, template, context, **extra):
+    measure = stats()
+    if measure is not None and measure['render_start']:
+        measure['render'] += time.perf_counter() - measure['render_start'].pop()
+
+
+def before_request():
+    g.instrument = dict(
+        start=time.perf_counter(),
+        statements=0,
+        sql=0.0,
+        render=0.0,
+        render_start=[],
+        shapes=Counter(),
+        limit=current_app.config.get('SQL_REPEAT_LIMIT', 10),
+        strict=current_app.config.get('SQL_STRICT', False)
+    )
+
+
+def server_timing(measure):
+    """
+    This function returns the Server-Timing header value for the measurements. Times are in milliseconds.
+
+    :param measure: Measurements of the request.
+    :return: Header value.
+    """
+    total = time.perf_counter() - measure['start']
+    return f'sql;dur={measure["sql"] * 1000:.1f};desc="{measure["statements"]} statements", ' \
+           f'tpl;dur={measure["render"] * 1000:.1f}, total;dur={total * 1000:.1f}'
+
+
+def after_request(response):
+    measure = stats()
+    if measure is not None:
+        measure['status'] = response.status_code
+        response.headers['Server-Timing'] = server_timing(measure)
+    return response
+
+
+def teardown_request(exc):
+    measure = g.pop('instrument', None)
+    if measure is None:
+        return
+    total = time.perf_counter() - measure['start']
+    repeated = sum(1 for cnt in measure['shapes'].values() if cnt > measure['limit'])
+    current_app.logger.info(f"{request.method} {request.path} ({request.endpoint}): total {total * 1000:.1f} ms, "
+                            f"sql {measure['sql'] * 1000:.1f} ms in {measure['statements']} statements, "
+                            f"templates {measure['render'] * 1000:.1f} ms, {repeated} repeated statements",
+                            extra=dict(status=measure.get('status', 500), duration_ms=round(total * 1000, 1),
+                                       sql_count=measure['statements'], sql_ms=round(measure['sql'] * 1000, 1)))
+
+
+def init_app(app, engines):
+    """
+    This function registers the request hooks, the template signals and the statement events for the engines.
+    Nothing is registered if SQL_INSTRUMENT is not set.
+
+    :param app: Flask application.
+    :param engines: SQLAlchemy engines of the application.
+    :return:
+    """
+    if not app.config.get('SQL_INSTRUMENT'):
+        return
+    for engine in engines:
+        if not event.contains(engine, 'before_cursor_execute', before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+            event.listen(engine, 'handle_error', handle_error)
+    before_render_template.connect(before_render, app)
+    template_rendered.connect(after_render, app)
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    return
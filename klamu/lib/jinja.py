@@ -0,0 +1,68 @@
+"""
+This module prepares the Jinja environment of the application, so the first requests of a new process do not compile
+templates. The compiled templates are written to a bytecode cache in JINJA_CACHE_DIR, so a new process loads the
+compiled code instead of parsing the templates again. With JINJA_PRECOMPILE all templates are loaded when the
+application is created, e.g. once in the gunicorn master with --preload.
+current_user is a global of the environment, so macros.html is imported without context: Jinja then evaluates the
+macro module once instead of on every render.
+TEMPLATE_VERSION is a hash of the templates when the application is created. It is part of the ETag of the pages, so
+the browsers get the new pages after a deploy that only changed the templates.
+"""
+
+import hashlib
+import os
+from flask_login import current_user
+from jinja2 import FileSystemBytecodeCache
+
+
+def precompile(app):
+    """
+    This function loads all html templates of the application and the blueprints, and evaluates the macro module.
+
+    :param app: Flask application.
+    :return: List of template names.
+    """
+    env = app.jinja_env
+    names = env.list_templates(extensions=['html'])
+    for name in names:
+        env.get_template(name)
+    # The module of an import without context is kept on the template.
+    env.get_template('macros.html').module
+    return names
+
+
+def template_version(app):
+    """
+    This function returns a hash of the names and the sources of all html templates of the application and the
+    blueprints. The sources are hashed instead of the modification times, so all servers of a deploy have the same
+    version.
+
+    :param app: Flask application.
+    :return: Hash as hex string.
+    """
+    env = app.jinja_env
+    digest = hashlib.sha1()
+    for name in env.list_templates(extensions=['html']):
+        source, _, _ = env.loader.get_source(env, name)
+        digest.update(name.encode('utf-8') + b'\0' + source.encode('utf-8') + b'\0')
+    return digest.hexdigest()
+
+
+def init_app(app):
+    """
+    This function configures the bytecode cache, adds the globals for the macros, precompiles the templates and sets
+    TEMPLATE_VERSION unless it is configured, e.g. with the release of a deploy. Call after the blueprints are
+    registered.
+
+    :param app: Flask application.
+    :return:
+    """
+    directory = app.config.get('JINJA_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.globals['current_user'] = current_user
+    app.config.setdefault('TEMPLATE_VERSION', template_version(app))
+    if app.config.get('JINJA_PRECOMPILE'):
+        precompile(app)
+    return
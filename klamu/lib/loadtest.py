@@ -0,0 +1,396 @@
+"""
+This module is a load test harness for a running klamu server. It replays the GET requests of a gunicorn access log,
+or a synthesized mix of pages, with a number of concurrent clients at a fixed rate. Write flows (update_cd and
+update_uitvoering) are mixed in: a logged in client requests the form and submits it unchanged, so the catalog stays
+the same but every submit takes the write lock of the database.
+The report has the throughput, the latency percentiles per endpoint and the rates of errors and lock timeouts. A lock
+timeout is status 503, see klamu.lib.sqlite. With a fixed rate the latency is measured from the time the request was
+scheduled, so the time a request waits for a free client is included.
+The requests are sent with the standard library, so the harness has no extra dependencies.
+"""
+
+import html.parser
+import http.cookiejar
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict, namedtuple
+from klamu import db
+from klamu.lib.db_model import Cd, Dirigent, Komponist, Kompositie, Uitvoerders, Uitvoering
+from sqlalchemy import select
+
+# Request to replay: method GET for a page, WRITE for a write flow (GET of the form, POST of the form).
+Request = namedtuple('Request', 'method path')
+# Result of one HTTP request: endpoint group, status (0 if there was no response), seconds and error text.
+Result = namedtuple('Result', 'group status seconds error')
+
+# Request line and status in a gunicorn access log line, the default access_log_format.
+LOG_LINE = re.compile(r'"(?P<method>[A-Z]+) (?P<path>\S+) HTTP/[0-9.]+" (?P<status>\d{3}) ')
+# Paths from the log that are not replayed: static files, login and logout, and delete requests.
+SKIP = re.compile(r'^/(static/|login|logout|.*/delete/)')
+# Synthesized traffic: weight and path with placeholders for the sample records.
+MIX = [
+    (15, '/cds'),
+    (15, '/cd/{cd}'),
+    (5, '/komponisten'),
+    (10, '/komponist/{komponist}'),
+    (5, '/kompositie/{kompositie}'),
+    (5, '/dirigent/{dirigent}'),
+    (5, '/uitvoerders/{uitvoerders}'),
+    (5, '/uitvoeringen'),
+    (10, '/tables/uitvoeringen?draw=1&start={start}&length=50&komponist={komponist}'),
+    (5, '/tables/cds?draw=1&start=0&length=50&search%5Bvalue%5D={term}'),
+    (5, '/search?search={term}'),
+    (5, '/kompositie/lookup?komponist={komponist}')
+]
+# Write flows: weight and path of the form.
+WRITES = [
+    (1, '/cd/update/{cd}'),
+    (2, '/cd/uitvoering/uitvoering={uitvoering}')
+]
+TERMS = ['symfonie', 'concert', 'kwartet', 'sonate', 'mozart', 'bach', 'requiem', 'suite']
+# Tables with the sample records for the placeholders.
+SAMPLES = [Cd, Dirigent, Komponist, Kompositie, Uitvoerders, Uitvoering]
+
+
+def parse_log(lines):
+    """
+    This function returns the paths of the GET requests in a gunicorn access log that can be replayed. Requests that
+    failed, static files, login, logout and delete requests are skipped.
+
+    :param lines: Lines of the access log.
+    :return: List of paths with query string.
+    """
+    paths = []
+    for line in lines:
+        match = LOG_LINE.search(line)
+        if match and match['method'] == 'GET' and int(match['status']) < 400 and not SKIP.match(match['path']):
+            paths.append(match['path'])
+    return paths
+
+
+def sample_ids():
+    """
+    This function returns the IDs of the records in the database, for the placeholders of the synthesized traffic.
+
+    :return: Dictionary with table name and list of IDs.
+    """
+    return {model.__tablename__: db.session.execute(select(model.id)).scalars().all() for model in SAMPLES}
+
+
+def fill(template, ids, rng):
+    """
+    This function replaces the placeholders in a path with random sample values.
+
+    :param template: Path with placeholders.
+    :param ids: Dictionary with table name and list of IDs.
+    :param rng: Random generator.
+    :return: Path.
+    """
+    values = {table: rng.choice(values) if values else 0 for table, values in ids.items()}
+    return template.format(term=rng.choice(TERMS), start=50 * rng.randint(0, 20), **values)
+
+
+def weighted(rng, choices):
+    """
+    This function picks an item from a list of (weight, item).
+    """
+    return rng.choices([item for _, item in choices], weights=[weight for weight, _ in choices])[0]
+
+
+def synthesize(ids, count, writes=0.05, seed=1):
+    """
+    This function returns a traffic mix of pages and write flows. The same arguments give the same mix.
+
+    :param ids: Dictionary with table name and list of IDs, see function sample_ids.
+    :param count: Number of requests.
+    :param writes: Fraction of write flows.
+    :param seed: Seed of the random generator.
+    :return: List of requests.
+    """
+    rng = random.Random(seed)
+    return add_writes([Request('GET', fill(weighted(rng, MIX), ids, rng)) for _ in range(count)], ids, writes, seed)
+
+
+def add_writes(requests, ids, writes=0.05, seed=1):
+    """
+    This function replaces a fraction of the requests with write flows.
+
+    :param requests: List of requests.
+    :param ids: Dictionary with table name and list of IDs.
+    :param writes: Fraction of write flows.
+    :param seed: Seed of the random generator.
+    :return: List of requests.
+    """
+    rng = random.Random(seed)
+    return [Request('WRITE', fill(weighted(rng, WRITES), ids, rng)) if rng.random() < writes else request
+            for request in requests]
+
+
+def group(method, path):
+    """
+    This function returns the endpoint group of a request for the report: method and path with IDs replaced.
+    """
+    path = urllib.parse.urlsplit(path).path
+    return f"{method} {re.sub(r'[0-9]+', '<id>', path)}"
+
+
+class FormParser(html.parser.HTMLParser):
+    """
+    This class collects the action and the fields of the first POST form in a page, with the values that a browser
+    would submit. Submit buttons are not collected.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.action = None
+        self.fields = {}
+        self.inside = False
+        self.select = None
+        self.selected = False
+        self.textarea = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form' and self.action is None and (attrs.get('method') or '').lower() == 'post':
+            self.action = attrs.get('action') or ''
+            self.inside = True
+        if not self.inside:
+            return
+        name = attrs.get('name')
+        if tag == 'input' and name:
+            kind = (attrs.get('type') or 'text').lower()
+            if kind in ('submit', 'button', 'image', 'reset', 'file'):
+                return
+            if kind in ('checkbox', 'radio') and 'checked' not in attrs:
+                return
+            self.fields[name] = attrs.get('value') or ('y' if kind == 'checkbox' else '')
+        elif tag == 'select' and name:
+            self.select, self.selected = name, False
+        elif tag == 'option' and self.select:
+            # The selected option, or the first option if no option is selected.
+            if self.select not in self.fields or ('selected' in attrs and not self.selected):
+                self.fields[self.select] = attrs.get('value') or ''
+                self.selected = 'selected' in attrs
+        elif tag == 'textarea' and name:
+            self.textarea = name
+            self.fields[name] = ''
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self.inside = False
+        elif tag == 'select':
+            self.select = None
+        elif tag == 'textarea':
+            self.textarea = None
+
+    def handle_data(self, data):
+        if self.textarea:
+            self.fields[self.textarea] += data
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """
+    Redirects are not followed, so every result is one request. A redirect is returned as HTTPError.
+    """
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    """
+    This class is one client of the load test, with its own session cookie.
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                                                  NoRedirect())
+
+    def open(self, path, data=None):
+        """
+        This method sends a request. The referrer is the CD list, the update pages return to the referrer.
+
+        :param path: Path with query string.
+        :param data: Dictionary with form fields for a POST request, None for a GET request.
+        :return: Status and body, status 0 and the error text if there was no response.
+        """
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, headers={'Referer': f"{self.base_url}/cds"})
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read()
+        except (urllib.error.URLError, OSError) as exc:
+            return 0, str(exc)
+
+    def form(self, path):
+        """
+        This method requests a page and returns the fields of the POST form.
+
+        :param path: Path of the page.
+        :return: Status, path to submit the form to and dictionary with the fields.
+        """
+        status, body = self.open(path)
+        parser = FormParser()
+        if status == 200:
+            parser.feed(body.decode('utf-8', errors='replace'))
+        return status, urllib.parse.urljoin(path, parser.action) if parser.action else path, parser.fields
+
+    def login(self, username, password):
+        """
+        This method logs in the client. The login page redirects also if the login failed, so the login is checked
+        with a page that requires a login.
+
+        :return: True if the login succeeded.
+        """
+        _, action, fields = self.form('/login')
+        fields.update(username=username, password=password, submit='OK')
+        self.open(action, fields)
+        status, _ = self.open('/pwdupdate')
+        return status == 200
+
+    def timed(self, method, path, data=None, scheduled=None):
+        """
+        This method sends a request and measures the duration.
+
+        :param method: GET or POST, for the endpoint group.
+        :param path: Path with query string.
+        :param data: Form fields for a POST request.
+        :param scheduled: Time the request was scheduled, default now.
+        :return: Result.
+        """
+        start = scheduled or time.perf_counter()
+        status, body = self.open(path, data)
+        error = body if status == 0 else None
+        return Result(group(method, path), status, time.perf_counter() - start, error)
+
+    def execute(self, request, scheduled=None):
+        """
+        This method sends a request, or the form request and the submit of a write flow.
+
+        :param request: Request.
+        :param scheduled: Time the request was scheduled.
+        :return: List of results.
+        """
+        if request.method == 'GET':
+            return [self.timed('GET', request.path, scheduled=scheduled)]
+        start = scheduled or time.perf_counter()
+        status, action, fields = self.form(request.path)
+        results = [Result(group('GET', request.path), status, time.perf_counter() - start, None)]
+        if status == 200:
+            fields['submit'] = 'OK'
+            results.append(self.timed('POST', action, fields))
+        return results
+
+
+def run(base_url, requests, concurrency=4, rate=0, username=None, password=None, timeout=30, report=print):
+    """
+    This function replays the requests against the server.
+
+    :param base_url: Url of the server, e.g. http://localhost:8006.
+    :param requests: List of requests.
+    :param concurrency: Number of clients that send requests at the same time.
+    :param rate: Requests per second, 0 to send the next request as soon as a client is free.
+    :param username: User for the login of the clients, required for the write flows.
+    :param password: Password of the user.
+    :param timeout: Seconds to wait for a response.
+    :param report: Function to report progress.
+    :return: Report, see function summary.
+    """
+    clients = [Client(base_url, timeout) for _ in range(concurrency)]
+    if username:
+        for client in clients:
+            if not client.login(username, password):
+                raise ValueError(f"Login van {username} op {base_url} is niet gelukt.")
+    results = []
+    lock = threading.Lock()
+    position = iter(range(len(requests)))
+    start = time.perf_counter()
+
+    def worker(client):
+        while True:
+            with lock:
+                pos = next(position, None)
+            if pos is None:
+                return
+            scheduled = None
+            if rate:
+                scheduled = start + pos / rate
+                time.sleep(max(scheduled - time.perf_counter(), 0))
+            done = client.execute(requests[pos], scheduled)
+            with lock:
+                results.extend(done)
+                if len(results) % 1000 < len(done):
+                    report(f"{len(results)} requests in {time.perf_counter() - start:.1f} seconds")
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summary(results, time.perf_counter() - start)
+
+
+def percentile(values, fraction):
+    """
+    This function returns the percentile of sorted values, nearest rank.
+    """
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def statistics(results, seconds):
+    """
+    This function returns the statistics of a list of results.
+
+    :param results: List of results.
+    :param seconds: Duration of the test.
+    :return: Dictionary with count, requests per second, latency percentiles and maximum in milliseconds, errors,
+    lock timeouts and count per status.
+    """
+    times = sorted(result.seconds * 1000 for result in results)
+    statuses = defaultdict(int)
+    for result in results:
+        statuses[result.status] += 1
+    errors = sum(cnt for status, cnt in statuses.items() if status == 0 or (status >= 400 and status != 503))
+    return dict(
+        count=len(results),
+        rps=round(len(results) / seconds, 2) if seconds else None,
+        p50=round(percentile(times, 0.5), 1),
+        p90=round(percentile(times, 0.9), 1),
+        p99=round(percentile(times, 0.99), 1),
+        max=round(times[-1], 1),
+        errors=errors,
+        error_rate=round(errors / len(results), 4),
+        locked=statuses.get(503, 0),
+        locked_rate=round(statuses.get(503, 0) / len(results), 4),
+        statuses=dict(sorted(statuses.items()))
+    )
+
+
+def summary(results, seconds):
+    """
+    This function returns the report of a load test.
+
+    :param results: List of results.
+    :param seconds: Duration of the test.
+    :return: Dictionary with seconds, statistics of all requests in total and statistics per endpoint group, and the
+    first errors.
+    """
+    groups = defaultdict(list)
+    for result in results:
+        groups[result.group].append(result)
+    return dict(
+        seconds=round(seconds, 2),
+        total=statistics(results, seconds) if results else None,
+        groups={name: statistics(rows, seconds) for name, rows in sorted(groups.items())},
+        errors=sorted({f"{result.group}: {result.error}" for result in results if result.error})[:10]
+    )
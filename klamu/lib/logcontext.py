@@ -0,0 +1,53 @@
+"""
+This module adds the request to the log records: every request gets a request id, from the X-Request-ID header of a
+proxy or a new one, and every log record written during the request gets the request id, the method, the route and the
+path. The request id is returned in the X-Request-ID header, so a response can be found back in the log.
+The fields are written in the JSON lines of the logfile, see LOG_JSON in Config and klamu.lib.my_env.JsonFormatter.
+"""
+
+import logging
+import re
+import uuid
+from flask import g, has_request_context, request
+
+# A request id from the client is used if it is short and has no special characters.
+VALID_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestFilter(logging.Filter):
+    """
+    This class adds the request fields to a log record. The filter runs in the thread that logs, so it sees the
+    request, the record is written later by the listener thread.
+    """
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.route = request.endpoint
+            record.path = request.path
+        return True
+
+
+def before_request():
+    header = request.headers.get('X-Request-ID', '')
+    g.request_id = header if VALID_ID.match(header) else uuid.uuid4().hex
+
+
+def after_request(response):
+    if g.get('request_id'):
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+
+def init_app(app):
+    """
+    This function registers the request hooks for the request id. Register before the other request hooks, so the
+    request id is known in their log records.
+
+    :param app: Flask application.
+    :return:
+    """
+    app.before_request(before_request)
+    app.after_request(after_request)
+    return
@@ -0,0 +1,353 @@
+"""
+This module collects the metrics of the application for the /metrics endpoint in the Prometheus text format: requests,
+duration and response size per endpoint, requests in progress, SQL statements and SQL time per endpoint, connection
+pool usage and the hits and misses of the page cache and the choice list cache.
+With gunicorn every worker process has its own metrics. If METRICS_DIR is set, every process writes its metrics to a
+file in this directory, at most every METRICS_FLUSH seconds, and the /metrics endpoint adds up the files of all
+processes. Counters of processes that stopped are kept, gauges only count for running processes. Clear the directory
+when the server starts, see function clear.
+The SQL metrics come from the request measurements in klamu.lib.instrument, so they need SQL_INSTRUMENT.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, g, request
+from klamu.lib import choices, instrument, pagecache
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+# Bucket bounds for the request duration in seconds and the response size in bytes.
+DURATION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE = (1000, 10000, 100000, 1000000, 10000000)
+
+# Metric name with type, help text and bucket bounds for a histogram.
+METRICS = dict(
+    klamu_requests_total=('counter', 'Requests per endpoint, method and status.', None),
+    klamu_request_duration_seconds=('histogram', 'Request duration per endpoint, including a streamed response.',
+                                    DURATION),
+    klamu_response_size_bytes=('histogram', 'Response size per endpoint, without streamed responses.', SIZE),
+    klamu_requests_in_progress=('gauge', 'Requests in progress.', None),
+    klamu_sql_statements_total=('counter', 'SQL statements per endpoint.', None),
+    klamu_sql_seconds_total=('counter', 'Time in SQL statements per endpoint.', None),
+    klamu_db_pool_size=('gauge', 'Size of the connection pool per bind.', None),
+    klamu_db_pool_checked_out=('gauge', 'Connections in use per bind.', None),
+    klamu_db_pool_overflow=('gauge', 'Connections above the pool size per bind, 0 if the pool is not full.', None),
+    klamu_cache_entries=('gauge', 'Entries per cache.', None),
+    klamu_cache_hits_total=('counter', 'Hits per cache.', None),
+    klamu_cache_misses_total=('counter', 'Misses per cache.', None)
+)
+
+
+class Registry:
+    """
+    This class keeps the metrics of the process. A metric value is identified by name and labels, the labels are a
+    tuple of (label, value) pairs. A histogram value is a list with the count per bucket, the count above the last
+    bucket and the sum of the observations.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.flushed = 0
+
+    def inc(self, name, labels=(), value=1):
+        """
+        This method adds a value to a counter or a gauge.
+        """
+        with self.lock:
+            self.values[(name, labels)] = self.values.get((name, labels), 0) + value
+        return
+
+    def set(self, name, labels=(), value=0):
+        """
+        This method sets the value of a gauge, or of a counter that is kept elsewhere, e.g. the cache hits.
+        """
+        with self.lock:
+            self.values[(name, labels)] = value
+        return
+
+    def observe(self, name, labels, value):
+        """
+        This method adds an observation to a histogram.
+        """
+        buckets = METRICS[name][2]
+        with self.lock:
+            histogram = self.values.setdefault((name, labels), [0] * (len(buckets) + 1) + [0])
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+        return
+
+    def snapshot(self):
+        """
+        This method returns the metric values in a form that can be written as json.
+
+        :return: List of [name, labels, value].
+        """
+        with self.lock:
+            return [[name, [list(label) for label in labels], list(value) if isinstance(value, list) else value]
+                    for (name, labels), value in self.values.items()]
+
+    def clear(self):
+        """
+        This method removes all metric values.
+        """
+        with self.lock:
+            self.values.clear()
+        return
+
+
+registry = Registry()
+
+
+def merge(snapshots):
+    """
+    This function adds up the metric values of the processes. Gauges of processes that stopped are skipped.
+
+    :param snapshots: List of (running, snapshot) per process.
+    :return: Dictionary with (name, labels) and value.
+    """
+    total = {}
+    for running, samples in snapshots:
+        for name, labels, value in samples:
+            if name not in METRICS or (METRICS[name][0] == 'gauge' and not running):
+                continue
+            key = (name, tuple(tuple(label) for label in labels))
+            if isinstance(value, list):
+                total[key] = [a + b for a, b in zip(total.get(key, [0] * len(value)), value)]
+            else:
+                total[key] = total.get(key, 0) + value
+    return total
+
+
+def labelset(labels):
+    """
+    This function returns the labels in the Prometheus text format.
+
+    :param labels: Tuple of (label, value) pairs.
+    :return: Labels between braces, empty string if there are no labels.
+    """
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + '}'
+
+
+def exposition(values):
+    """
+    This function returns the metric values in the Prometheus text format.
+
+    :param values: Dictionary with (name, labels) and value, see function merge.
+    :return: Text for the /metrics endpoint.
+    """
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        samples = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        if not samples:
+            continue
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            if kind != 'histogram':
+                lines.append(f"{name}{labelset(labels)} {value}")
+                continue
+            count = 0
+            for bound, cnt in zip([str(float(bound)) for bound in buckets] + ['+Inf'], value[:-1]):
+                count += cnt
+                lines.append(f"{name}_bucket{labelset(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_sum{labelset(labels)} {value[-1]}")
+            lines.append(f"{name}_count{labelset(labels)} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+def sample():
+    """
+    This function sets the metrics that are kept elsewhere in the process: the connection pools and the caches.
+
+    :return:
+    """
+    for key, engine in current_app.extensions['sqlalchemy'].engines.items():
+        pool = engine.pool
+        if hasattr(pool, 'checkedout'):
+            labels = (('bind', key or 'default'),)
+            registry.set('klamu_db_pool_size', labels, pool.size())
+            registry.set('klamu_db_pool_checked_out', labels, pool.checkedout())
+            registry.set('klamu_db_pool_overflow', labels, max(pool.overflow(), 0))
+    for name, cache in (('pages', pagecache.cache), ('choices', choices.cache)):
+        stats = cache.stats()
+        labels = (('cache', name),)
+        registry.set('klamu_cache_entries', labels, stats['entries'])
+        registry.set('klamu_cache_hits_total', labels, stats['hits'])
+        registry.set('klamu_cache_misses_total', labels, stats['misses'])
+    return
+
+
+def flush(directory):
+    """
+    This function writes the metrics of the process to its file in the directory. The file is replaced in one step,
+    so the /metrics endpoint never reads a file that is half written.
+
+    :param directory: Directory with the metrics files of the processes.
+    :return:
+    """
+    registry.flushed = time.monotonic()
+    path = os.path.join(directory, f"metrics_{os.getpid()}.json")
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w') as fh:
+        json.dump(dict(pid=os.getpid(), samples=registry.snapshot()), fh)
+    os.replace(tmp, path)
+    return
+
+
+def at_exit(directory):
+    """
+    This function writes the counters of the last requests when the process stops. Errors are ignored, the directory
+    may be gone at the end of the process.
+    """
+    try:
+        flush(directory)
+    except OSError:
+        pass
+    return
+
+
+def running(pid):
+    """
+    This function checks if a process is running.
+    """
+    if pid <= 0:
+        # Not a process id, os.kill would signal a process group.
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read(directory):
+    """
+    This function reads the metrics files of the processes.
+
+    :param directory: Directory with the metrics files of the processes.
+    :return: List of (running, snapshot) per process.
+    """
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith('metrics_') and name.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        snapshots.append((data['pid'] == os.getpid() or running(data['pid']), data['samples']))
+    return snapshots
+
+
+def clear(directory):
+    """
+    This function removes the metrics files from the directory, e.g. when the server starts.
+
+    :param directory: Directory with the metrics files of the processes.
+    :return:
+    """
+    for name in os.listdir(directory):
+        if name.startswith('metrics_'):
+            os.remove(os.path.join(directory, name))
+    return
+
+
+def render():
+    """
+    This function returns the metrics of all processes in the Prometheus text format.
+
+    :return: Text for the /metrics endpoint.
+    """
+    sample()
+    directory = current_app.config.get('METRICS_DIR')
+    if not directory:
+        return exposition(merge([(True, registry.snapshot())]))
+    flush(directory)
+    return exposition(merge(read(directory)))
+
+
+def ready(timeout):
+    """
+    This function runs a query on every database of the application and measures the duration.
+
+    :param timeout: Maximum duration of the query in seconds.
+    :return: Dictionary with per bind the duration, the status (True if the query finished in time) and the error.
+    """
+    result = {}
+    for key, engine in current_app.extensions['sqlalchemy'].engines.items():
+        start = time.perf_counter()
+        error = None
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1 FROM cd LIMIT 1")).all()
+        except SQLAlchemyError as exc:
+            error = f"{exc.__class__.__name__}: {exc.orig if hasattr(exc, 'orig') else exc}"
+        seconds = time.perf_counter() - start
+        result[key or 'default'] = dict(seconds=round(seconds, 4), ready=error is None and seconds <= timeout,
+                                        error=error)
+    return result
+
+
+def before_request():
+    g.metrics_start = time.perf_counter()
+    registry.inc('klamu_requests_in_progress')
+
+
+def after_request(response):
+    # The size of a streamed page is not known, calculating it would collect the page before it is sent.
+    size = None if response.is_streamed else response.calculate_content_length()
+    g.metrics_response = response.status_code, size
+    return response
+
+
+def teardown_request(exc):
+    # Runs before the teardown of klamu.lib.instrument, the request measurements are still in g.
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    registry.inc('klamu_requests_in_progress', value=-1)
+    status, size = g.pop('metrics_response', (500, None))
+    labels = (('endpoint', request.endpoint or 'none'),)
+    registry.inc('klamu_requests_total', labels + (('method', request.method), ('status', str(status))))
+    registry.observe('klamu_request_duration_seconds', labels, time.perf_counter() - start)
+    if size is not None:
+        registry.observe('klamu_response_size_bytes', labels, size)
+    measure = instrument.stats()
+    if measure is not None:
+        registry.inc('klamu_sql_statements_total', labels, measure['statements'])
+        registry.inc('klamu_sql_seconds_total', labels, measure['sql'])
+    directory = current_app.config.get('METRICS_DIR')
+    if directory and time.monotonic() - registry.flushed >= current_app.config.get('METRICS_FLUSH', 1):
+        sample()
+        flush(directory)
+
+
+def init_app(app):
+    """
+    This function registers the request hooks for the metrics. Register after klamu.lib.instrument, so the metrics
+    teardown runs first. Nothing is registered if METRICS is not set.
+
+    :param app: Flask application.
+    :return:
+    """
+    if not app.config.get('METRICS'):
+        return
+    directory = app.config.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        atexit.unregister(at_exit)
+        atexit.register(at_exit, directory)
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    return
@@ -0,0 +1,195 @@
+"""
+This module handles the schema migrations of the klamu database. Each migration has a version number and is applied
+once, the schema version of the database is kept in the SQLite user_version pragma.
+Migrations are written to be idempotent, so an interrupted migration can be run again.
+A new migration is added at the end of MIGRATIONS with the next version number. Migrations already shipped are never
+changed.
+"""
+
+import time
+from flask import current_app
+from klamu import db
+from klamu.lib import db_model as ds, search
+from sqlalchemy import inspect, text
+
+
+def get_version():
+    """
+    This function returns the schema version of the database.
+
+    :return: Schema version, 0 for a database that was never migrated.
+    """
+    return db.session.execute(text("PRAGMA user_version")).scalar()
+
+
+def set_version(version):
+    """
+    This function sets the schema version of the database. The function does not commit.
+
+    :param version: Schema version.
+    :return:
+    """
+    db.session.execute(text(f"PRAGMA user_version = {int(version)}"))
+    return
+
+
+def add_column(table, column, ddl):
+    """
+    This function adds a column to a table if the column does not exist.
+
+    :param table: Name of the table.
+    :param column: Name of the column.
+    :param ddl: Column definition (type and constraints).
+    :return:
+    """
+    existing = [col['name'] for col in inspect(db.session.connection()).get_columns(table)]
+    if column not in existing:
+        current_app.logger.info(f"Add column {table}.{column}")
+        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return
+
+
+def create_index(name, table, *columns):
+    """
+    This function creates an index if it does not exist.
+
+    :param name: Name of the index.
+    :param table: Name of the table.
+    :param columns: Names of the columns in the index.
+    :return:
+    """
+    current_app.logger.info(f"Create index {name} on {table}({', '.join(columns)})")
+    db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+    return
+
+
+def migration_1():
+    """
+    Indexes on the foreign keys, and on cd_id with volgnummer for the CD content. The indexes come first, the counters
+    of the next migration are counted with them.
+    """
+    create_index('ix_cd_uitgever_id', 'cd', 'uitgever_id')
+    create_index('ix_kompositie_komponist_id', 'kompositie', 'komponist_id')
+    create_index('ix_uitvoering_cd_volgnummer', 'uitvoering', 'cd_id', 'volgnummer')
+    create_index('ix_uitvoering_dirigent_id', 'uitvoering', 'dirigent_id')
+    create_index('ix_uitvoering_kompositie_id', 'uitvoering', 'kompositie_id')
+    create_index('ix_uitvoering_uitvoerders_id', 'uitvoering', 'uitvoerders_id')
+    db.session.execute(text("ANALYZE"))
+    return
+
+
+def migration_2():
+    """
+    Counter columns for the number of uitvoeringen, CDs and komposities.
+    """
+    for table in ['cd', 'dirigent', 'kompositie', 'uitgever', 'uitvoerders']:
+        add_column(table, 'items_cnt', "INTEGER NOT NULL DEFAULT 0")
+    add_column('komponist', 'komposities_cnt', "INTEGER NOT NULL DEFAULT 0")
+    add_column('komponist', 'items_cnt', "INTEGER NOT NULL DEFAULT 0")
+    ds.rebuild_counters()
+    return
+
+
+def migration_3():
+    """
+    Full-text search index.
+    """
+    search.rebuild()
+    return
+
+
+def migration_4():
+    """
+    Data version per table, for conditional GET of the pages.
+    """
+    ds.DataVersion.__table__.create(bind=db.session.connection(), checkfirst=True)
+    now = int(time.time())
+    tables = ['cd', 'dirigent', 'komponist', 'kompositie', 'uitgever', 'uitvoerders', 'uitvoering']
+    for table in tables:
+        # Seed modified from the modified epochs if the table has them.
+        if table in ['cd', 'komponist', 'uitvoering']:
+            modified = db.session.execute(text(f"SELECT max(modified) FROM {table}")).scalar() or now
+        else:
+            modified = now
+        db.session.execute(text("INSERT OR IGNORE INTO data_version (name, version, modified) "
+                                "VALUES (:name, 1, :modified)"), dict(name=table, modified=modified))
+    return
+
+
+# List of migrations: version, function. The docstring of the function is the description of the migration.
+MIGRATIONS = [
+    (1, migration_1),
+    (2, migration_2),
+    (3, migration_3),
+    (4, migration_4)
+]
+
+
+def latest_version():
+    """
+    This function returns the version of the last migration.
+    """
+    return MIGRATIONS[-1][0]
+
+
+def pending():
+    """
+    This function returns the migrations that are not applied on the database.
+
+    :return: List of (version, function) for the migrations to apply.
+    """
+    version = get_version()
+    return [(nr, migration) for (nr, migration) in MIGRATIONS if nr > version]
+
+
+def upgrade():
+    """
+    This function brings the database to the latest schema version. For a new database all tables are created from
+    the models and the database gets the latest version. For an existing database the pending migrations are applied
+    in version order, every migration in its own transaction.
+
+    :return: List of versions that have been applied.
+    """
+    applied = []
+    if not inspect(db.session.connection()).has_table('cd'):
+        current_app.logger.info("New database, create all tables.")
+        db.session.commit()
+        db.create_all()
+        set_version(latest_version())
+        db.session.commit()
+        return applied
+    for version, migration in pending():
+        current_app.logger.info(f"Apply migration {version}: {migration.__doc__.strip()}")
+        migration()
+        set_version(version)
+        db.session.commit()
+        applied.append(version)
+    return applied
+
+
+def check_indexes():
+    """
+    This function compares the indexes defined in the models with the indexes in the database. Foreign key columns
+    that are not the first column of any index in the database are reported as well.
+
+    :return: List of messages, empty if no indexes are missing.
+    """
+    messages = []
+    inspector = inspect(db.session.connection())
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            messages.append(f"Table {table.name} is missing.")
+            continue
+        existing = {idx['name']: idx['column_names'] for idx in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            columns = [col.name for col in index.columns]
+            if index.name not in existing:
+                messages.append(f"Index {index.name} on {table.name}({', '.join(columns)}) is missing.")
+            elif existing[index.name] != columns:
+                messages.append(f"Index {index.name} on {table.name} has columns "
+                                f"({', '.join(existing[index.name])}) instead of ({', '.join(columns)}).")
+        leading = [columns[0] for columns in existing.values() if columns]
+        for fk in table.foreign_keys:
+            if fk.parent.name not in leading:
+                messages.append(f"Foreign key {table.name}.{fk.parent.name} has no index.")
+    return messages
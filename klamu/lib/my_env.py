@@ -4,12 +4,16 @@ setup and initializing the config file.
 Also other utilities find their home here.
 """
 
+import atexit
 import configparser
+import copy
 # import datetime
+import json
 import logging
 import logging.handlers
 import os
 import platform
+import queue
 import time
 from calendar import timegm
 from datetime import datetime
@@ -74,33 +78,82 @@ def get_modulename(scriptname):
     return module
 
 
-def init_loghandler(modulename):
+# Fields of a log record that are written in a JSON line, if the record has them. The request fields are set by
+# klamu.lib.logcontext and klamu.lib.instrument.
+JSON_FIELDS = ['request_id', 'method', 'route', 'path', 'status', 'duration_ms', 'sql_count', 'sql_ms']
+
+# Queue handler on the root logger and the listener that writes the records, None before init_loghandler.
+queue_handler = None
+listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    This class formats a log record as a JSON line: time, level, logger, module, function, line, message and the
+    fields of JSON_FIELDS that the record has.
     """
-    This function initializes the loghandler. Logfilename consists of calling module name + computername.
-    Format of the logmessage is specified in basicConfig function.
 
-    :param modulename: The name of the module. Each module will create it's own logfile.
-    :return: Log Handler
+    def format(self, record):
+        line = dict(
+            time=self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            level=record.levelname,
+            logger=record.name,
+            module=record.module,
+            function=record.funcName,
+            line=record.lineno,
+            message=record.getMessage()
+        )
+        for field in JSON_FIELDS:
+            if hasattr(record, field):
+                line[field] = getattr(record, field)
+        if record.exc_info:
+            line['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            line['exception'] = record.exc_text
+        return json.dumps(line, default=str)
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    This class puts the log records on the queue with the traceback in exc_text. The QueueHandler of the standard
+    library adds the traceback to the message and removes it from the record, so the JSON line has no exception field.
+    """
+
+    def prepare(self, record):
+        # The traceback and the arguments can't be kept on the queue, the listener gets them as text.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def log_handlers(modulename, json_lines=False):
+    """
+    This function returns the handlers that write the log records: a rotating file and the console.
+
+    :param modulename: The name of the module, for the logfile name.
+    :param json_lines: True for JSON lines in the logfile instead of the | separated format.
+    :return: List of handlers.
     """
     logdir = os.getenv("LOGDIR")
-    loglevel = os.getenv("LOGLEVEL").upper()
     # Define logfileName
     logfn = "{module}_{host}.log".format(module=modulename, host=platform.node())
     logfile = os.path.join(logdir, logfn)
-    # Configure the root logger
-    logger = logging.getLogger()
-    level = logging.getLevelName(loglevel)
-    logger.setLevel(level)
     # Get logfiles of 1M
     maxbytes = 1024 * 1024
     rfh = logging.handlers.RotatingFileHandler(logfile, maxBytes=maxbytes, backupCount=5)
     # Create Formatter for file
-    formatter_file = logging.Formatter(fmt='%(asctime)s|%(module)s|%(funcName)s|%(lineno)d|%(levelname)s|%(message)s',
-                                       datefmt='%d/%m/%Y|%H:%M:%S')
+    if json_lines:
+        formatter_file = JsonFormatter()
+    else:
+        formatter_file = logging.Formatter(
+            fmt='%(asctime)s|%(module)s|%(funcName)s|%(lineno)d|%(levelname)s|%(message)s',
+            datefmt='%d/%m/%Y|%H:%M:%S')
     # Add Formatter to Rotating File Handler
     rfh.setFormatter(formatter_file)
-    # Add Handler to the logger
-    logger.addHandler(rfh)
     # Configure Console Handler
     ch = logging.StreamHandler()
     ch.setLevel(logging.DEBUG)
@@ -109,12 +162,79 @@ def init_loghandler(modulename):
                                           datefmt='%H:%M:%S')
     # Add Formatter to Console Handler
     ch.setFormatter(formatter_console)
-    logger.addHandler(ch)
+    return [rfh, ch]
+
+
+def init_loghandler(modulename, json_lines=False, filters=None):
+    """
+    This function initializes the loghandler. Logfilename consists of calling module name + computername.
+    The root logger gets a queue handler, the calling thread only puts the record on the queue. A listener thread
+    writes the records to the logfile and the console, so file I/O and the rotation checks are not done in the
+    request. The handlers are added once, a next call (e.g. a next create_app) only sets the level.
+
+    :param modulename: The name of the module. Each module will create it's own logfile.
+    :param json_lines: True for JSON lines in the logfile, see JsonFormatter.
+    :param filters: Filters for the queue handler, they run in the calling thread, e.g. to add request fields.
+    :return: Root logger
+    """
+    global queue_handler, listener
+    loglevel = os.getenv("LOGLEVEL").upper()
+    # Configure the root logger
+    logger = logging.getLogger()
+    level = logging.getLevelName(loglevel)
+    logger.setLevel(level)
     logging.getLogger('neo4j.bolt').setLevel(logging.WARNING)
     logging.getLogger('httpstream').setLevel(logging.WARNING)
+    if queue_handler is not None:
+        return logger
+    queue_handler = RecordQueueHandler(queue.SimpleQueue())
+    for log_filter in filters or []:
+        queue_handler.addFilter(log_filter)
+    listener = logging.handlers.QueueListener(queue_handler.queue, *log_handlers(modulename, json_lines),
+                                              respect_handler_level=True)
+    listener.start()
+    logger.addHandler(queue_handler)
     return logger
 
 
+def close_loghandler():
+    """
+    This function writes the records on the queue, stops the listener and removes the queue handler from the root
+    logger. The next init_loghandler sets up the handlers again.
+
+    :return:
+    """
+    global queue_handler, listener
+    if queue_handler is None:
+        return
+    logging.getLogger().removeHandler(queue_handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    queue_handler, listener = None, None
+    return
+
+
+def restart_listener():
+    """
+    This function starts a new listener in a forked process, e.g. a gunicorn worker of a preloaded application. The
+    listener thread of the parent process does not exist in the child.
+
+    :return:
+    """
+    global listener
+    if listener is None:
+        return
+    queue_handler.queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(queue_handler.queue, *listener.handlers, respect_handler_level=True)
+    listener.start()
+    return
+
+
+atexit.register(close_loghandler)
+os.register_at_fork(after_in_child=restart_listener)
+
+
 def date2epoch(ds):
     """
     This function will convert a date time string to epoch for storage in SQLite table.
@@ -173,40 +293,61 @@ def monthdisp(ym):
 
 class LoopInfo:
     """
-    This class handles a FOR loop information handling.
+    This class handles a FOR loop information handling. Progress messages include the throughput in iterations per
+    second.
     """
 
-    def __init__(self, attribname, triggercnt):
+    def __init__(self, attribname, triggercnt, report=print):
         """
         Initialization of FOR loop information handling. Start message is printed for attribname. Information progress
         message will be printed for every triggercnt iterations.
 
         :param attribname:
         :param triggercnt:
+        :param report: Function to report the messages, print by default. Use a logger method in the application.
         :return:
         """
         self.rec_cnt = 0
         self.loop_cnt = 0
         self.attribname = attribname
         self.triggercnt = triggercnt
+        self.report = report
+        self.start = time.perf_counter()
         curr_time = datetime.now().strftime("%H:%M:%S")
-        print("{0} - Start working on {1}".format(curr_time, str(self.attribname)))
+        self.report("{0} - Start working on {1}".format(curr_time, str(self.attribname)))
         return
 
-    def info_loop(self):
+    def elapsed(self):
+        """
+        Seconds since the start of the loop.
+        """
+        return time.perf_counter() - self.start
+
+    def throughput(self):
+        """
+        Number of iterations per second since the start of the loop.
+        """
+        elapsed = self.elapsed()
+        return self.rec_cnt / elapsed if elapsed > 0 else 0.0
+
+    def info_loop(self, cnt=1):
         """
         Check number of iterations. Print message if number of iterations greater or equal than triggercnt.
+
+        :param cnt: Number of iterations that are handled, for loops that handle records in batches.
         :return:
         """
-        self.rec_cnt += 1
-        self.loop_cnt += 1
+        self.rec_cnt += cnt
+        self.loop_cnt += cnt
         if self.loop_cnt >= self.triggercnt:
             curr_time = datetime.now().strftime("%H:%M:%S")
-            print("{0} - {1} {2} handled".format(curr_time, str(self.rec_cnt), str(self.attribname)))
+            self.report("{0} - {1} {2} handled ({3:.0f}/s)".format(curr_time, str(self.rec_cnt), str(self.attribname),
+                                                                  self.throughput()))
             self.loop_cnt = 0
         return
 
     def end_loop(self):
         curr_time = datetime.now().strftime("%H:%M:%S")
-        print("{0} - {1} {2} handled - End.\n".format(curr_time, str(self.rec_cnt), str(self.attribname)))
+        self.report("{0} - {1} {2} handled in {3:.1f}s ({4:.0f}/s) - End.\n"
+                    .format(curr_time, str(self.rec_cnt), str(self.attribname), self.elapsed(), self.throughput()))
         return
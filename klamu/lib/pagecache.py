@@ -0,0 +1,129 @@
+"""
+This module caches the rendered pages for anonymous visitors. A page is identified by endpoint and url, and is kept
+with the data versions of the tables on the page. A page is only returned if the data versions did not change and
+the time to live of the endpoint did not expire, so pages stay correct if the data is changed by another worker.
+The number of pages is limited, the least recently used page is removed first.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PageCache:
+    """
+    This class handles the page cache. Size and time to live per endpoint are set from the application configuration
+    with PAGE_CACHE_SIZE and PAGE_CACHE_TTL.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.counters = {}
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def count(self, endpoint, counter):
+        """
+        This method increments a counter (hits, misses, expired, stale) for the endpoint. Call with lock acquired.
+        """
+        counters = self.counters.setdefault(endpoint, dict(hits=0, misses=0, expired=0, stale=0))
+        counters[counter] += 1
+        return
+
+    def get(self, endpoint, url, versions):
+        """
+        This method returns the cached page.
+
+        :param endpoint: Endpoint of the page.
+        :param url: Full path of the request.
+        :param versions: Tuple with the data versions of the tables on the page.
+        :return: Cache entry, dictionary with data and mimetype, or None if the page needs to be rendered.
+        """
+        key = (endpoint, url)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.count(endpoint, 'misses')
+                return None
+            if entry['versions'] != versions:
+                self.count(endpoint, 'stale')
+                del self.entries[key]
+                return None
+            if entry['expires'] < time.monotonic():
+                self.count(endpoint, 'expired')
+                del self.entries[key]
+                return None
+            self.count(endpoint, 'hits')
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, endpoint, url, versions, tables, data, mimetype, ttl, size):
+        """
+        This method adds a rendered page to the cache.
+
+        :param endpoint: Endpoint of the page.
+        :param url: Full path of the request.
+        :param versions: Tuple with the data versions of the tables on the page.
+        :param tables: Names of the tables on the page.
+        :param data: Rendered page (bytes).
+        :param mimetype: Mimetype of the page.
+        :param ttl: Time to live of the page in seconds.
+        :param size: Maximum number of pages in the cache.
+        :return:
+        """
+        entry = dict(
+            versions=versions,
+            tables=frozenset(tables),
+            expires=time.monotonic() + ttl,
+            data=data,
+            mimetype=mimetype
+        )
+        with self.lock:
+            self.entries[(endpoint, url)] = entry
+            self.entries.move_to_end((endpoint, url))
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return
+
+    def invalidate(self, *tables):
+        """
+        This method removes the pages that show one of the tables.
+
+        :param tables: Names of the changed tables.
+        :return:
+        """
+        tables = set(tables)
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry['tables'] & tables]:
+                del self.entries[key]
+        return
+
+    def clear(self):
+        """
+        This method removes all pages from the cache.
+        """
+        with self.lock:
+            self.entries.clear()
+        return
+
+    def stats(self):
+        """
+        This method returns the cache statistics.
+
+        :return: Dictionary with entries, evictions, hits, misses and hit rate in total, and counters per endpoint.
+        """
+        with self.lock:
+            hits = sum(counters['hits'] for counters in self.counters.values())
+            requests = sum(sum(counters.values()) for counters in self.counters.values())
+            return dict(
+                entries=len(self.entries),
+                evictions=self.evictions,
+                hits=hits,
+                misses=requests - hits,
+                hit_rate=round(hits / requests, 3) if requests else None,
+                endpoints={endpoint: dict(counters) for endpoint, counters in sorted(self.counters.items())}
+            )
+
+
+cache = PageCache()
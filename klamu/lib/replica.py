@@ -0,0 +1,154 @@
+"""
+This module routes the read statements of GET requests to a read replica of the database, e.g. a copy of the SQLite
+file that is refreshed periodically. The replica is the bind 'replica' in SQLALCHEMY_BINDS, without this bind all
+statements go to the primary database.
+Only SELECT statements go to the replica. As soon as the session flushes or executes an INSERT, UPDATE or DELETE, all
+further statements of the request go to the primary database. After an edit the GET requests of the same user read
+from the primary database for READ_YOUR_WRITES seconds, so the page shown after an update has the change. The choice
+lists are always read from the primary database, they are cached in the process for all users. The update and delete
+methods of the models read from the primary database too, see function writes.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.elements import TextClause
+
+# Name of the bind for the read replica.
+BIND = 'replica'
+
+
+def reads(clause):
+    """
+    This function checks if a statement only reads.
+
+    :param clause: SQLAlchemy statement.
+    :return: True for a SELECT statement.
+    """
+    if clause is None:
+        return False
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip()[:6].upper() == 'SELECT'
+    return bool(getattr(clause, 'is_select', False))
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECT statements to the read replica if session info replica is set, and all other statements
+    to the primary database. Session info written is set on the first statement that changes the database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (self._flushing or (clause is not None and not reads(clause))):
+            self.info['written'] = True
+        elif bind is None and self.info.get('replica') and not self.info.get('written') and reads(clause):
+            engine = self._db.engines.get(BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+def available():
+    """
+    This function checks if a read replica is configured.
+    """
+    return BIND in current_app.extensions['sqlalchemy'].engines
+
+
+@contextmanager
+def reading():
+    """
+    Context manager to read from the replica outside of a GET request, e.g. for an export on the command line.
+    Changes made before the block must be committed, the block reads from the replica until the next change.
+
+    :return:
+    """
+    info = current_app.extensions['sqlalchemy'].session.info
+    previous = info.get('replica'), info.pop('written', None)
+    info['replica'] = available()
+    try:
+        yield
+    finally:
+        info['replica'] = previous[0]
+        if previous[1]:
+            info['written'] = True
+
+
+@contextmanager
+def primary():
+    """
+    Context manager to read from the primary database in a GET request, for data that is kept after the request: the
+    choice list cache of the process must not get lists from a replica that is behind the primary.
+
+    :return:
+    """
+    info = current_app.extensions['sqlalchemy'].session.info
+    previous = info.get('replica')
+    info['replica'] = False
+    try:
+        yield
+    finally:
+        info['replica'] = previous
+
+
+def writes(func):
+    """
+    Decorator for a function that reads and then changes the database, e.g. the delete of a record that checks the
+    references first. All statements of the function go to the primary database, also in a GET request: a check on a
+    replica that is behind the primary could allow a change that leaves orphaned records.
+
+    :param func: Function that changes the database.
+    :return: Decorated function.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with primary():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def before_request():
+    """
+    Read from the replica for GET and HEAD requests, unless the user changed the database in the last
+    READ_YOUR_WRITES seconds.
+    """
+    info = current_app.extensions['sqlalchemy'].session.info
+    info.pop('written', None)
+    info['replica'] = request.method in ('GET', 'HEAD') and available() and \
+        session.get('primary_until', 0) < time.time()
+    return
+
+
+def after_request(response):
+    """
+    Remember the time until which the user reads from the primary database, if the request changed the database.
+    """
+    info = current_app.extensions['sqlalchemy'].session.info
+    if info.get('written') and available():
+        session['primary_until'] = int(time.time()) + current_app.config.get('READ_YOUR_WRITES', 30)
+    return response
+
+
+def teardown_request(exc):
+    """
+    Remove the routing flags from the session info.
+    """
+    info = current_app.extensions['sqlalchemy'].session.info
+    info.pop('replica', None)
+    info.pop('written', None)
+    return
+
+
+def init_app(app):
+    """
+    This function registers the request hooks for the replica routing.
+
+    :param app: Flask application.
+    :return:
+    """
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    return
@@ -0,0 +1,155 @@
+"""
+This module handles the full-text search on the catalog. The search index is an SQLite FTS5 virtual table with one
+row per CD, kompositie, komponist, dirigent and uitvoerders. The rowid of the index is calculated from the ID of the
+record and the kind of record, so the index row for a record can be replaced or removed without searching.
+The index is kept in sync by the update() and delete() methods of the models, function rebuild() refills the index.
+"""
+
+import re
+from klamu import db
+from sqlalchemy import DDL, event, text
+
+# Kind of record with code used in the rowid and label for the search results.
+KINDS = dict(
+    cd=(1, 'CDs'),
+    kompositie=(2, 'Komposities'),
+    komponist=(3, 'Komponisten'),
+    dirigent=(4, 'Dirigenten'),
+    uitvoerders=(5, 'Uitvoerders')
+)
+KIND_CNT = 8
+
+# Query per kind to collect id, label and extra text for the index.
+SOURCES = dict(
+    cd="SELECT id, titel AS label, coalesce(identificatie, '') AS extra FROM cd",
+    kompositie="SELECT id, naam AS label, '' AS extra FROM kompositie",
+    komponist="SELECT id, trim(coalesce(voornaam, '') || ' ' || naam) AS label, '' AS extra FROM komponist",
+    dirigent="SELECT id, trim(coalesce(voornaam, '') || ' ' || naam) AS label, '' AS extra FROM dirigent",
+    uitvoerders="SELECT id, naam AS label, '' AS extra FROM uitvoerders"
+)
+
+# Weight of the columns kind, label and extra in the ranking. This is stored as the rank function of the index, so
+# that FTS5 can sort on rank internally.
+RANK = "bm25(0.0, 10.0, 1.0)"
+
+
+# Prefix indexes for 2 and 3 characters are added to keep prefix searches fast.
+CREATE = "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(kind UNINDEXED, label, extra, " \
+         "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+CONFIG = f"INSERT INTO search_index (search_index, rank) VALUES ('rank', '{RANK}')"
+
+# Create the search index together with the tables in db.create_all().
+event.listen(db.metadata, 'after_create', DDL(CREATE))
+event.listen(db.metadata, 'after_create', DDL(CONFIG))
+
+
+def create():
+    """
+    This function creates the FTS5 search index table if it does not exist.
+
+    :return:
+    """
+    db.session.execute(text(CREATE))
+    db.session.execute(text(CONFIG))
+    return
+
+
+def rowid(kind, nid):
+    """
+    This function returns the rowid in the search index for a record.
+
+    :param kind: Kind of record (table name).
+    :param nid: ID of the record.
+    :return: rowid in the search index.
+    """
+    return int(nid) * KIND_CNT + KINDS[kind][0]
+
+
+def index(kind, nid):
+    """
+    This function adds or replaces the record in the search index. Changes need to be flushed to the database before
+    calling this function. The function does not commit.
+
+    :param kind: Kind of record (table name).
+    :param nid: ID of the record.
+    :return:
+    """
+    remove(kind, nid)
+    db.session.execute(text(f"{insert_query(kind)} WHERE id = :nid"), dict(nid=nid))
+    return
+
+
+def insert_query(kind):
+    """
+    This function returns the statement that copies the records of a kind into the search index.
+
+    :param kind: Kind of record (table name).
+    :return: INSERT statement, a WHERE clause on id can be added.
+    """
+    return f"INSERT INTO search_index (rowid, kind, label, extra) " \
+           f"SELECT id * {KIND_CNT} + {KINDS[kind][0]}, '{kind}', label, extra FROM ({SOURCES[kind]})"
+
+
+def remove(kind, nid):
+    """
+    This function removes the record from the search index. The function does not commit.
+
+    :param kind: Kind of record (table name).
+    :param nid: ID of the record.
+    :return:
+    """
+    db.session.execute(text("DELETE FROM search_index WHERE rowid = :rowid"), dict(rowid=rowid(kind, nid)))
+    return
+
+
+def rebuild():
+    """
+    This function creates the search index if required and refills it from all tables. The function does not commit.
+
+    :return: Number of records in the index.
+    """
+    create()
+    db.session.execute(text("DELETE FROM search_index"))
+    for kind in KINDS:
+        db.session.execute(text(insert_query(kind)))
+    db.session.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+    return db.session.execute(text("SELECT count(*) FROM search_index")).scalar()
+
+
+def match_query(term):
+    """
+    This function converts the search term from the user into an FTS5 query. Every word in the term is a prefix
+    search and all words need to match. FTS5 syntax in the term is ignored.
+
+    :param term: Search string from the user.
+    :return: FTS5 query string, or None if there are no words in the term.
+    """
+    words = re.findall(r"\w+", term or '')
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search(term, limit=25):
+    """
+    This function searches the index for the term. Results are ranked on relevance within each kind of record, so a
+    term that matches many komposities still shows the best CDs and komponisten. Ranking all matches and taking the
+    best ones per kind is done in one statement, this is faster than a statement per kind.
+
+    :param term: Search string from the user.
+    :param limit: Maximum number of results per kind.
+    :return: List of (kind label, kind, list of results) for kinds with results, in the order of KINDS. Each result is
+    a dictionary with nid and label.
+    """
+    query = match_query(term)
+    if query is None:
+        return []
+    rows = db.session.execute(text("SELECT kind, rowid, label FROM "
+                                   "(SELECT kind, rowid, label, row_number() OVER (PARTITION BY kind ORDER BY rank) "
+                                   "AS pos FROM search_index WHERE search_index MATCH :query) "
+                                   "WHERE pos <= :limit ORDER BY pos"),
+                              dict(query=query, limit=limit))
+    groups = {kind: [] for kind in KINDS}
+    for kind, row_id, label in rows:
+        groups[kind].append(dict(nid=row_id // KIND_CNT, label=label))
+    return [(KINDS[kind][1], kind, results) for kind, results in groups.items() if results]
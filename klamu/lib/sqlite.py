@@ -0,0 +1,131 @@
+"""
+This module handles the connection setup for the SQLite database. The pragmas from configuration SQLITE_PRAGMAS are
+applied on every new connection of an engine, e.g. WAL journal mode so readers do not block the writer. When the
+process ends, PRAGMA optimize is run to update the statistics of the query planner.
+A request that waits longer than busy_timeout for the write lock gets status 503 with Retry-After, instead of an
+internal server error, so clients and load tests can tell a busy database from an error.
+Engines for other databases are not changed.
+"""
+
+import atexit
+import weakref
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+
+# Order in which the pragmas are applied. Journal mode first, synchronous depends on the journal mode.
+ORDER = ['journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store']
+
+# Engines that are configured, PRAGMA optimize is run for these engines when the process ends.
+configured = weakref.WeakSet()
+
+
+def pragma_statements(pragmas):
+    """
+    This function returns the PRAGMA statements for the pragmas, in the order of ORDER.
+
+    :param pragmas: Dictionary with pragma name and value. A value None is not applied.
+    :return: List of PRAGMA statements.
+    """
+    names = sorted(pragmas, key=lambda name: ORDER.index(name) if name in ORDER else len(ORDER))
+    return [f"PRAGMA {name} = {pragmas[name]}" for name in names if pragmas[name] is not None]
+
+
+def configure(engine, pragmas):
+    """
+    This function sets the pragmas on every new connection of the engine, and runs PRAGMA optimize for the engine
+    when the process ends. The function does nothing for an engine that is not SQLite, or if it was called before for
+    the engine.
+
+    :param engine: SQLAlchemy engine.
+    :param pragmas: Dictionary with pragma name and value, see SQLITE_PRAGMAS in Config.
+    :return:
+    """
+    if engine.dialect.name != 'sqlite' or engine in configured:
+        return
+    configured.add(engine)
+    statements = pragma_statements(pragmas or {})
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+    return
+
+
+def optimize(engine):
+    """
+    This function runs PRAGMA optimize on the database of the engine. Errors are ignored, the database may be gone at
+    the end of the process.
+
+    :param engine: SQLAlchemy engine.
+    :return:
+    """
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+    except SQLAlchemyError:
+        pass
+    return
+
+
+@atexit.register
+def optimize_all():
+    """
+    This function runs PRAGMA optimize for all configured engines that still exist.
+
+    :return:
+    """
+    for engine in list(configured):
+        optimize(engine)
+    return
+
+
+def settings(engine, pragmas=None):
+    """
+    This function returns the effective value of the pragmas on a connection of the engine.
+
+    :param engine: SQLAlchemy engine.
+    :param pragmas: Names of the pragmas, default the pragmas in ORDER.
+    :return: Dictionary with pragma name and value, empty for an engine that is not SQLite.
+    """
+    if engine.dialect.name != 'sqlite':
+        return {}
+    with engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in (pragmas or ORDER)}
+
+
+def locked(exc):
+    """
+    This function checks if an exception is the SQLite lock timeout: the database is locked by another connection for
+    longer than busy_timeout.
+
+    :param exc: Exception.
+    :return: True for a lock timeout.
+    """
+    return isinstance(exc, OperationalError) and 'database is locked' in str(exc.orig)
+
+
+def lock_timeout(exc):
+    """
+    Error handler for OperationalError: status 503 for a lock timeout, other errors are raised again.
+    """
+    if not locked(exc):
+        raise exc
+    current_app.logger.warning(f"Lock timeout on {request.method} {request.path}")
+    return current_app.response_class("De database is bezet, probeer het later opnieuw.", status=503,
+                                      headers={'Retry-After': '1'}, mimetype='text/plain')
+
+
+def init_app(app):
+    """
+    This function registers the error handler for the lock timeout.
+
+    :param app: Flask application.
+    :return:
+    """
+    app.register_error_handler(OperationalError, lock_timeout)
+    return
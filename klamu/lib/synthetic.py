@@ -0,0 +1,196 @@
+"""
+This module fills an empty database with a synthetic catalog, for tests and benchmarks: uitgevers, komponisten,
+komposities, dirigenten, uitvoerders, CDs and uitvoeringen. The catalog is deterministic, the same number of
+uitvoeringen and the same seed give the same records.
+The number of records per table follows from the number of uitvoeringen, with the proportions of a real collection:
+about ten tracks per CD and five uitvoeringen per kompositie. A few komponisten have most of the komposities and a few
+komposities, dirigenten and uitvoerders have most of the uitvoeringen, so the catalog has the long lists that make
+pages slow.
+"""
+
+import itertools
+import random
+from klamu import db
+from klamu.lib import choices, search
+from klamu.lib.db_model import *
+from sqlalchemy import func, insert, select
+
+# Number of uitvoeringen per scale.
+SCALES = dict(small=1000, medium=10000, large=100000)
+# Number of uitvoeringen per record of the table, and the minimum number of records.
+RATIOS = dict(kompositie=5, komponist=100, dirigent=200, uitvoerders=50, uitgever=1000)
+MINIMUM = 5
+# Fraction of the uitvoeringen with a dirigent.
+DIRIGENT_FRACTION = 0.7
+# Number of rows that are added in one INSERT.
+BATCH_SIZE = 5000
+# Created and modified timestamps start at 1 January 2010, one record per STEP seconds.
+EPOCH = 1262304000
+STEP = 600
+
+VOORNAMEN = ['Anna', 'Carl', 'Clara', 'Dmitri', 'Edvard', 'Felix', 'Franz', 'Frederic', 'Georg', 'Gustav',
+             'Hector', 'Hildegard', 'Igor', 'Jean', 'Johann', 'Johannes', 'Joseph', 'Leos', 'Ludwig', 'Maurice',
+             'Modest', 'Nadia', 'Pjotr', 'Richard', 'Robert', 'Sergej', 'Wolfgang', 'Antonin', 'Claude', 'Fanny']
+NAMEN = ['Albeniz', 'Bartok', 'Berlioz', 'Brahms', 'Bruckner', 'Chausson', 'Debussy', 'Dvorak', 'Elgar', 'Faure',
+         'Franck', 'Grieg', 'Handel', 'Haydn', 'Janacek', 'Liszt', 'Mahler', 'Mendelssohn', 'Messiaen', 'Mozart',
+         'Mussorgski', 'Nielsen', 'Poulenc', 'Purcell', 'Rameau', 'Ravel', 'Reger', 'Rossini', 'Saint-Saens',
+         'Satie', 'Schubert', 'Schumann', 'Sibelius', 'Smetana', 'Strauss', 'Stravinski', 'Sweelinck', 'Tallis',
+         'Telemann', 'Verdi', 'Vivaldi', 'Wagner', 'Weber', 'Webern', 'Ysaye', 'Zelenka']
+VORMEN = ['Symfonie', 'Pianoconcert', 'Vioolconcert', 'Celloconcert', 'Strijkkwartet', 'Pianosonate', 'Vioolsonate',
+          'Pianotrio', 'Mis', 'Requiem', 'Suite', 'Ouverture', 'Cantate', 'Prelude', 'Nocturne', 'Etude', 'Serenade',
+          'Divertimento', 'Fantasie', 'Variaties']
+TOONSOORTEN = ['C', 'c', 'Cis', 'D', 'd', 'Es', 'es', 'E', 'e', 'F', 'f', 'Fis', 'G', 'g', 'As', 'A', 'a', 'Bes',
+               'b', 'B']
+ENSEMBLES = ['Symfonieorkest', 'Kamerorkest', 'Filharmonie', 'Strijkkwartet', 'Pianotrio', 'Kamerkoor', 'Ensemble',
+             'Omroeporkest', 'Barokorkest', 'Operakoor']
+STEDEN = ['Amsterdam', 'Antwerpen', 'Berlijn', 'Boedapest', 'Boston', 'Brussel', 'Chicago', 'Dresden', 'Gent',
+          'Leipzig', 'Londen', 'Madrid', 'Milaan', 'Moskou', 'Munchen', 'Parijs', 'Praag', 'Rotterdam', 'Wenen',
+          'Utrecht']
+LABELS = ['Deutsche Grammophon', 'Decca', 'Philips', 'EMI Classics', 'Sony Classical', 'Naxos', 'Hyperion',
+          'Harmonia Mundi', 'Chandos', 'BIS', 'Channel Classics', 'Erato', 'Archiv', 'Teldec', 'Virgin Classics']
+TITELS = ['Complete werken', 'Meesterwerken', 'Live in concert', 'Beste van', 'Portret', 'Opnamen', 'Edities',
+          'Integrale', 'Hoogtepunten', 'Jubileum']
+
+# Tables of the catalog, in the order of the inserts.
+TABLES = [Uitgever, Komponist, Kompositie, Dirigent, Uitvoerders, Cd, Uitvoering]
+
+
+def sizes(uitvoeringen):
+    """
+    This function returns the number of records per table for a number of uitvoeringen. The number of CDs follows
+    from the tracks per CD while the catalog is generated.
+
+    :param uitvoeringen: Number of uitvoeringen.
+    :return: Dictionary with table name and number of records.
+    """
+    return {table: max(uitvoeringen // ratio, MINIMUM) for table, ratio in RATIOS.items()}
+
+
+def skewed(rng, cnt, k):
+    """
+    This function picks k positions from range(cnt) with a Zipf distribution: position 0 is picked most, the last
+    position least.
+
+    :param rng: Random generator.
+    :param cnt: Number of positions.
+    :param k: Number of picks.
+    :return: List of positions.
+    """
+    weights = list(itertools.accumulate(1 / (pos + 1) for pos in range(cnt)))
+    return rng.choices(range(cnt), cum_weights=weights, k=k)
+
+
+def unique(rng, parts, cnt):
+    """
+    This function returns cnt different combinations of the parts in random order. If there are not enough
+    combinations, a number is added to the combinations that are used again.
+
+    :param rng: Random generator.
+    :param parts: List of lists, one item of each list is in the combination.
+    :param cnt: Number of combinations.
+    :return: List of tuples.
+    """
+    combinations = list(itertools.product(*parts))
+    rng.shuffle(combinations)
+    return [combinations[pos % len(combinations)] + ((str(pos // len(combinations) + 1),)
+                                                     if pos >= len(combinations) else ())
+            for pos in range(cnt)]
+
+
+def stamp(pos):
+    """
+    This function returns the created and modified timestamp for the record at position pos.
+    """
+    return EPOCH + pos * STEP
+
+
+def persons(rng, cnt, timestamps=False):
+    """
+    This function returns the rows for komponisten or dirigenten.
+
+    :param rng: Random generator.
+    :param cnt: Number of persons.
+    :param timestamps: True to add created and modified.
+    :return: List of rows.
+    """
+    rows = []
+    for pos, parts in enumerate(unique(rng, [NAMEN, VOORNAMEN], cnt), start=1):
+        row = dict(id=pos, naam=' '.join([parts[0]] + list(parts[2:])), voornaam=parts[1])
+        if timestamps:
+            row.update(created=stamp(pos), modified=stamp(pos))
+        rows.append(row)
+    return rows
+
+
+def catalog(uitvoeringen, seed=1):
+    """
+    This function generates the rows of the catalog. The same arguments give the same rows.
+
+    :param uitvoeringen: Number of uitvoeringen.
+    :param seed: Seed of the random generator.
+    :return: Dictionary with the model and the list of rows per table, in the order of TABLES.
+    """
+    rng = random.Random(seed)
+    cnt = sizes(uitvoeringen)
+    rows = dict(
+        uitgever=[dict(id=pos, naam=' '.join(parts)) for pos, parts in
+                  enumerate(unique(rng, [LABELS], cnt['uitgever']), start=1)],
+        komponist=persons(rng, cnt['komponist'], timestamps=True)
+    )
+    komponisten = skewed(rng, cnt['komponist'], cnt['kompositie'])
+    rows['kompositie'] = [dict(id=pos, naam=' '.join([f"{parts[0]} nr. {parts[2]} in {parts[1]}"] + list(parts[3:])),
+                               komponist_id=komponist + 1)
+                          for pos, (parts, komponist) in
+                          enumerate(zip(unique(rng, [VORMEN, TOONSOORTEN, range(1, 10)], cnt['kompositie']),
+                                        komponisten), start=1)]
+    rows['dirigent'] = persons(rng, cnt['dirigent'])
+    rows['uitvoerders'] = [dict(id=pos, naam=' '.join(parts)) for pos, parts in
+                           enumerate(unique(rng, [ENSEMBLES, STEDEN], cnt['uitvoerders']), start=1)]
+    komposities = skewed(rng, cnt['kompositie'], uitvoeringen)
+    dirigenten = skewed(rng, cnt['dirigent'], uitvoeringen)
+    ensembles = skewed(rng, cnt['uitvoerders'], uitvoeringen)
+    uitgevers = skewed(rng, cnt['uitgever'], uitvoeringen)
+    rows['cd'], rows['uitvoering'] = [], []
+    pos = 0
+    while pos < uitvoeringen:
+        cd_id = len(rows['cd']) + 1
+        rows['cd'].append(dict(id=cd_id, titel=f"{rng.choice(TITELS)} {cd_id}", identificatie=f"SYN-{cd_id:06d}",
+                               uitgever_id=uitgevers[pos] + 1, created=stamp(cd_id), modified=stamp(cd_id)))
+        for volgnummer in range(1, min(rng.randint(1, 19), uitvoeringen - pos) + 1):
+            rows['uitvoering'].append(dict(
+                id=pos + 1, volgnummer=volgnummer, cd_id=cd_id, kompositie_id=komposities[pos] + 1,
+                dirigent_id=dirigenten[pos] + 1 if rng.random() < DIRIGENT_FRACTION else None,
+                uitvoerders_id=ensembles[pos] + 1, created=stamp(pos + 1), modified=stamp(pos + 1)))
+            pos += 1
+    return {model.__tablename__: (model, rows[model.__tablename__]) for model in TABLES}
+
+
+def generate(uitvoeringen, seed=1, report=print):
+    """
+    This function fills an empty database with a synthetic catalog, and fills the counters and the search index. The
+    catalog is added in one transaction.
+
+    :param uitvoeringen: Number of uitvoeringen.
+    :param seed: Seed of the random generator.
+    :param report: Function to report progress.
+    :return: Dictionary with the number of records per table.
+    """
+    for model in TABLES:
+        if db.session.execute(select(func.count()).select_from(model)).scalar():
+            raise ValueError(f"Tabel {model.__tablename__} is niet leeg, de catalogus wordt niet aangemaakt.")
+    counts = {}
+    try:
+        for table, (model, rows) in catalog(uitvoeringen, seed).items():
+            for pos in range(0, len(rows), BATCH_SIZE):
+                db.session.execute(insert(model), rows[pos:pos + BATCH_SIZE])
+            counts[table] = len(rows)
+            report(f"{table}: {len(rows)} records")
+        rebuild_counters()
+        search.rebuild()
+        bump_versions(*counts)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    choices.cache.clear()
+    return counts
@@ -0,0 +1,97 @@
+"""
+This module prepares a new process for traffic, so the first requests after a deploy or a worker restart are not
+slow: the connection pool is filled, the templates are compiled and the choice lists of the uitvoering form and the
+kompositie lookup are loaded in the cache.
+With gunicorn the warmup runs in every worker before it accepts requests, see gunicorn.conf.py. With --preload the
+application is created in the master process and the workers are forked from it. The connections of the master must
+not be used in the workers, so the workers dispose the connection pools of the engines first. Other servers can set
+WARMUP, then create_app warms up the application.
+"""
+
+import time
+from flask import current_app
+from klamu import db
+from klamu.lib import db_model as ds, jinja
+from sqlalchemy.exc import SQLAlchemyError
+
+
+def dispose(app):
+    """
+    This function drops the connections that a forked process got from its parent, without closing them: the
+    connections still belong to the parent. The process opens new connections on the next checkout.
+
+    :param app: Flask application.
+    :return:
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    return
+
+
+def prime(engine, connections):
+    """
+    This function opens connections of the engine at the same time and returns them to the pool, so the pool has the
+    connections with the pragmas applied.
+
+    :param engine: SQLAlchemy engine.
+    :param connections: Number of connections, limited to the size of the pool.
+    :return: Number of connections that were opened.
+    """
+    if hasattr(engine.pool, 'size'):
+        connections = min(connections, engine.pool.size())
+    opened = []
+    try:
+        for _ in range(max(connections, 1)):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.exec_driver_sql("SELECT 1")
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+def lookups():
+    """
+    This function loads the data that most pages need: the data versions for the conditional GET, the choice lists
+    of the uitvoering form and the first page of the kompositie lookup.
+
+    :return:
+    """
+    ds.get_versions()
+    ds.get_komponist_options()
+    ds.get_kompositie_options(-1)
+    ds.get_uitvoerders_options()
+    ds.get_dirigent_options()
+    ds.get_kompositie_json(-1, 1, current_app.config.get('KOMPOSITIE_LOOKUP_LIMIT', 500))
+    return
+
+
+def warm(app, connections=None):
+    """
+    This function warms up the application. A database error, e.g. a database without tables, is logged and does not
+    stop the process: the requests will report it.
+
+    :param app: Flask application.
+    :param connections: Number of connections per engine, default WARMUP_CONNECTIONS. Use the number of threads of
+    the worker.
+    :return: Dictionary with the connections per bind, the number of templates, the error and the duration in seconds.
+    """
+    start = time.perf_counter()
+    result = dict(connections={}, templates=len(jinja.precompile(app)), error=None)
+    connections = connections or app.config.get('WARMUP_CONNECTIONS', 1)
+    with app.app_context():
+        try:
+            for key, engine in db.engines.items():
+                result['connections'][key or 'default'] = prime(engine, connections)
+            lookups()
+        except SQLAlchemyError as exc:
+            result['error'] = f"{exc.__class__.__name__}: {exc.orig if hasattr(exc, 'orig') else exc}"
+            app.logger.warning(f"Warmup is not complete: {result['error']}")
+        finally:
+            db.session.remove()
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    app.logger.info(f"Warmup in {result['seconds']} seconds: {result['templates']} templates, connections "
+                    f"{result['connections']}")
+    return result
@@ -1,4 +1,4 @@
 from flask import Blueprint
-main = Blueprint('main', __name__)
+main = Blueprint('main', __name__, cli_group=None)
 
-from . import routes
+from . import routes, tables, commands
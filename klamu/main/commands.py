@@ -0,0 +1,259 @@
+"""
+This module contains the flask command line commands for klamu maintenance.
+"""
+
+import click
+import json
+from . import main
+from klamu import db
+from klamu.lib import benchmark, db_model as ds, duplicates, export, importer, loadtest, migrations, replica, search, \
+    sqlite, synthetic
+
+
+@main.cli.command('rebuild-counters')
+def rebuild_counters():
+    """
+    Recalculate all counters.
+    """
+    ds.rebuild_counters()
+    db.session.commit()
+    click.echo("Counters are recalculated.")
+
+
+@main.cli.command('rebuild-search')
+def rebuild_search():
+    """
+    Create the full-text search index and fill it from all tables.
+    """
+    cnt = search.rebuild()
+    db.session.commit()
+    click.echo(f"Search index is rebuilt with {cnt} records.")
+
+
+@main.cli.command('import-tracklist')
+@click.argument('filename', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help="Format, default from the file extension.")
+@click.option('--batch-size', default=importer.BATCH_SIZE, show_default=True, help="Number of rows per batch.")
+def import_tracklist(filename, fmt, batch_size):
+    """
+    Import the uitvoeringen from a CSV or JSON tracklist.
+    """
+    fmt = fmt or importer.file_format(filename)
+    if fmt is None:
+        raise click.UsageError("Unknown file format, use --format.")
+    imp = importer.Importer(batch_size=batch_size, report=click.echo)
+    with open(filename, encoding='utf-8-sig', newline='') as f:
+        result = imp.run(importer.read_rows(f, fmt))
+    for msg in imp.errors:
+        click.echo(msg)
+    click.echo(importer.summary(result))
+
+
+@main.cli.command('export')
+@click.argument('output', type=click.File('wb'))
+@click.option('--format', 'fmt', type=click.Choice(list(export.FORMATS)), default='csv', show_default=True)
+@click.option('--cd', type=int, help="Only the uitvoeringen of the CD with this ID.")
+@click.option('--dirigent', type=int, help="Only the uitvoeringen of the dirigent with this ID.")
+@click.option('--komponist', type=int, help="Only the uitvoeringen of the komponist with this ID.")
+@click.option('--kompositie', type=int, help="Only the uitvoeringen of the kompositie with this ID.")
+@click.option('--uitgever', type=int, help="Only the uitvoeringen on CDs of the uitgever with this ID.")
+@click.option('--uitvoerders', type=int, help="Only the uitvoeringen of the uitvoerders with this ID.")
+def export_uitvoeringen(output, fmt, **filters):
+    """
+    Export the uitvoeringen to OUTPUT (- for stdout) as CSV, JSON Lines or XLSX. The uitvoeringen are read from the
+    read replica, if configured.
+    """
+    with replica.reading():
+        for chunk in export.export(fmt, **filters):
+            output.write(chunk)
+
+
+@main.cli.command('duplicates')
+@click.option('--kind', 'kinds', multiple=True, type=click.Choice(list(duplicates.SOURCES)),
+              help="Kind of record, can be repeated. Default all kinds.")
+@click.option('--threshold', default=duplicates.THRESHOLD, show_default=True, help="Minimum score, 0 to 1.")
+@click.option('--workers', default=1, show_default=True, help="Number of processes for the scoring.")
+@click.option('--limit', type=int, help="Maximum number of pairs per kind.")
+def find_duplicates(kinds, threshold, workers, limit):
+    """
+    Report probable duplicates per kind of record, best score first. The records are read from the read replica, if
+    configured.
+    """
+    with replica.reading():
+        result = duplicates.review(kinds, threshold=threshold, workers=workers, limit=limit)
+    for kind, pairs in result.items():
+        click.echo(f"{kind}: {len(pairs)} probable duplicates.")
+        for pair in pairs:
+            click.echo(f"{pair['score']:.3f}  {pair['nid_a']}: {pair['label_a']}  <>  "
+                       f"{pair['nid_b']}: {pair['label_b']}")
+
+
+@main.cli.command('merge')
+@click.argument('kind', type=click.Choice(list(ds.MERGES)))
+@click.argument('loser', type=int)
+@click.argument('winner', type=int)
+@click.option('--dry-run', is_flag=True, help="Report the affected rows, change nothing.")
+def merge(kind, loser, winner, dry_run):
+    """
+    Merge record LOSER into record WINNER: move all references to WINNER and delete LOSER.
+    """
+    res = ds.merge(kind, loser, winner, dry_run=dry_run)
+    for table, cnt in res['rows'].items():
+        click.echo(f"{table}: {cnt} rows")
+    click.echo(res['msg'])
+    if res['status'] == "error":
+        raise click.exceptions.Exit(1)
+
+
+@main.cli.command('sqlite-settings')
+def sqlite_settings():
+    """
+    Show the effective SQLite pragmas of the database connection.
+    """
+    for name, value in sqlite.settings(db.engine).items():
+        click.echo(f"{name} = {value}")
+
+
+@main.cli.group('schema')
+def schema():
+    """
+    Database schema migrations.
+    """
+    pass
+
+
+@schema.command('status')
+def schema_status():
+    """
+    Show the schema version and the pending migrations.
+    """
+    click.echo(f"Schema version {migrations.get_version()}, latest version {migrations.latest_version()}.")
+    for version, migration in migrations.pending():
+        click.echo(f"Pending migration {version}: {migration.__doc__.strip()}")
+
+
+@schema.command('upgrade')
+def schema_upgrade():
+    """
+    Apply the pending migrations.
+    """
+    applied = migrations.upgrade()
+    for version in applied:
+        click.echo(f"Migration {version} is applied.")
+    click.echo(f"Schema version is {migrations.get_version()}.")
+
+
+@schema.command('check')
+def schema_check():
+    """
+    Report indexes that are defined in the models but missing in the database.
+    """
+    messages = migrations.check_indexes()
+    for msg in messages:
+        click.echo(msg)
+    if messages:
+        raise SystemExit(1)
+    click.echo("All indexes are available.")
+
+
+@main.cli.command('synthetic')
+@click.option('--scale', type=click.Choice(list(synthetic.SCALES)), default='small', show_default=True,
+              help="Size of the catalog: 1000, 10000 or 100000 uitvoeringen.")
+@click.option('--uitvoeringen', type=int, help="Number of uitvoeringen, instead of the scale.")
+@click.option('--seed', default=1, show_default=True, help="Seed, the same seed gives the same catalog.")
+def synthetic_catalog(scale, uitvoeringen, seed):
+    """
+    Fill the empty database with a synthetic catalog, for tests and benchmarks. A new database gets the tables first.
+    """
+    migrations.upgrade()
+    try:
+        counts = synthetic.generate(uitvoeringen or synthetic.SCALES[scale], seed, report=click.echo)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f"Synthetic catalog with {counts['uitvoering']} uitvoeringen is created.")
+
+
+@main.cli.command('benchmark')
+@click.option('--scale', type=click.Choice(list(synthetic.SCALES)), default='small', show_default=True,
+              help="Size of the synthetic catalog.")
+@click.option('--uitvoeringen', type=int, help="Number of uitvoeringen, instead of the scale.")
+@click.option('--seed', default=1, show_default=True, help="Seed of the synthetic catalog.")
+@click.option('--repeat', default=10, show_default=True, help="Number of timed calls per page or function.")
+@click.option('--database', type=click.Path(dir_okay=False),
+              help="Database file for the catalog, default a file per catalog in the temporary directory.")
+@click.option('--only', type=click.Choice(['pages', 'db', 'templates']),
+              help="Only measure the pages, the database functions or the templates.")
+@click.option('--save', type=click.File('w'), help="Write the results to this file, e.g. as new baseline.")
+@click.option('--baseline', type=click.File('r'), help="Compare the results with this file.")
+@click.option('--tolerance', default=0.25, show_default=True,
+              help="Fraction that a result can be slower than the baseline.")
+@click.option('--force', is_flag=True, help="Replace the data of a database that the benchmark did not create.")
+def run_benchmark(scale, uitvoeringen, seed, repeat, database, only, save, baseline, tolerance, force):
+    """
+    Measure duration, SQL statements and peak memory of all pages, the main database functions and the templates on a
+    synthetic catalog. The configured database is not used. Exits with status 1 on a regression against the baseline.
+    """
+    try:
+        results = benchmark.run(uitvoeringen or synthetic.SCALES[scale], seed=seed, repeat=repeat, database=database,
+                                pages=only in (None, 'pages'), helpers=only in (None, 'db'),
+                                templates=only in (None, 'templates'), force=force, report=click.echo)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    for endpoint in results['unlisted']:
+        click.echo(f"Endpoint {endpoint} is not in the benchmark.")
+    if save:
+        json.dump(results, save, indent=2)
+    if baseline:
+        rows = benchmark.compare(results, json.load(baseline), tolerance)
+        for row in rows:
+            if row['status'] != 'same':
+                click.echo(f"{row['status']:10s} {row['name']}: {row['ms']} ms (baseline {row['base_ms']} ms), "
+                           f"{row['statements']} statements (baseline {row['base_statements']})")
+        regressions = sum(1 for row in rows if row['status'] == 'regression')
+        click.echo(f"{regressions} regressions, {len(rows)} results compared.")
+        if regressions:
+            raise click.exceptions.Exit(1)
+
+
+@main.cli.command('loadtest')
+@click.option('--url', default='http://localhost:8006', show_default=True, help="Url of the running server.")
+@click.option('--log', type=click.File('r'), help="Gunicorn access log, the GET requests are replayed.")
+@click.option('--requests', 'count', default=1000, show_default=True,
+              help="Number of requests, for the synthesized traffic or the first requests of the log.")
+@click.option('--concurrency', default=4, show_default=True, help="Number of clients.")
+@click.option('--rate', default=0.0, show_default=True, help="Requests per second, 0 for as fast as possible.")
+@click.option('--writes', default=0.05, show_default=True,
+              help="Fraction of write flows (update_cd, update_uitvoering), requires --user.")
+@click.option('--user', help="User for the login of the clients.")
+@click.option('--password', help="Password of the user.")
+@click.option('--timeout', default=30, show_default=True, help="Seconds to wait for a response.")
+@click.option('--seed', default=1, show_default=True, help="Seed of the synthesized traffic and the write flows.")
+@click.option('--save', type=click.File('w'), help="Write the report to this file.")
+def run_loadtest(url, log, count, concurrency, rate, writes, user, password, timeout, seed, save):
+    """
+    Replay an access log or a synthesized traffic mix against a running server and report throughput, latency per
+    endpoint, errors and lock timeouts. The IDs for the requests are taken from the configured database.
+    """
+    if writes and not user:
+        raise click.UsageError("Write flows need --user, or use --writes 0.")
+    ids = loadtest.sample_ids()
+    if log:
+        requests = [loadtest.Request('GET', path) for path in loadtest.parse_log(log)[:count]]
+        requests = loadtest.add_writes(requests, ids, writes, seed)
+    else:
+        requests = loadtest.synthesize(ids, count, writes, seed)
+    try:
+        report = loadtest.run(url, requests, concurrency, rate, user, password, timeout, report=click.echo)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    for name, stats in report['groups'].items():
+        click.echo(f"{name:50s} {stats['count']:6d} p50 {stats['p50']:8.1f} p90 {stats['p90']:8.1f} "
+                   f"p99 {stats['p99']:8.1f} ms errors {stats['errors']} locked {stats['locked']}")
+    total = report['total']
+    if total:
+        click.echo(f"{total['count']} requests in {report['seconds']} seconds, {total['rps']} requests per second, "
+                   f"p99 {total['p99']} ms, error rate {total['error_rate']}, lock timeout rate {total['locked_rate']}")
+    for error in report['errors']:
+        click.echo(error)
+    if save:
+        json.dump(report, save, indent=2)
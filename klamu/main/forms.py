@@ -1,8 +1,12 @@
 from flask_wtf import FlaskForm as Form
-from wtforms import StringField, SubmitField, PasswordField, BooleanField, TextAreaField, SelectField, IntegerField
+from flask_wtf.file import FileField, FileAllowed, FileRequired
+from wtforms import StringField, SubmitField, PasswordField, BooleanField, TextAreaField, SelectField, IntegerField, \
+    FieldList, FormField, HiddenField
+from wtforms import Form as SubForm
 import wtforms.validators as wtv
 
-from wtforms.widgets import TextArea
+from markupsafe import Markup, escape
+from wtforms.widgets import Select, TextArea, html_params
 
 
 class CKTextAreaWidget(TextArea):
@@ -18,6 +22,22 @@ class CKTextAreaField(TextAreaField):
     widget = CKTextAreaWidget()
 
 
+class CachedSelect(Select):
+    """
+    Select widget that uses the pre-rendered option html from field attribute options_html, if available. The option
+    for the field data is marked as selected.
+    """
+    def __call__(self, field, **kwargs):
+        options_html = getattr(field, 'options_html', None)
+        if options_html is None:
+            return super(CachedSelect, self).__call__(field, **kwargs)
+        kwargs.setdefault('id', field.id)
+        value = escape(field.data)
+        options_html = options_html.replace(Markup(f'<option value="{value}">'),
+                                            Markup(f'<option selected value="{value}">'), 1)
+        return Markup(f'<select {html_params(name=field.name, **kwargs)}>') + options_html + Markup('</select>')
+
+
 class Login(Form):
     username = StringField('Username', validators=[wtv.InputRequired(), wtv.Length(1, 16)])
     password = PasswordField('Password', validators=[wtv.InputRequired()])
@@ -38,6 +58,16 @@ class Search(Form):
     search = StringField('Search', validators=[wtv.InputRequired()])
     submit = SubmitField('Go!')
 
+
+class Import(Form):
+    tracklist = FileField('Tracklist (CSV of JSON)', validators=[FileRequired(),
+                                                                 FileAllowed(['csv', 'json', 'jsonl'],
+                                                                             'Enkel CSV of JSON bestanden')])
+    submit = SubmitField('Importeren')
+
+class Merge(Form):
+    submit = SubmitField('Samenvoegen')
+
 class Cd(Form):
     titel = StringField('Titel', validators=[wtv.InputRequired()], render_kw={"placeholder":'Titel van de CD'})
     identificatie = StringField('Identificatie', render_kw={"placeholder":'Bijkomende informatie'})
@@ -70,11 +100,29 @@ class Uitvoerders(Form):
 class Uitvoering(Form):
     submit = SubmitField('OK')
     volgnummer = IntegerField('Volgnummer', render_kw={"size": "4"})
-    komponist = SelectField('Komponist', coerce=str, render_kw={"onclick": "kompositieFunction();"})
+    komponist = SelectField('Komponist', coerce=str, render_kw={"onclick": "kompositieFunction();"},
+                            widget=CachedSelect())
     komponist_mod = SubmitField('Komponist Toevoegen')
-    kompositie = SelectField('Kompositie', coerce=str)
+    kompositie = SelectField('Kompositie', coerce=str, widget=CachedSelect())
     kompositie_mod = SubmitField('Kompositie Toevoegen')
-    uitvoerders = SelectField('Uitvoerders', coerce=str)
+    uitvoerders = SelectField('Uitvoerders', coerce=str, widget=CachedSelect())
     uitvoerders_mod = SubmitField('Uitvoerders Toevoegen')
-    dirigent = SelectField('Dirigent', coerce=str)
+    dirigent = SelectField('Dirigent', coerce=str, widget=CachedSelect())
     dirigent_mod = SubmitField('Dirigent Toevoegen')
+
+
+class Track(SubForm):
+    # One uitvoering in the tracklist. The option lists are filled in the browser, so the choices are not validated.
+    id = HiddenField()
+    volgnummer = IntegerField('Nr', validators=[wtv.Optional()], render_kw={"size": "3"})
+    komponist = SelectField('Komponist', coerce=int, validate_choice=False, widget=CachedSelect())
+    kompositie = SelectField('Kompositie', coerce=int, validate_choice=False, widget=CachedSelect())
+    uitvoerders = SelectField('Uitvoerders', coerce=int, validate_choice=False, widget=CachedSelect())
+    dirigent = SelectField('Dirigent', coerce=int, validate_choice=False, widget=CachedSelect())
+    verwijderen = BooleanField('Verwijderen')
+
+
+class Tracklist(Form):
+    tracks = FieldList(FormField(Track))
+    hernummeren = BooleanField('Volgnummers hernummeren (1, 2, 3, ...)')
+    submit = SubmitField('OK')
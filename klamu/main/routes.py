@@ -1,11 +1,61 @@
+import csv
 import klamu.lib.db_model as ds
-from flask import render_template, flash, redirect, url_for, request, session
+from flask import render_template, flash, redirect, url_for, request, session, jsonify, abort, stream_with_context, \
+    get_flashed_messages
 from flask_login import login_required, login_user, logout_user, current_user
 from . import forms
 from . import main
+from klamu.lib import duplicates, export, importer, metrics, sqlite
+from klamu.lib.conditional import conditional
 from klamu.lib.db_model import *
 
 
+def table_props(name, rows, endpoint, **filters):
+    """
+    Function to return the properties for a list macro. If DATATABLES_SERVER_SIDE is set, then the macro gets the url
+    of the server-side table endpoint in property source and the rows are not collected. Otherwise the rows are
+    collected for the page.
+
+    :param name: Name of the property with the rows.
+    :param rows: Function that returns the rows.
+    :param endpoint: Endpoint of the server-side table in module tables.
+    :param filters: Filters for the server-side table.
+    :return: Dictionary with the source or the rows property.
+    """
+    if current_app.config.get('DATATABLES_SERVER_SIDE'):
+        return dict(source=url_for(endpoint, **filters))
+    rows = rows()
+    if streamed() and hasattr(rows, 'yield_per'):
+        # Fetch the rows in chunks while the page is streamed.
+        rows = rows.yield_per(current_app.config.get('STREAM_ROWS', 500))
+    return {name: rows}
+
+
+def streamed():
+    """
+    Function to check if the page for the current request is streamed, see STREAM_ROUTES in Config.
+    """
+    return request.endpoint in current_app.config.get('STREAM_ROUTES', [])
+
+
+def render_list(template, **props):
+    """
+    Function to render a list page. For the endpoints in STREAM_ROUTES the page is streamed: the layout head is sent
+    first and the rows follow in chunks while the query is iterated. The flashed messages are taken from the session
+    before the response starts, because the session cookie can't be changed once the headers are sent.
+
+    :param template: Name of the template.
+    :param props: Template variables.
+    :return: Response object for a streamed page, the rendered page otherwise.
+    """
+    if not streamed():
+        return render_template(template, **props)
+    get_flashed_messages()
+    current_app.update_template_context(props)
+    stream = current_app.jinja_env.get_template(template).stream(props)
+    stream.enable_buffering(current_app.config.get('STREAM_BUFFER', 100))
+    return current_app.response_class(stream_with_context(stream), mimetype='text/html')
+
 @main.route('/login', methods=['GET', 'POST'])
 def login():
     form = forms.Login()
@@ -47,7 +97,7 @@ def index():
 
 @main.errorhandler(404)
 def page_not_found(e):
-    return render_template("404.html", err=e)
+    return render_template("404.html", err=e), 404
 
 @main.route('/cd/delete/<nid>', methods=['GET'])
 @login_required
@@ -136,16 +186,71 @@ def delete_uitvoering(nid):
         current_app.logger.error(msg)
         return redirect(url_for('main.show_cds'))
 
-@main.route('/komponist/selected', methods=['GET', 'POST'])
+@main.route('/kompositie/lookup')
+@login_required
+def kompositie_lookup():
+    """
+    Return the komposities of komponist (request argument komponist) as json. For all komposities (komponist -1) the
+    result is paged with request argument page. The response has a strong ETag, so the browser can revalidate its copy
+    and gets a 304 Not Modified if the komposities did not change. An unknown komponist or a page after the last page
+    is not found, so these requests do not add lists to the choice list cache.
+    """
+    komponist_id = request.args.get('komponist', -1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = current_app.config.get('KOMPOSITIE_LOOKUP_LIMIT', 500)
+    if komponist_id > 0 and db.session.get(Komponist, komponist_id) is None:
+        abort(404)
+    result = ds.get_kompositie_json(komponist_id, page, limit)
+    if result is None:
+        abort(404)
+    body, etag = result
+    resp = current_app.response_class(body, mimetype='application/json')
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+@main.route('/stats/cache')
+@login_required
+def cache_stats():
+    """
+    Return the cache statistics as json.
+    """
+    return jsonify(choices=ds.choices.cache.stats(), pages=ds.pagecache.cache.stats())
+
+@main.route('/stats/database')
 @login_required
-def selected_komponist():
-    komponist = request.get_json()
-    komposities = get_kompositie_pairs(komponist['komponist_id'])
-    kompositie_list = [f"<option value=\"{k[0]}\">{k[1]}</option>" for k in komposities]
-    kompositie_list.insert(0,'<option value="-1">(kies kompositie)</option>')
-    return '<br>'.join(kompositie_list)
+def database_stats():
+    """
+    Return the configured and the effective SQLite pragmas as json.
+    """
+    return jsonify(configured=current_app.config.get('SQLITE_PRAGMAS'), effective=sqlite.settings(db.engine))
+
+@main.route('/metrics')
+def show_metrics():
+    """
+    Return the metrics of the application in the Prometheus text format.
+    """
+    return current_app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@main.route('/health')
+def health():
+    """
+    Liveness probe: the application answers, the database is not checked.
+    """
+    return jsonify(status='ok')
+
+@main.route('/ready')
+def ready():
+    """
+    Readiness probe: a query on every database must finish within READY_TIMEOUT seconds, else status 503 is returned.
+    """
+    databases = metrics.ready(current_app.config.get('READY_TIMEOUT', 1))
+    status = 200 if all(probe['ready'] for probe in databases.values()) else 503
+    return jsonify(status='ok' if status == 200 else 'niet klaar', databases=databases), status
 
 @main.route('/cd/<nid>')
+@conditional(*UITVOERING_TABLES, 'uitgever')
 def show_cd(nid):
     """
     Show content of a CD.
@@ -157,17 +262,18 @@ def show_cd(nid):
     props = dict(
         cd_content_hdr=f"CD: {cd.titel}",
         cd=cd,
-        uitvoeringen=uitvoeringen
+        uitvoeringen=uitvoeringen,
+        export=dict(cd=nid)
     )
     return render_template('cd_content.html', **props)
 
 @main.route('/cds')
 @main.route('/cds/<nid>')
+@conditional('cd', 'uitgever')
 def show_cds(nid=None):
     """
     Function to return CDs. If NID is specified, then CDs will be limited to uitgever with ID=NID.
     """
-    cds = ds.get_cds(nid)
     if nid:
         uitgever = get_uitgever(nid)
         hdr = f"Uitgever: {uitgever.naam}"
@@ -175,75 +281,82 @@ def show_cds(nid=None):
         hdr = "Overzicht CDs"
     props = dict(
         cd_list_hdr=hdr,
-        cds=cds
+        export=dict(uitgever=nid) if nid else {},
+        **table_props('cds', lambda: ds.get_cds(nid), 'main.table_cds', uitgever=nid)
     )
-    return render_template('cds.html', **props)
+    return render_list('cds.html', **props)
 
 @main.route('/dirigent/<nid>')
+@conditional(*UITVOERING_TABLES)
 def show_dirigent(nid):
     dirigent = ds.get_dirigent(nid)
-    uitvoeringen = ds.get_dirigent_uitvoeringen(nid)
     props = dict(
         hdr=f"Dirigent: {dirigent.fnaam}",
-        uitvoeringen=uitvoeringen
+        **table_props('uitvoeringen', lambda: ds.get_dirigent_uitvoeringen(nid), 'main.table_uitvoeringen',
+                      dirigent=nid),
+        export=dict(dirigent=nid)
     )
-    return render_template('uitvoeringen.html', **props)
+    return render_list('uitvoeringen.html', **props)
 
 @main.route('/dirigenten')
+@conditional('dirigent')
 def show_dirigenten():
-    dirigenten = ds.get_dirigenten()
     props = dict(
         hdr='Overzicht Dirigenten',
-        dirigenten=dirigenten
+        **table_props('dirigenten', ds.get_dirigenten, 'main.table_dirigenten')
     )
-    return render_template('dirigenten.html', **props)
+    return render_list('dirigenten.html', **props)
 
 @main.route('/komponist/<nid>')
+@conditional(*UITVOERING_TABLES)
 def show_komponist(nid):
     komponist = get_komponist(nid)
-    uitvoeringen = get_komponist_uitvoeringen(nid)
     props = dict(
         hdr=f"Komponist: {komponist.fnaam}",
-        uitvoeringen=uitvoeringen
+        **table_props('uitvoeringen', lambda: get_komponist_uitvoeringen(nid), 'main.table_uitvoeringen',
+                      komponist=nid),
+        export=dict(komponist=nid)
     )
-    return render_template('uitvoeringen.html', **props)
+    return render_list('uitvoeringen.html', **props)
 
 @main.route('/komponisten')
+@conditional('komponist')
 def show_komponisten():
-    komponisten = ds.get_komponisten()
     props = dict(
         komponisten_hdr='Overzicht Komponisten',
-        komponisten=komponisten
+        **table_props('komponisten', ds.get_komponisten, 'main.table_komponisten')
     )
-    return render_template('komponisten.html', **props)
+    return render_list('komponisten.html', **props)
 
 @main.route('/kompositie/<nid>')
+@conditional(*UITVOERING_TABLES)
 def show_kompositie(nid):
     kompositie = ds.get_kompositie(nid)
-    uitvoeringen = ds.get_kompositie_uitvoeringen(nid)
     props = dict(
         hdr=f"Kompositie: {kompositie.naam} ({kompositie.komponist.fnaam})",
-        uitvoeringen=uitvoeringen
+        **table_props('uitvoeringen', lambda: ds.get_kompositie_uitvoeringen(nid), 'main.table_uitvoeringen',
+                      kompositie=nid),
+        export=dict(kompositie=nid)
     )
-    return render_template('uitvoeringen.html', **props)
+    return render_list('uitvoeringen.html', **props)
 
 @main.route('/komposities')
+@conditional('kompositie', 'komponist')
 def show_komposities():
-    komposities = get_komposities()
     props = dict(
         hdr='Overzicht Komposities',
-        komposities=komposities
+        **table_props('komposities', get_komposities, 'main.table_komposities')
     )
-    return render_template('komposities.html', **props)
+    return render_list('komposities.html', **props)
 
 @main.route('/uitgevers')
+@conditional('uitgever')
 def show_uitgevers():
-    uitgevers = ds.get_uitgevers()
     props = dict(
         hdr='Overzicht Uitgevers',
-        uitgevers=uitgevers
+        **table_props('uitgevers', ds.get_uitgevers, 'main.table_uitgevers')
     )
-    return render_template('uitgevers.html', **props)
+    return render_list('uitgevers.html', **props)
 
 @main.route('/uitvoerders/update', methods=['GET', 'POST'])
 @main.route('/uitvoerders/update/<nid>', methods=['GET', 'POST'])
@@ -266,13 +379,14 @@ def update_uitvoerders(nid='-1'):
                 form=form,
                 # uitvoerders=get_uitvoerders(),
                 this_uitvoerders=this_uitvoerders.naam,
-                uitvoeringen=get_uitvoerders_uitvoeringen(nid)
+                **table_props('uitvoeringen', lambda: get_uitvoerders_uitvoeringen(nid), 'main.table_uitvoeringen',
+                              uitvoerders=nid)
             )
         else:
             props = dict(
                 hdr="Uitvoerders Toevoegen",
                 form=form,
-                uitvoerders=get_uitvoerders()
+                **table_props('uitvoerders', get_uitvoerders, 'main.table_uitvoerders')
             )
         return render_template('uitvoerders_modify.html', **props)
     else:
@@ -316,18 +430,11 @@ def update_uitvoering(nid=None, cid=None):
             uitvoerders=session.pop('uitvoerders_id', this_uitvoering['uitvoerders_id']),
             dirigent=session.pop('dirigent_id', this_uitvoering['dirigent_id'])
         )
-        res = get_komponist_pairs()
-        res.insert(0, (-1, '(kies komponist)'))
-        form.komponist.choices = res
-        res = get_kompositie_pairs(komponist_id)
-        res.insert(0, (-1, '(kies kompositie)'))
-        form.kompositie.choices = res
-        res = ds.get_uitvoerders_pairs()
-        res.insert(0, (-1, '(kies uitvoerders)'))
-        form.uitvoerders.choices = res
-        res = ds.get_dirigent_pairs()
-        res.insert(0, (-1, '(kies dirigent)'))
-        form.dirigent.choices = res
+        # Options are rendered from the choice list cache, see forms.CachedSelect.
+        form.komponist.options_html = ds.get_komponist_options(first=(-1, '(kies komponist)'))
+        form.kompositie.options_html = ds.get_kompositie_options(komponist_id, first=(-1, '(kies kompositie)'))
+        form.uitvoerders.options_html = ds.get_uitvoerders_options(first=(-1, '(kies uitvoerders)'))
+        form.dirigent.options_html = ds.get_dirigent_options(first=(-1, '(kies dirigent)'))
         props = dict(
             cd_content_hdr=cd.titel,
             cd=cd,
@@ -380,6 +487,79 @@ def update_uitvoering(nid=None, cid=None):
             return redirect(url_for("main.show_cds"))
 
 
+@main.route('/cd/<nid>/tracklist', methods=['GET', 'POST'])
+@login_required
+def update_tracklist(nid):
+    """
+    Edit all uitvoeringen of a CD in one form. Inserts, updates, deletes and the new volgnummers are applied in one
+    transaction, see Uitvoering.update_tracklist. Every row only has the option of its current value, the full option
+    lists are in the page once and are copied into a select when it is used. Request argument nieuw is the number of
+    empty rows for new uitvoeringen.
+
+    :param nid: ID of the CD.
+    """
+    if request.method == "POST":
+        form = forms.Tracklist()
+        if not form.validate_on_submit():
+            for field, errors in form.errors.items():
+                flash(f"{field}: {errors}", "error")
+            return redirect(url_for('main.update_tracklist', nid=nid))
+        tracks = [dict(
+            id=track.form.id.data or None,
+            volgnummer=track.form.volgnummer.data,
+            kompositie_id=track.form.kompositie.data,
+            uitvoerders_id=track.form.uitvoerders.data,
+            dirigent_id=track.form.dirigent.data,
+            delete=track.form.verwijderen.data
+        ) for track in form.tracks]
+        res = Uitvoering.update_tracklist(int(nid), tracks, renumber=form.hernummeren.data)
+        flash(res['msg'], res['status'])
+        if res['status'] == "error":
+            return redirect(url_for('main.update_tracklist', nid=nid))
+        return redirect(url_for('main.show_cd', nid=nid))
+    cd = get_cd(nid)
+    uitvoeringen = get_cd_uitvoeringen(cd=nid)
+    volgnummer = max([row.volgnummer or 0 for row in uitvoeringen], default=0)
+    tracks = [dict(
+        id=row.id,
+        volgnummer=row.volgnummer,
+        komponist=row.kompositie.komponist_id or -1,
+        kompositie=row.kompositie_id,
+        uitvoerders=row.uitvoerders_id or -1,
+        dirigent=row.dirigent_id or -1
+    ) for row in uitvoeringen]
+    nieuw = request.args.get('nieuw', current_app.config.get('TRACKLIST_NEW_ROWS', 3), type=int)
+    tracks += [dict(volgnummer=volgnummer + cnt, komponist=-1, kompositie=-1, uitvoerders=-1, dirigent=-1)
+               for cnt in range(1, max(nieuw, 0) + 1)]
+    form = forms.Tracklist(data=dict(tracks=tracks))
+    labels = {row.id: row for row in uitvoeringen}
+    for track in form.tracks:
+        row = labels.get(int(track.form.id.data or 0))
+        track.form.komponist.options_html = ds.choices.option(-1, '(kies komponist)')
+        track.form.kompositie.options_html = ds.choices.option(-1, '(kies kompositie)')
+        track.form.uitvoerders.options_html = ds.choices.option(-1, '(kies uitvoerders)')
+        track.form.dirigent.options_html = ds.choices.option(-1, '(kies dirigent)')
+        if row is None:
+            continue
+        if row.kompositie.komponist:
+            track.form.komponist.options_html += ds.choices.option(row.kompositie.komponist_id,
+                                                                   row.kompositie.komponist.fnaam)
+        track.form.kompositie.options_html += ds.choices.option(row.kompositie_id, row.kompositie.naam)
+        if row.uitvoerders:
+            track.form.uitvoerders.options_html += ds.choices.option(row.uitvoerders_id, row.uitvoerders.naam)
+        if row.dirigent:
+            track.form.dirigent.options_html += ds.choices.option(row.dirigent_id, row.dirigent.fnaam)
+    props = dict(
+        hdr=f"Tracklist: {cd.titel}",
+        cd=cd,
+        form=form,
+        komponist_options=ds.get_komponist_options(first=(-1, '(kies komponist)')),
+        uitvoerders_options=ds.get_uitvoerders_options(first=(-1, '(kies uitvoerders)')),
+        dirigent_options=ds.get_dirigent_options(first=(-1, '(kies dirigent)'))
+    )
+    return render_template("tracklist_modify.html", **props)
+
+
 @main.route('/cd/update', methods=['GET', 'POST'])
 @main.route('/cd/update/<nid>', methods=['GET', 'POST'])
 @login_required
@@ -412,16 +592,16 @@ def update_cd(nid=None):
         uitgevers = ds.get_uitgever_pairs()
         uitgevers.insert(0, (-1, '(geen uitgever)'))
         form.uitgever.choices = uitgevers
-        cds = ds.get_cds(uitgever_id)
         props = dict(
             hdr=hdr,
             form=form,
-            cd_list_hdr='Overzicht CDs',
-            cds=cds
+            cd_list_hdr='Overzicht CDs'
         )
         if nid:
             props['uitvoeringen'] = get_cd_uitvoeringen(nid)
             props['cd'] = get_cd(nid)
+        else:
+            props.update(table_props('cds', lambda: ds.get_cds(uitgever_id), 'main.table_cds', uitgever=uitgever_id))
         return render_template('cd_modify.html', **props)
     else:
         form = forms.Cd()
@@ -464,13 +644,14 @@ def update_dirigent(nid='-1'):
                 hdr="Dirigent Aanpassen",
                 form=form,
                 dirigent=dirigent,
-                uitvoeringen=get_dirigent_uitvoeringen(nid)
+                **table_props('uitvoeringen', lambda: get_dirigent_uitvoeringen(nid), 'main.table_uitvoeringen',
+                              dirigent=nid)
             )
         else:
             props = dict(
                 hdr="Dirigent Toevoegen",
                 form=form,
-                dirigenten=get_dirigenten()
+                **table_props('dirigenten', get_dirigenten, 'main.table_dirigenten')
             )
         return render_template('dirigent_modify.html', **props)
     else:
@@ -508,13 +689,14 @@ def update_komponist(nid='-1'):
                 form=form,
                 # komponisten=get_komponisten(),
                 komponist=komponist,
-                uitvoeringen=get_komponist_uitvoeringen(nid)
+                **table_props('uitvoeringen', lambda: get_komponist_uitvoeringen(nid), 'main.table_uitvoeringen',
+                              komponist=nid)
             )
         else:
             props = dict(
                 hdr="Komponist Toevoegen",
                 form=form,
-                komponisten=get_komponisten()
+                **table_props('komponisten', get_komponisten, 'main.table_komponisten')
             )
         return render_template('komponist_modify.html', **props)
     else:
@@ -548,14 +730,16 @@ def update_kompositie(nid="-1"):
             kompositie = get_kompositie(nid)
             komponist = get_komponist(kompositie.komponist_id)
             form.naam.data = kompositie.naam
-            uitvoeringen = get_kompositie_uitvoeringen(nid)
+            uitvoeringen = table_props('uitvoeringen', lambda: get_kompositie_uitvoeringen(nid),
+                                       'main.table_uitvoeringen', kompositie=nid)
             uitvoeringen_hdr = f"Kompositie: {kompositie.naam}"
         elif 'komponist_id' in session:
             # Add kompositie for komponist
             hdr = "Kompositie Toevoegen"
             komponist_id = session['komponist_id']
             komponist = get_komponist(komponist_id)
-            uitvoeringen = get_komponist_uitvoeringen(komponist_id)
+            uitvoeringen = table_props('uitvoeringen', lambda: get_komponist_uitvoeringen(komponist_id),
+                                       'main.table_uitvoeringen', komponist=komponist_id)
             uitvoeringen_hdr = f"Komponist: {komponist.fnaam}"
         else:
             msg = f"Kompositie noch komponist gekozen"
@@ -565,8 +749,8 @@ def update_kompositie(nid="-1"):
         props = dict(
             hdr=hdr,
             form=form,
-            uitvoeringen=uitvoeringen,
-            uitvoeringen_hdr=uitvoeringen_hdr
+            uitvoeringen_hdr=uitvoeringen_hdr,
+            **uitvoeringen
         )
         return render_template('kompositie_modify.html', **props)
     else:
@@ -601,10 +785,10 @@ def update_uitgever(nid='-1'):
             # Update existing Uitgever
             uitgever = get_uitgever(nid)
             form.uitgever.data = uitgever.naam
-            props['cds'] = get_cds(nid)
+            props.update(table_props('cds', lambda: get_cds(nid), 'main.table_cds', uitgever=nid))
             props['uitgever'] = uitgever.naam
         else:
-            props['uitgevers'] = get_uitgevers()
+            props.update(table_props('uitgevers', get_uitgevers, 'main.table_uitgevers'))
         return render_template('uitgever_modify.html', **props)
     else:
         form = forms.Uitgever()
@@ -619,30 +803,155 @@ def update_uitgever(nid='-1'):
         next_url = session.pop('uitgever_referrer', url_for('main.show_cds', nid=res['nid']))
         return redirect(next_url)
 
+@main.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_tracklist():
+    """
+    Upload a CSV or JSON tracklist and import the uitvoeringen.
+    """
+    form = forms.Import()
+    errors = []
+    if form.validate_on_submit():
+        upload = form.tracklist.data
+        imp = importer.Importer(report=current_app.logger.info)
+        try:
+            result = imp.run(importer.read_rows(importer.text_stream(upload.stream),
+                                                importer.file_format(upload.filename)))
+        except (ValueError, KeyError, TypeError, UnicodeDecodeError, csv.Error) as exc:
+            msg = f"Import van {upload.filename} is mislukt: {exc}"
+            current_app.logger.error(msg)
+            flash(msg, "error")
+        else:
+            msg = importer.summary(result)
+            current_app.logger.info(msg)
+            flash(msg, "success")
+            errors = imp.errors
+    return render_template('import.html', form=form, hdr='Tracklist importeren', errors=errors)
+
+@main.route('/duplicates')
+@main.route('/duplicates/<kind>')
+@login_required
+def show_duplicates(kind='komponist'):
+    """
+    Show the probable duplicates of a kind of record, best score first. Request argument score is the minimum score.
+    The result is kept until the table of the kind changes.
+
+    :param kind: Kind of record: komponist, dirigent, uitvoerders, uitgever or kompositie.
+    """
+    if kind not in duplicates.SOURCES:
+        abort(404)
+    threshold = request.args.get('score', duplicates.THRESHOLD, type=float)
+    version = ds.get_versions().get(kind, (0, None))[0]
+    pairs = duplicates.cached(kind, version, threshold=threshold,
+                              workers=current_app.config.get('DUPLICATE_WORKERS', 1),
+                              limit=current_app.config.get('DUPLICATE_LIMIT', 500))
+    endpoints = dict(komponist='main.show_komponist', dirigent='main.show_dirigent',
+                     uitvoerders='main.show_uitvoerders_uitvoeringen', uitgever='main.show_cds',
+                     kompositie='main.show_kompositie')
+    props = dict(
+        hdr="Mogelijke dubbels",
+        kind=kind,
+        kinds=list(duplicates.SOURCES),
+        endpoint=endpoints[kind],
+        threshold=threshold,
+        pairs=pairs
+    )
+    return render_template('duplicates.html', **props)
+
+@main.route('/merge/<kind>/<int:loser>/<int:winner>', methods=['GET', 'POST'])
+@login_required
+def merge(kind, loser, winner):
+    """
+    Merge two records of the same kind. The GET request shows the number of rows that will be changed, the POST
+    request does the merge.
+
+    :param kind: Kind of record: komponist, dirigent, uitvoerders, uitgever or kompositie.
+    :param loser: ID of the record that is removed.
+    :param winner: ID of the record that remains.
+    """
+    if kind not in ds.MERGES:
+        abort(404)
+    form = forms.Merge()
+    if form.validate_on_submit():
+        res = ds.merge(kind, loser, winner)
+        flash(res['msg'], res['status'])
+        return redirect(url_for('main.show_duplicates', kind=kind))
+    res = ds.merge(kind, loser, winner, dry_run=True)
+    props = dict(
+        hdr=f"{kind.capitalize()} samenvoegen",
+        kind=kind,
+        res=res,
+        form=form
+    )
+    return render_template('merge.html', **props)
+
+@main.route('/export/<fmt>')
+def export_uitvoeringen(fmt):
+    """
+    Stream the uitvoeringen as CSV, JSON Lines or XLSX file. The uitvoeringen can be filtered with request arguments
+    cd, dirigent, komponist, kompositie, uitgever and uitvoerders.
+
+    :param fmt: Format: csv, jsonl or xlsx.
+    """
+    if fmt not in export.FORMATS:
+        abort(404)
+    filters = {key: request.args.get(key, type=int)
+               for key in ['cd', 'dirigent', 'komponist', 'kompositie', 'uitgever', 'uitvoerders']
+               if request.args.get(key)}
+    _, mimetype, ext = export.FORMATS[fmt]
+    resp = current_app.response_class(stream_with_context(export.export(fmt, **filters)), mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f"attachment; filename=klamu_uitvoeringen.{ext}"
+    return resp
+
+@main.route('/search')
+@conditional('cd', 'kompositie', 'komponist', 'dirigent', 'uitvoerders')
+def search():
+    """
+    Full-text search on CDs, komposities, komponisten, dirigenten and uitvoerders.
+    """
+    form = forms.Search(formdata=request.args, meta=dict(csrf=False))
+    term = form.search.data
+    props = dict(
+        hdr=f"Zoeken: {term}" if term else "Zoeken",
+        form=form,
+        results=ds.search.search(term) if term else [],
+        endpoints=dict(
+            cd='main.show_cd',
+            kompositie='main.show_kompositie',
+            komponist='main.show_komponist',
+            dirigent='main.show_dirigent',
+            uitvoerders='main.show_uitvoerders_uitvoeringen'
+        )
+    )
+    return render_template('search.html', **props)
+
 @main.route('/uitvoerders/<nid>')
+@conditional(*UITVOERING_TABLES)
 def show_uitvoerders_uitvoeringen(nid):
     uitvoerders = ds.get_uitvoerders_detail(nid)
-    uitvoeringen = ds.get_uitvoerders_uitvoeringen(nid)
     props = dict(
         hdr=f"Uitvoerders: {uitvoerders.naam}",
-        uitvoeringen=uitvoeringen
+        **table_props('uitvoeringen', lambda: ds.get_uitvoerders_uitvoeringen(nid), 'main.table_uitvoeringen',
+                      uitvoerders=nid),
+        export=dict(uitvoerders=nid)
     )
-    return render_template('uitvoeringen.html', **props)
+    return render_list('uitvoeringen.html', **props)
 
 @main.route('/uitvoerders')
+@conditional('uitvoerders')
 def show_uitvoerders():
-    uitvoerders = ds.get_uitvoerders()
     props = dict(
         hdr='Overzicht Uitvoerders',
-        uitvoerders=uitvoerders
+        **table_props('uitvoerders', ds.get_uitvoerders, 'main.table_uitvoerders')
     )
-    return render_template('uitvoerders.html', **props)
+    return render_list('uitvoerders.html', **props)
 
 @main.route('/uitvoeringen')
+@conditional(*UITVOERING_TABLES)
 def show_uitvoeringen():
-    uitvoeringen = ds.get_uitvoeringen()
     props = dict(
         hdr='Overzicht Uitvoeringen',
-        uitvoeringen=uitvoeringen
+        export={},
+        **table_props('uitvoeringen', ds.get_uitvoeringen, 'main.table_uitvoeringen')
     )
-    return render_template('uitvoeringen.html', **props)
+    return render_list('uitvoeringen.html', **props)
@@ -0,0 +1,169 @@
+"""
+This module has the JSON endpoints for the DataTables lists. Each endpoint handles the server-side processing
+protocol for one entity list, see klamu.lib.datatables.
+"""
+
+from flask import jsonify, request, url_for
+from flask_login import current_user
+from markupsafe import Markup
+from . import main
+from klamu.lib import datatables, my_env
+from klamu.lib.datatables import Column
+from klamu.lib.db_model import *
+
+
+def link(endpoint, nid, text):
+    """
+    Function to return a link to the page of a record.
+
+    :param endpoint: Endpoint of the page.
+    :param nid: ID of the record. If None, then no link is returned.
+    :param text: Text of the link.
+    :return: html for the link.
+    """
+    if nid is None:
+        return Markup('')
+    return Markup('<a href="{url}">{text}</a>').format(url=url_for(endpoint, nid=nid), text=text or '')
+
+
+def trash(endpoint, nid, cnt):
+    """
+    Function to return the delete icon for a record, if the user is logged in and the record is not used.
+
+    :param endpoint: Delete endpoint for the record.
+    :param nid: ID of the record.
+    :param cnt: Number of items linked to the record.
+    :return: html for the delete icon.
+    """
+    if current_user.is_authenticated and cnt == 0:
+        return Markup(' <a href="{url}"><span class="glyphicon glyphicon-trash"></span></a>')\
+            .format(url=url_for(endpoint, nid=nid))
+    return Markup('')
+
+
+def edit(endpoint, nid):
+    """
+    Function to return the edit icon for a record, if the user is logged in.
+
+    :param endpoint: Update endpoint for the record.
+    :param nid: ID of the record.
+    :return: html for the edit icon.
+    """
+    if current_user.is_authenticated:
+        return Markup(' <a href="{url}"><span class="glyphicon glyphicon-pencil"></span></a>')\
+            .format(url=url_for(endpoint, nid=nid))
+    return Markup('')
+
+
+def filter_args(*keys):
+    """
+    Function to collect the filter IDs from the request arguments.
+
+    :param keys: Names of the filters that are allowed for the table.
+    :return: Dictionary with filter name and ID.
+    """
+    return {key: request.args.get(key, type=int) for key in keys if request.args.get(key)}
+
+
+def fnaam(person):
+    """
+    Function to return voornaam and naam of a komponist or dirigent.
+    """
+    if person is None:
+        return ''
+    return ' '.join(part for part in [person.naam, person.voornaam] if part)
+
+
+@main.route('/tables/cds')
+def table_cds():
+    columns = [
+        Column(lambda row: link('main.show_cd', row.id, row.titel) + trash('main.delete_cd', row.id, row.items),
+               order=Cd.titel, search=Cd.titel),
+        Column(lambda row: row.identificatie or '', order=Cd.identificatie, search=Cd.identificatie),
+        Column(lambda row: link('main.show_cds', row.uitgever_id, row.uitgever.naam if row.uitgever else ''),
+               order=Uitgever.naam, search=Uitgever.naam),
+        Column(lambda row: row.items, order=Cd.items),
+        Column(lambda row: my_env.datestamp(row.created), order=Cd.created)
+    ]
+    query = cds_query(**filter_args('uitgever'))
+    return jsonify(datatables.process(query, columns, request.args))
+
+
+@main.route('/tables/dirigenten')
+def table_dirigenten():
+    columns = [
+        Column(lambda row: link('main.show_dirigent', row.id, row.fnaam) +
+               trash('main.delete_dirigent', row.id, row.items),
+               order=[Dirigent.naam, Dirigent.voornaam], search=[Dirigent.naam, Dirigent.voornaam]),
+        Column(lambda row: row.items, order=Dirigent.items)
+    ]
+    return jsonify(datatables.process(get_dirigenten(), columns, request.args))
+
+
+@main.route('/tables/komponisten')
+def table_komponisten():
+    columns = [
+        Column(lambda row: link('main.show_komponist', row.id, row.fnaam) +
+               trash('main.delete_komponist', row.id, row.komposities),
+               order=[Komponist.naam, Komponist.voornaam], search=[Komponist.naam, Komponist.voornaam]),
+        Column(lambda row: row.komposities, order=Komponist.komposities),
+        Column(lambda row: row.items, order=Komponist.items),
+        Column(lambda row: my_env.datestamp(row.created), order=Komponist.created)
+    ]
+    return jsonify(datatables.process(get_komponisten(), columns, request.args))
+
+
+@main.route('/tables/komposities')
+def table_komposities():
+    columns = [
+        Column(lambda row: link('main.show_kompositie', row.id, row.naam) +
+               trash('main.delete_kompositie', row.id, row.items),
+               order=Kompositie.naam, search=Kompositie.naam),
+        Column(lambda row: link('main.show_komponist', row.komponist_id, fnaam(row.komponist)),
+               order=[Komponist.naam, Komponist.voornaam], search=[Komponist.naam, Komponist.voornaam]),
+        Column(lambda row: row.items, order=Kompositie.items)
+    ]
+    return jsonify(datatables.process(komposities_query(), columns, request.args))
+
+
+@main.route('/tables/uitgevers')
+def table_uitgevers():
+    columns = [
+        Column(lambda row: link('main.show_cds', row.id, row.naam) + trash('main.delete_uitgever', row.id, row.items),
+               order=Uitgever.naam, search=Uitgever.naam),
+        Column(lambda row: row.items, order=Uitgever.items)
+    ]
+    return jsonify(datatables.process(get_uitgevers(), columns, request.args))
+
+
+@main.route('/tables/uitvoerders')
+def table_uitvoerders():
+    columns = [
+        Column(lambda row: link('main.show_uitvoerders_uitvoeringen', row.id, row.naam) +
+               trash('main.delete_uitvoerders', row.id, row.items),
+               order=Uitvoerders.naam, search=Uitvoerders.naam),
+        Column(lambda row: row.items, order=Uitvoerders.items)
+    ]
+    return jsonify(datatables.process(get_uitvoerders(), columns, request.args))
+
+
+@main.route('/tables/uitvoeringen')
+def table_uitvoeringen():
+    columns = [
+        Column(lambda row: link('main.show_cd', row.cd_id, row.cd.titel if row.cd else ''),
+               order=Cd.titel, search=Cd.titel),
+        Column(lambda row: Markup('{nr}').format(nr=row.volgnummer if row.volgnummer is not None else '') +
+               edit('main.update_uitvoering', row.id),
+               order=Uitvoering.volgnummer),
+        Column(lambda row: link('main.show_kompositie', row.kompositie_id, row.kompositie.naam),
+               order=Kompositie.naam, search=Kompositie.naam),
+        Column(lambda row: link('main.show_komponist', row.kompositie.komponist_id, fnaam(row.kompositie.komponist)),
+               order=[Komponist.naam, Komponist.voornaam], search=[Komponist.naam, Komponist.voornaam]),
+        Column(lambda row: link('main.show_uitvoerders_uitvoeringen', row.uitvoerders_id,
+                                row.uitvoerders.naam if row.uitvoerders else ''),
+               order=Uitvoerders.naam, search=Uitvoerders.naam),
+        Column(lambda row: link('main.show_dirigent', row.dirigent_id, row.dirigent.fnaam if row.dirigent else ''),
+               order=[Dirigent.naam, Dirigent.voornaam], search=[Dirigent.naam, Dirigent.voornaam])
+    ]
+    query = uitvoeringen_query(**filter_args('cd', 'dirigent', 'komponist', 'kompositie', 'uitvoerders'))
+    return jsonify(datatables.process(query, columns, request.args))
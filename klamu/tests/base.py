@@ -0,0 +1,53 @@
+"""
+This module has the setup that the tests share. Import it before config and klamu: config reads the environment
+variables when it is imported, the defaults are set here.
+"""
+
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault("LOGDIR", tempfile.gettempdir())
+os.environ.setdefault("LOGLEVEL", "warning")
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite://")
+
+from config import TestConfig
+from klamu import create_app, db
+from klamu.lib import choices
+from klamu.lib.db_model import User
+
+
+class AppTestCase(unittest.TestCase):
+    """
+    Test case with an application on the database of config, an in-memory database for TestConfig. setUp pushes the
+    application context and creates the tables, tearDown drops the tables and clears the choice list cache.
+    A test module sets config to a subclass of TestConfig for its own settings.
+    """
+    config = TestConfig
+
+    def setUp(self):
+        # Initialize Environment
+        self.app = create_app(self.config)
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        choices.cache.clear()
+        db.session.remove()
+        db.drop_all()
+        for engine in db.engines.values():
+            engine.dispose()
+        self.app_ctx.pop()
+
+    def login(self, username):
+        """
+        Register a user and log in, the password is the username. The form needs WTF_CSRF_ENABLED False in config.
+
+        :param username: Name of the user.
+        :return: Test client with the session of the user.
+        """
+        User.register(username, username)
+        client = self.app.test_client()
+        client.post('/login', data=dict(username=username, password=username))
+        return client
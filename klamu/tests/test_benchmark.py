@@ -0,0 +1,71 @@
+"""
+This procedure will test the benchmark suite.
+"""
+
+import os
+import tempfile
+import unittest
+
+# The base module sets the environment for config.
+import base
+from klamu import create_app, db
+from klamu.lib import benchmark, db_model as ds
+
+DBDIR = tempfile.mkdtemp()
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run(self):
+        database = os.path.join(DBDIR, 'benchmark.db')
+        results = benchmark.run(200, repeat=2, database=database, report=lambda msg: None)
+        self.assertEqual(results['unlisted'], [])
+        self.assertEqual(len(results['results']), len(benchmark.ROUTES) + len(benchmark.HELPERS) +
+                         len(benchmark.TEMPLATES))
+        for name, result in results['results'].items():
+            self.assertIsNone(result['error'], name)
+            self.assertGreater(result['peak_kb'], 0, name)
+        self.assertGreater(results['results']['db get_cd_uitvoeringen']['statements'], 0)
+        # The catalog is kept in the database file for the next run.
+        again = benchmark.run(200, repeat=1, database=database, pages=False, templates=False,
+                              report=lambda msg: None)
+        self.assertEqual(len(again['results']), len(benchmark.HELPERS))
+
+    def test_foreign_database(self):
+        # A database with data that the benchmark did not create is not changed, unless force is set.
+        database = os.path.join(DBDIR, 'klamu.db')
+        app = create_app(benchmark.config(database))
+        with app.app_context():
+            db.create_all()
+            ds.Uitgever.update(naam="DG")
+            db.session.remove()
+        with self.assertRaises(ValueError):
+            benchmark.run(100, repeat=1, database=database, pages=False, templates=False, report=lambda msg: None)
+        with app.app_context():
+            self.assertEqual([uitgever.naam for uitgever in ds.Uitgever.query], ["DG"])
+            db.session.remove()
+        results = benchmark.run(100, repeat=1, database=database, pages=False, templates=False, force=True,
+                                report=lambda msg: None)
+        self.assertEqual(len(results['results']), len(benchmark.HELPERS))
+
+    def test_compare(self):
+        baseline = dict(results=dict(
+            same=dict(ms=10, statements=2),
+            slower=dict(ms=10, statements=2),
+            statements=dict(ms=10, statements=2),
+            faster=dict(ms=10, statements=2)
+        ))
+        results = dict(results=dict(
+            same=dict(ms=11, statements=2),
+            slower=dict(ms=15, statements=2),
+            statements=dict(ms=10, statements=3),
+            faster=dict(ms=5, statements=2),
+            new=dict(ms=5, statements=2)
+        ))
+        status = {row['name']: row['status'] for row in benchmark.compare(results, baseline, tolerance=0.25)}
+        self.assertEqual(status, dict(same='same', slower='regression', statements='regression', faster='faster',
+                                      new='new'))
+
+
+if __name__ == "__main__":
+    unittest.main()
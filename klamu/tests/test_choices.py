@@ -0,0 +1,89 @@
+"""
+This procedure will test the choice list cache.
+"""
+
+import unittest
+
+from base import AppTestCase
+from klamu import db
+from klamu.lib import choices
+from klamu.lib.db_model import *
+
+
+class TestChoices(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # A new cache for the counters, the models use the cache of the choices module.
+        self.previous = choices.cache
+        self.cache = choices.cache = choices.ChoiceCache()
+
+    def tearDown(self):
+        choices.cache = self.previous
+        super().tearDown()
+
+    def test_hits(self):
+        Komponist.update(naam="Bach", voornaam="Johann Sebastian")
+        self.assertEqual(get_komponist_pairs(), [(1, "Bach Johann Sebastian")])
+        self.assertIn('Bach Johann Sebastian', get_komponist_options(first=(-1, '(kies komponist)')))
+        stats = self.cache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses']), (1, 1, 1))
+
+    def test_update_delete(self):
+        # Every update() and delete() invalidates its list, the data version is not needed for that.
+        for model, kind, params, pairs in (
+                (Komponist, 'komponist', dict(naam="Bach", voornaam="Johann Sebastian"), get_komponist_pairs),
+                (Dirigent, 'dirigent', dict(naam="Karajan", voornaam="Herbert"), get_dirigent_pairs),
+                (Uitvoerders, 'uitvoerders', dict(naam="Berliner Philharmoniker"), get_uitvoerders_pairs)):
+            self.assertEqual(pairs(), [])
+            nid = model.update(**params)['nid']
+            self.assertEqual(len(pairs()), 1, kind)
+            model.update(id=nid, **dict(params, naam="Mahler"))
+            self.assertIn("Mahler", pairs()[0][1], kind)
+            model.delete(nid)
+            self.assertEqual(pairs(), [], kind)
+
+    def test_kompositie(self):
+        bach = Komponist.update(naam="Bach", voornaam="Johann Sebastian")['nid']
+        mozart = Komponist.update(naam="Mozart", voornaam="Wolfgang Amadeus")['nid']
+        nid = Kompositie.update(naam="Hohe Messe", komponist_id=bach)['nid']
+        self.assertEqual(get_kompositie_pairs(bach), [(nid, "Hohe Messe")])
+        self.assertEqual(get_kompositie_pairs(-1), [(nid, "Hohe Messe")])
+        self.assertEqual(get_kompositie_pairs(mozart), [])
+        # Moving the kompositie invalidates the lists of both komponisten and the list of all komposities.
+        Kompositie.update(id=nid, naam="Requiem", komponist_id=mozart)
+        self.assertEqual(get_kompositie_pairs(bach), [])
+        self.assertEqual(get_kompositie_pairs(mozart), [(nid, "Requiem")])
+        self.assertEqual(get_kompositie_pairs(-1), [(nid, "Requiem")])
+        Kompositie.delete(nid)
+        self.assertEqual(get_kompositie_pairs(mozart), [])
+        self.assertEqual(get_kompositie_pairs(-1), [])
+
+    def test_version(self):
+        # Another worker changes the table: this cache is not invalidated, the data version changes.
+        Komponist.update(naam="Bach", voornaam="Johann Sebastian")
+        self.assertEqual(len(get_komponist_pairs()), 1)
+        db.session.add(Komponist(naam="Mozart", voornaam="Wolfgang Amadeus", created=0, modified=0))
+        db.session.commit()
+        self.assertEqual(len(get_komponist_pairs()), 1)
+        bump_versions('komponist')
+        db.session.commit()
+        self.assertEqual(len(get_komponist_pairs()), 2)
+        self.assertEqual(self.cache.stats()['stale'], 1)
+
+    def test_invalidate_during_load(self):
+        # A list that is invalidated while it is loaded is returned, but not kept.
+        def loader(kind, komponist_id):
+            self.cache.invalidate(kind)
+            return [(1, 'Bach')]
+
+        self.assertEqual(self.cache.pairs('komponist', loader), [(1, 'Bach')])
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        # A list is not kept if the data version changed during the load.
+        versions = iter([1, 2])
+        self.cache.pairs('dirigent', lambda kind, nid: [], version=lambda kind: next(versions))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
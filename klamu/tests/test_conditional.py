@@ -0,0 +1,53 @@
+"""
+This procedure will test the conditional GET of the pages.
+"""
+
+import unittest
+
+from base import AppTestCase
+from klamu.lib.db_model import *
+
+
+class TestConditional(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+
+    def test_versions(self):
+        self.assertEqual(get_versions(), {})
+        res = Komponist.update(naam="Brahms", voornaam="Johannes")
+        Kompositie.update(naam="Symfonie 4", komponist_id=res['nid'])
+        versions = get_versions()
+        self.assertEqual(versions['komponist'][0], 2)
+        self.assertEqual(versions['kompositie'][0], 1)
+        self.assertNotIn('cd', versions)
+
+    def test_not_modified(self):
+        Komponist.update(naam="Brahms", voornaam="Johannes")
+        resp = self.client.get('/komponisten')
+        self.assertEqual(resp.status_code, 200)
+        etag = resp.headers['ETag']
+        resp = self.client.get('/komponisten', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        # A change in another table keeps the page valid, a change in the komponist table does not.
+        Uitgever.update(naam="DG")
+        resp = self.client.get('/komponisten', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        Komponist.update(naam="Bruckner", voornaam="Anton")
+        resp = self.client.get('/komponisten', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers['ETag'], etag)
+
+    def test_template_version(self):
+        # Changed templates after a deploy give new pages, also if the data did not change.
+        etag = self.client.get('/komponisten').headers['ETag']
+        self.assertEqual(len(self.app.config['TEMPLATE_VERSION']), 40)
+        self.app.config['TEMPLATE_VERSION'] = 'release-2'
+        resp = self.client.get('/komponisten', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers['ETag'], etag)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+This procedure will test the counter columns.
+"""
+
+import unittest
+
+from base import AppTestCase
+from klamu import db
+from klamu.lib.db_model import *
+
+
+class TestCounters(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.bach = Komponist.update(naam="Bach", voornaam="Johann Sebastian")['nid']
+        self.mozart = Komponist.update(naam="Mozart", voornaam="Wolfgang Amadeus")['nid']
+        self.messe = Kompositie.update(naam="Hohe Messe", komponist_id=self.bach)['nid']
+        self.requiem = Kompositie.update(naam="Requiem", komponist_id=self.mozart)['nid']
+        self.karajan = Dirigent.update(naam="Karajan", voornaam="Herbert von")['nid']
+        self.berliner = Uitvoerders.update(naam="Berliner Philharmoniker")['nid']
+        self.dg = Uitgever.update(naam="DG")['nid']
+        self.decca = Uitgever.update(naam="Decca")['nid']
+        self.cd = Cd.update(titel="Missen", identificatie="", uitgever_id=str(self.dg))
+
+    @staticmethod
+    def counters(model, nid):
+        """
+        Read the counter columns from the database, not from the identity map.
+        """
+        columns = [model.items_cnt] + ([model.komposities_cnt] if model is Komponist else [])
+        return tuple(db.session.execute(select(*columns).where(model.id == nid)).one())
+
+    def uitvoering(self, kompositie_id, nid=None, dirigent_id=-1):
+        params = dict(volgnummer=1, cd_id=self.cd, kompositie_id=kompositie_id, uitvoerders_id=self.berliner,
+                      dirigent_id=dirigent_id)
+        if nid:
+            params['id'] = nid
+        return Uitvoering.update(**params)['nid']
+
+    def test_update_delete(self):
+        self.assertEqual(self.counters(Komponist, self.bach), (0, 1))
+        self.assertEqual(self.counters(Uitgever, self.dg), (1,))
+        nid = self.uitvoering(self.messe, dirigent_id=self.karajan)
+        self.assertEqual(self.counters(Komponist, self.bach), (1, 1))
+        self.assertEqual(self.counters(Kompositie, self.messe), (1,))
+        self.assertEqual(self.counters(Dirigent, self.karajan), (1,))
+        self.assertEqual(self.counters(Uitvoerders, self.berliner), (1,))
+        self.assertEqual(self.counters(Cd, self.cd), (1,))
+        # Moving the uitvoering to another kompositie and without dirigent updates the old and the new records.
+        self.uitvoering(self.requiem, nid=nid)
+        self.assertEqual(self.counters(Komponist, self.bach), (0, 1))
+        self.assertEqual(self.counters(Komponist, self.mozart), (1, 1))
+        self.assertEqual(self.counters(Kompositie, self.messe), (0,))
+        self.assertEqual(self.counters(Dirigent, self.karajan), (0,))
+        Uitvoering.delete(nid)
+        self.assertEqual(self.counters(Komponist, self.mozart), (0, 1))
+        self.assertEqual(self.counters(Cd, self.cd), (0,))
+        self.assertEqual(self.counters(Uitvoerders, self.berliner), (0,))
+
+    def test_move(self):
+        # A kompositie that moves to another komponist takes its uitvoeringen along.
+        self.uitvoering(self.messe)
+        Kompositie.update(id=self.messe, naam="Hohe Messe", komponist_id=self.mozart)
+        self.assertEqual(self.counters(Komponist, self.bach), (0, 0))
+        self.assertEqual(self.counters(Komponist, self.mozart), (1, 2))
+        # A CD that moves to another uitgever.
+        Cd.update(id=self.cd, titel="Missen", identificatie="", uitgever_id=str(self.decca))
+        self.assertEqual(self.counters(Uitgever, self.dg), (0,))
+        self.assertEqual(self.counters(Uitgever, self.decca), (1,))
+        Kompositie.delete(self.requiem)
+        self.assertEqual(self.counters(Komponist, self.mozart), (1, 1))
+
+    def test_rebuild(self):
+        self.uitvoering(self.messe, dirigent_id=self.karajan)
+        expected = {(model, nid): self.counters(model, nid)
+                    for model, nid in ((Komponist, self.bach), (Kompositie, self.messe), (Dirigent, self.karajan),
+                                       (Uitvoerders, self.berliner), (Cd, self.cd), (Uitgever, self.dg))}
+        # Counters drift when the tables are changed without the models.
+        for model in (Cd, Dirigent, Kompositie, Uitgever, Uitvoerders):
+            db.session.execute(update(model).values(items_cnt=7))
+        db.session.execute(update(Komponist).values(items_cnt=7, komposities_cnt=7))
+        db.session.commit()
+        rebuild_counters()
+        db.session.commit()
+        for (model, nid), counters in expected.items():
+            self.assertEqual(self.counters(model, nid), counters, model.__tablename__)
+        self.assertEqual(self.counters(Komponist, self.mozart), (0, 1))
+        # Refresh only recalculates the records in the lists, the komponist follows from the kompositie.
+        db.session.execute(update(Komponist).values(items_cnt=7))
+        refresh_counters(kompositie=[self.messe])
+        self.assertEqual(self.counters(Komponist, self.bach), (1, 1))
+        self.assertEqual(self.counters(Komponist, self.mozart), (7, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
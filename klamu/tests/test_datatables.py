@@ -0,0 +1,41 @@
+"""
+This procedure will test the DataTables server-side processing endpoints.
+"""
+
+import unittest
+
+from base import AppTestCase
+from klamu.lib.db_model import *
+
+
+class TestDataTables(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for naam in ["Mozart", "Bach", "Beethoven"]:
+            Komponist.update(naam=naam, voornaam="")
+        self.client = self.app.test_client()
+
+    def test_paging(self):
+        res = self.client.get("/tables/komponisten?draw=2&start=1&length=1&order[0][column]=0&order[0][dir]=asc")
+        data = res.get_json()
+        self.assertEqual(data['draw'], 2)
+        self.assertEqual(data['recordsTotal'], 3)
+        self.assertEqual(data['recordsFiltered'], 3)
+        self.assertEqual(len(data['data']), 1)
+        self.assertIn("Beethoven", data['data'][0][0])
+
+    def test_search(self):
+        res = self.client.get("/tables/komponisten?draw=1&search[value]=BACH")
+        data = res.get_json()
+        self.assertEqual(data['recordsTotal'], 3)
+        self.assertEqual(data['recordsFiltered'], 1)
+        self.assertIn("Bach", data['data'][0][0])
+
+    def test_search_wildcard(self):
+        res = self.client.get("/tables/komponisten?draw=1&search[value]=%25")
+        self.assertEqual(res.get_json()['recordsFiltered'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+This procedure will test the eager load of the relations that are shown for the uitvoeringen on a page.
+"""
+
+import re
+import unittest
+
+from base import AppTestCase
+from config import TestConfig
+from klamu import db
+from klamu.lib.db_model import *
+
+
+class DisplayConfig(TestConfig):
+    DATATABLES_SERVER_SIDE = False
+    STREAM_ROUTES = []
+    PAGE_CACHE_SIZE = 0
+
+
+class TestDisplay(AppTestCase):
+    config = DisplayConfig
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+        self.komponist = Komponist.update(naam="Bach", voornaam="Johann Sebastian")['nid']
+        self.cd = Cd.update(titel="Cantates", identificatie="", uitgever_id=str(Uitgever.update(naam="DG")['nid']))
+        self.tracks = 0
+
+    def add(self, cnt):
+        """
+        Add uitvoeringen to the CD, every uitvoering with its own kompositie, dirigent and uitvoerders.
+        """
+        with unit_of_work():
+            for _ in range(cnt):
+                self.tracks += 1
+                Uitvoering.update(volgnummer=self.tracks, cd_id=self.cd,
+                                  kompositie_id=Kompositie.update(naam=f"Cantate {self.tracks}",
+                                                                  komponist_id=self.komponist)['nid'],
+                                  dirigent_id=Dirigent.update(naam=f"Dirigent {self.tracks}", voornaam="")['nid'],
+                                  uitvoerders_id=Uitvoerders.update(naam=f"Koor {self.tracks}")['nid'])
+        db.session.remove()
+
+    def statements(self, url):
+        """
+        Request the page and return the number of SQL statements from the Server-Timing header.
+        """
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertIn(f"Cantate {self.tracks}", response.get_data(as_text=True), url)
+        return int(re.search(r'desc="(\d+) statements"', response.headers['Server-Timing']).group(1))
+
+    def test_pages(self):
+        # With a lazy load per uitvoering the count grows with the rows, and SQL_STRICT fails on the repeats.
+        for url in (f'/cd/{self.cd}', f'/komponist/{self.komponist}', '/uitvoeringen'):
+            self.add(2)
+            few = self.statements(url)
+            self.add(3 * self.app.config['SQL_REPEAT_LIMIT'])
+            self.assertEqual(self.statements(url), few, url)
+
+
+if __name__ == "__main__":
+    unittest.main()
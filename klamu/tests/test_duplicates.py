@@ -0,0 +1,54 @@
+"""
+This procedure will test the duplicate finder.
+"""
+
+import unittest
+
+from base import AppTestCase
+from klamu.lib import duplicates
+from klamu.lib.db_model import *
+
+
+class TestDuplicates(AppTestCase):
+
+    def test_normalize(self):
+        self.assertEqual(duplicates.normalize("Beethoven, Ludwig van"), duplicates.normalize("van Beethoven, Ludwig"))
+        self.assertEqual(duplicates.normalize("Dvořák"), "dvorak")
+
+    def test_candidates(self):
+        names = [duplicates.normalize(name) for name in ["Symfonie nr 5", "Symfonie nr. 5", "Pianosonate 5", "Symfonie"]]
+        pairs = set(duplicates.candidates(names, [1, 1, 1, 2]))
+        self.assertIn((0, 1), pairs)
+        # Records in another block are never compared.
+        self.assertNotIn((0, 3), pairs)
+
+    def test_find(self):
+        with unit_of_work():
+            Komponist.update(naam="Beethoven", voornaam="Ludwig van")
+            Komponist.update(naam="van Beethoven", voornaam="Ludwig")
+            Komponist.update(naam="Beethoven", voornaam="Ludwig von")
+            Komponist.update(naam="Brahms", voornaam="Johannes")
+        pairs = duplicates.find('komponist')
+        self.assertEqual(len(pairs), 3)
+        self.assertEqual(pairs[0]['score'], 1.0)
+        self.assertEqual({pairs[0]['nid_a'], pairs[0]['nid_b']}, {1, 2})
+        self.assertTrue(all(pair['score'] < 1 for pair in pairs[1:]))
+        self.assertEqual(duplicates.find('komponist', threshold=1), pairs[:1])
+        self.assertEqual(duplicates.review(['dirigent']), dict(dirigent=[]))
+
+    def test_cached(self):
+        duplicates.results.clear()
+        Komponist.update(naam="Beethoven", voornaam="Ludwig van")
+        Komponist.update(naam="van Beethoven", voornaam="Ludwig")
+        pairs = duplicates.cached('komponist', get_versions()['komponist'][0])
+        self.assertEqual(len(pairs), 1)
+        self.assertIs(duplicates.cached('komponist', get_versions()['komponist'][0]), pairs)
+        # Another threshold or a new data version scans the table again.
+        self.assertIsNot(duplicates.cached('komponist', get_versions()['komponist'][0], threshold=0.9), pairs)
+        Komponist.update(naam="Beethoven", voornaam="Ludwig von")
+        self.assertEqual(len(duplicates.cached('komponist', get_versions()['komponist'][0])), 3)
+        self.assertEqual(list(duplicates.results), ['komponist'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+This procedure will test the export of uitvoeringen.
+"""
+
+import io
+import json
+import unittest
+import zipfile
+from unittest import mock
+
+from base import AppTestCase
+from klamu.lib import export, importer
+from klamu.lib.db_model import *
+
+
+class TestExport(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rows = [dict(cd_titel="Symfonieën", uitgever="DG", volgnummer=nr, komponist_naam="Brahms",
+                     komponist_voornaam="Johannes", kompositie=f"Symfonie {nr}", uitvoerders="Wiener & Co")
+                for nr in range(1, 5)]
+        rows.append(dict(cd_titel="Concerten", volgnummer=1, komponist_naam="Bach", kompositie="Concert"))
+        importer.Importer(batch_size=2, report=lambda msg: None).run(rows)
+
+    def test_csv_roundtrip(self):
+        with mock.patch.object(export, 'CHUNK_SIZE', 2):
+            data = b''.join(export.export('csv')).decode('utf-8-sig')
+        rows = list(importer.read_rows(io.StringIO(data), 'csv'))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['kompositie'], "Symfonie 1")
+        imp = importer.Importer(report=lambda msg: None)
+        result = imp.run(rows)
+        self.assertEqual(result['skipped'], 5)
+
+    def test_filter(self):
+        komponist = Komponist.query.filter_by(naam="Bach").one()
+        lines = b''.join(export.export('jsonl', komponist=komponist.id)).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['kompositie'] for line in lines], ["Concert"])
+
+    def test_xlsx(self):
+        data = b''.join(export.export('xlsx'))
+        workbook = zipfile.ZipFile(io.BytesIO(data))
+        self.assertIsNone(workbook.testzip())
+        sheet = workbook.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(sheet.count('<row>'), 6)
+        self.assertIn('Wiener &amp; Co', sheet)
+
+
+if __name__ == "__main__":
+    unittest.main()
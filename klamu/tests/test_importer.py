@@ -0,0 +1,71 @@
+"""
+This procedure will test the bulk import of tracklists.
+"""
+
+import io
+import unittest
+
+from base import AppTestCase
+from config import TestConfig
+from klamu.lib import importer, search
+from klamu.lib.db_model import *
+
+TRACKLIST = """cd_titel;cd_identificatie;uitgever;volgnummer;komponist_naam;komponist_voornaam;kompositie;uitvoerders
+Symfonieën;DG 1;DG;1;Brahms;Johannes;Symfonie 1;Berliner Philharmoniker
+Symfonieën;DG 1;DG;2;brahms;johannes;Symfonie 2;Berliner Philharmoniker
+Symfonieën;DG 1;DG;3;Beethoven;Ludwig van;Symfonie 5;
+;;;4;Bruckner;;Symfonie 4;
+"""
+
+
+class ImporterConfig(TestConfig):
+    WTF_CSRF_ENABLED = False
+
+
+class TestImporter(AppTestCase):
+    config = ImporterConfig
+
+    def run_import(self):
+        imp = importer.Importer(batch_size=2, report=lambda msg: None)
+        return imp, imp.run(importer.read_rows(io.StringIO(TRACKLIST), 'csv'))
+
+    def test_csv(self):
+        Komponist.update(naam="Beethoven", voornaam="Ludwig van")
+        imp, result = self.run_import()
+        self.assertEqual(result['uitvoering'], 3)
+        self.assertEqual(result['komponist'], 1)
+        self.assertEqual(result['uitvoerders'], 1)
+        self.assertEqual(len(imp.errors), 1)
+        cd = Cd.query.one()
+        self.assertEqual(cd.items, 3)
+        self.assertEqual(cd.uitgever.items, 1)
+        brahms = Komponist.query.filter_by(naam="Brahms").one()
+        self.assertEqual((brahms.komposities, brahms.items), (2, 2))
+        self.assertEqual(search.search("symfonie")[0][1], 'cd')
+
+    def test_reimport(self):
+        self.run_import()
+        imp, result = self.run_import()
+        self.assertEqual(result['uitvoering'], 0)
+        self.assertEqual(result['skipped'], 3)
+        self.assertEqual(Uitvoering.query.count(), 3)
+
+    def test_json(self):
+        doc = '[{"titel": "Symfonieën", "uitvoeringen": [{"volgnummer": 1, "komponist_naam": "Brahms", ' \
+              '"kompositie": "Symfonie 1"}]}]'
+        rows = list(importer.read_rows(io.StringIO(doc), 'json'))
+        self.assertEqual(rows[0]['cd_titel'], "Symfonieën")
+        self.assertEqual(rows[0]['kompositie'], "Symfonie 1")
+
+    def test_upload_error(self):
+        client = self.login('import')
+        # A field that is longer than the CSV field size limit raises csv.Error.
+        tracklist = TRACKLIST + f";;;5;Bruckner;;{'x' * 200000};\n"
+        response = client.post('/import', data=dict(tracklist=(io.BytesIO(tracklist.encode('utf-8')), 'lijst.csv')),
+                               follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Import van lijst.csv is mislukt", response.get_data(as_text=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
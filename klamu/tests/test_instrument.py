@@ -0,0 +1,69 @@
+"""
+This procedure will test the request instrumentation.
+"""
+
+import unittest
+
+from base import AppTestCase
+from config import TestConfig
+from klamu import db
+from klamu.lib import instrument
+from klamu.lib.db_model import Komponist
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+
+
+class InstrumentConfig(TestConfig):
+    SQL_REPEAT_LIMIT = 3
+
+
+class TestInstrument(AppTestCase):
+    config = InstrumentConfig
+
+    def test_shape(self):
+        self.assertEqual(instrument.shape("SELECT id\n  FROM komponist\tWHERE id = ?"),
+                         "SELECT id FROM komponist WHERE id = ?")
+
+    def test_server_timing(self):
+        client = self.app.test_client()
+        response = client.get('/login')
+        self.assertEqual(response.status_code, 200)
+        timing = response.headers['Server-Timing']
+        for metric in ('sql;dur=', 'tpl;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+
+    def test_statements(self):
+        with self.app.test_request_context('/'):
+            instrument.before_request()
+            for nid in range(2):
+                db.session.execute(select(Komponist).where(Komponist.id == nid)).all()
+            measure = instrument.stats()
+            self.assertEqual(measure['statements'], 2)
+            self.assertEqual(len(measure['shapes']), 1)
+
+    def test_n_plus_one(self):
+        with self.app.test_request_context('/'):
+            instrument.before_request()
+            with self.assertRaises(instrument.NPlusOneError):
+                for nid in range(5):
+                    db.session.execute(select(Komponist).where(Komponist.id == nid)).all()
+
+    def test_failed_statement(self):
+        # A failed statement leaves no start time on the pooled connection.
+        with self.app.test_request_context('/'):
+            instrument.before_request()
+            for _ in range(3):
+                with self.assertRaises(OperationalError):
+                    db.session.execute(text("SELECT * FROM geen_tabel"))
+                db.session.rollback()
+            self.assertEqual(db.session.connection().info.get('instrument_start'), [])
+            self.assertEqual(instrument.stats()['statements'], 0)
+
+    def test_no_request(self):
+        # Statements outside a request are not measured.
+        db.session.execute(select(Komponist)).all()
+        self.assertIsNone(instrument.stats())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+This procedure will test the bytecode cache, the precompilation of the templates and the macros without context.
+"""
+
+import os
+import tempfile
+import unittest
+
+from base import AppTestCase
+from config import TestConfig
+from klamu import create_app, db
+from klamu.lib.db_model import *
+from klamu.lib import jinja, synthetic
+
+JINJA_CACHE_DIR = tempfile.mkdtemp()
+
+
+class JinjaConfig(TestConfig):
+    WTF_CSRF_ENABLED = False
+    JINJA_CACHE_DIR = JINJA_CACHE_DIR
+    JINJA_PRECOMPILE = True
+
+
+class TestJinja(AppTestCase):
+    config = JinjaConfig
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+
+    def test_precompile(self):
+        # All templates are compiled and in the bytecode cache when the application is created.
+        names = jinja.precompile(self.app)
+        self.assertIn('macros.html', names)
+        self.assertIn('bootstrap/base.html', names)
+        self.assertGreaterEqual(len(os.listdir(JINJA_CACHE_DIR)), len(names))
+        # A new application loads the templates from the bytecode cache.
+        app = create_app(JinjaConfig)
+        self.assertIsNotNone(app.jinja_env.bytecode_cache)
+        # The template version is the same for every application with the same templates.
+        self.assertEqual(app.config['TEMPLATE_VERSION'], jinja.template_version(self.app))
+
+    def test_macros(self):
+        # The macro module is evaluated once, and the macros still see the logged in user.
+        module = self.app.jinja_env.get_template('macros.html').module
+        synthetic.generate(20, report=lambda msg: None)
+        uitvoering = db.session.get(Uitvoering, 1)
+        cd_id, uitvoering_id = uitvoering.cd_id, uitvoering.id
+        edit = f'/cd/uitvoering/uitvoering={uitvoering_id}'
+        self.assertNotIn(edit, self.client.get(f'/cd/{cd_id}').get_data(as_text=True))
+        User.register('jinja', 'jinja')
+        self.client.post('/login', data=dict(username='jinja', password='jinja'))
+        self.assertIn(edit, self.client.get(f'/cd/{cd_id}').get_data(as_text=True))
+        self.assertIs(self.app.jinja_env.get_template('macros.html').module, module)
+
+
+if __name__ == "__main__":
+    unittest.main()
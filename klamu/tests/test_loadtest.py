@@ -0,0 +1,141 @@
+"""
+This procedure will test the load test harness and the status for a lock timeout.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+# The base module sets the environment for config.
+import base
+from config import TestConfig
+from klamu import create_app, db
+from klamu.lib import benchmark, loadtest
+from sqlalchemy.exc import OperationalError
+from werkzeug.serving import make_server
+
+DBDIR = tempfile.mkdtemp()
+
+LOG = [
+    '127.0.0.1 - - [18/Oct/2026:10:00:00 +0200] "GET /cd/12 HTTP/1.1" 200 5120 "-" "Mozilla/5.0"',
+    '127.0.0.1 - - [18/Oct/2026:10:00:01 +0200] "GET /static/css/klamu.css HTTP/1.1" 200 512 "-" "Mozilla/5.0"',
+    '127.0.0.1 - - [18/Oct/2026:10:00:02 +0200] "POST /cd/update/12 HTTP/1.1" 302 0 "-" "Mozilla/5.0"',
+    '127.0.0.1 - - [18/Oct/2026:10:00:03 +0200] "GET /komponist/999 HTTP/1.1" 404 210 "-" "Mozilla/5.0"',
+    '127.0.0.1 - - [18/Oct/2026:10:00:04 +0200] "GET /cd/delete/12 HTTP/1.1" 302 0 "-" "Mozilla/5.0"',
+    '127.0.0.1 - - [18/Oct/2026:10:00:05 +0200] "GET /cds?page=2 HTTP/1.1" 200 9000 "-" "Mozilla/5.0"',
+    'no request'
+]
+
+FORM = """
+<form method="get" action="/search"><input name="search"></form>
+<form method="post" action="">
+  <input type="hidden" name="csrf_token" value="abc">
+  <input type="text" name="titel" value="Requiem">
+  <input type="checkbox" name="vinyl">
+  <input type="checkbox" name="box" checked>
+  <select name="uitgever_id"><option value="1">Decca</option><option value="2" selected>Naxos</option></select>
+  <select name="komponist_id"><option value="7">Bach</option><option value="8">Mozart</option></select>
+  <textarea name="opmerking">Live</textarea>
+  <input type="submit" name="submit" value="OK">
+</form>
+"""
+
+
+class TestLoadTest(unittest.TestCase):
+
+    def test_parse_log(self):
+        self.assertEqual(loadtest.parse_log(LOG), ['/cd/12', '/cds?page=2'])
+
+    def test_group(self):
+        self.assertEqual(loadtest.group('GET', '/cd/12?x=3'), 'GET /cd/<id>')
+        self.assertEqual(loadtest.group('POST', '/cd/uitvoering/uitvoering=5'), 'POST /cd/uitvoering/uitvoering=<id>')
+
+    def test_synthesize(self):
+        ids = dict(cd=[1, 2], dirigent=[1], komponist=[3], kompositie=[4], uitvoerders=[5], uitvoering=[6])
+        requests = loadtest.synthesize(ids, 200, writes=0.1, seed=3)
+        self.assertEqual(requests, loadtest.synthesize(ids, 200, writes=0.1, seed=3))
+        writes = [request for request in requests if request.method == 'WRITE']
+        self.assertTrue(0 < len(writes) < 60)
+        self.assertTrue(all('{' not in request.path for request in requests))
+
+    def test_form(self):
+        parser = loadtest.FormParser()
+        parser.feed(FORM)
+        self.assertEqual(parser.action, '')
+        self.assertEqual(parser.fields, dict(csrf_token='abc', titel='Requiem', box='y', uitgever_id='2',
+                                             komponist_id='7', opmerking='Live'))
+
+    def test_summary(self):
+        results = [loadtest.Result('GET /cds', 200, 0.01 * pos, None) for pos in range(1, 101)]
+        results += [loadtest.Result('POST /cd/update/<id>', 503, 5, None),
+                    loadtest.Result('POST /cd/update/<id>', 0, 1, 'Connection refused')]
+        report = loadtest.summary(results, 10)
+        self.assertEqual(report['total']['count'], 102)
+        self.assertEqual(report['groups']['GET /cds']['p50'], 500)
+        self.assertEqual(report['groups']['GET /cds']['p99'], 990)
+        self.assertEqual(report['groups']['POST /cd/update/<id>']['locked'], 1)
+        self.assertEqual(report['groups']['POST /cd/update/<id>']['errors'], 1)
+        self.assertEqual(report['errors'], ['POST /cd/update/<id>: Connection refused'])
+
+
+class TestLockTimeout(unittest.TestCase):
+
+    def setUp(self):
+        # Initialize Environment
+        self.app = create_app(TestConfig)
+
+        @self.app.route('/locked')
+        def locked():
+            raise OperationalError("UPDATE cd", {}, Exception("database is locked"))
+
+        @self.app.route('/broken')
+        def broken():
+            raise OperationalError("SELECT", {}, Exception("no such table: cd"))
+
+        self.app.config['PROPAGATE_EXCEPTIONS'] = False
+        self.client = self.app.test_client()
+
+    def test_lock_timeout(self):
+        response = self.client.get('/locked')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(self.client.get('/broken').status_code, 500)
+
+
+class TestRun(unittest.TestCase):
+
+    def setUp(self):
+        # Initialize Environment
+        self.app = create_app(benchmark.config(os.path.join(DBDIR, 'loadtest.db')))
+        with self.app.app_context():
+            benchmark.prepare(200, 1, report=lambda msg: None)
+            self.ids = loadtest.sample_ids()
+            db.session.remove()
+        self.server = make_server('127.0.0.1', 0, self.app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+
+    def test_run(self):
+        requests = loadtest.synthesize(self.ids, 60, writes=0.2)
+        report = loadtest.run(f"http://127.0.0.1:{self.server.port}", requests, concurrency=3,
+                              username=benchmark.USER, password=benchmark.PASSWORD, report=lambda msg: None)
+        self.assertEqual(report['total']['errors'], 0, report['groups'])
+        self.assertIn('POST /cd/uitvoering/uitvoering=<id>', report['groups'])
+        self.assertEqual(report['groups']['POST /cd/uitvoering/uitvoering=<id>']['statuses'], {302: report['groups'][
+            'POST /cd/uitvoering/uitvoering=<id>']['count']})
+        self.assertGreater(report['total']['rps'], 0)
+
+    def test_login(self):
+        client = loadtest.Client(f"http://127.0.0.1:{self.server.port}")
+        self.assertFalse(client.login(benchmark.USER, 'wrong'))
+        with self.assertRaises(ValueError):
+            loadtest.run(f"http://127.0.0.1:{self.server.port}", [], username=benchmark.USER, password='wrong')
+
+
+if __name__ == "__main__":
+    unittest.main()
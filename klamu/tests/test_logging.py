@@ -0,0 +1,86 @@
+"""
+This procedure will test the queue based logging, the JSON lines and the request fields.
+"""
+
+import json
+import logging
+import os
+import platform
+import tempfile
+import unittest
+
+from base import AppTestCase
+from klamu.lib import logcontext, my_env
+
+LOGDIR = tempfile.mkdtemp()
+
+
+class TestLogging(AppTestCase):
+
+    def setUp(self):
+        # The application opens the logfile in LOGDIR when it is created.
+        self.logdir = os.environ["LOGDIR"]
+        os.environ["LOGDIR"] = LOGDIR
+        super().setUp()
+        self.logfile = os.path.join(LOGDIR, f"test_{platform.node()}.log")
+        if os.path.exists(self.logfile):
+            os.remove(self.logfile)
+
+    def tearDown(self):
+        my_env.close_loghandler()
+        os.environ["LOGDIR"] = self.logdir
+        super().tearDown()
+
+    def lines(self):
+        # The listener writes all records on the queue when it stops.
+        my_env.close_loghandler()
+        with open(self.logfile) as fh:
+            return fh.read().splitlines()
+
+    def test_queue(self):
+        logger = my_env.init_loghandler('test')
+        my_env.init_loghandler('test')
+        handlers = [hdl for hdl in logger.handlers if isinstance(hdl, logging.handlers.QueueHandler)]
+        self.assertEqual(len(handlers), 1)
+        logging.getLogger('klamu.test').warning("Eerste %s", "regel")
+        lines = self.lines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith("|WARNING|Eerste regel"))
+
+    def test_json(self):
+        my_env.init_loghandler('test', json_lines=True, filters=[logcontext.RequestFilter()])
+        self.app.config['SQL_INSTRUMENT'] = True
+        self.app.logger.setLevel(logging.INFO)
+        try:
+            response = self.app.test_client().get('/login', headers={'X-Request-ID': 'abc-123'})
+        finally:
+            self.app.logger.setLevel(logging.NOTSET)
+        self.assertEqual(response.headers['X-Request-ID'], 'abc-123')
+        lines = [json.loads(line) for line in self.lines()]
+        line = [line for line in lines if 'duration_ms' in line][-1]
+        self.assertEqual(line['request_id'], 'abc-123')
+        self.assertEqual(line['route'], 'main.login')
+        self.assertEqual(line['status'], 200)
+        self.assertGreaterEqual(line['sql_count'], 0)
+
+    def test_json_exception(self):
+        my_env.init_loghandler('test', json_lines=True)
+        try:
+            raise ValueError("Fout in regel 3")
+        except ValueError:
+            logging.getLogger('klamu.test').error("Import is %s", "mislukt", exc_info=True)
+        line = json.loads(self.lines()[-1])
+        self.assertEqual(line['message'], "Import is mislukt")
+        self.assertIn("ValueError: Fout in regel 3", line['exception'])
+        self.assertTrue(line['exception'].startswith("Traceback"))
+
+    def test_request_id(self):
+        client = self.app.test_client()
+        first = client.get('/login').headers['X-Request-ID']
+        second = client.get('/login', headers={'X-Request-ID': 'niet "geldig"'}).headers['X-Request-ID']
+        self.assertEqual(len(first), 32)
+        self.assertNotEqual(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()
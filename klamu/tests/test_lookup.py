@@ -0,0 +1,70 @@
+"""
+This procedure will test the kompositie lookup: paging, ETag and the choice list cache.
+"""
+
+import unittest
+
+from base import AppTestCase
+from config import TestConfig
+from klamu.lib import choices
+from klamu.lib.db_model import *
+
+
+class LookupConfig(TestConfig):
+    WTF_CSRF_ENABLED = False
+    KOMPOSITIE_LOOKUP_LIMIT = 2
+
+
+class TestLookup(AppTestCase):
+    config = LookupConfig
+
+    def setUp(self):
+        super().setUp()
+        self.bach = Komponist.update(naam="Bach", voornaam="Johann Sebastian")['nid']
+        self.mozart = Komponist.update(naam="Mozart", voornaam="Wolfgang Amadeus")['nid']
+        for naam in ("Hohe Messe", "Matthaus Passion", "Weihnachtsoratorium"):
+            Kompositie.update(naam=naam, komponist_id=self.bach)
+        self.client = self.login('lookup')
+
+    def test_pages(self):
+        first = self.client.get('/kompositie/lookup').json
+        self.assertEqual((first['page'], first['next'], first['total']), (1, 2, 3))
+        self.assertEqual([naam for _, naam in first['komposities']], ["Hohe Messe", "Matthaus Passion"])
+        second = self.client.get('/kompositie/lookup?page=2').json
+        self.assertEqual((second['next'], len(second['komposities'])), (None, 1))
+        # Pages after the last page and unknown komponisten are not found and are not cached.
+        entries = choices.cache.stats()['entries']
+        for pos in range(3, 30):
+            self.assertEqual(self.client.get(f'/kompositie/lookup?page={pos}').status_code, 404)
+            self.assertEqual(self.client.get(f'/kompositie/lookup?komponist={pos}').status_code, 404)
+        self.assertEqual(choices.cache.stats()['entries'], entries)
+        entry = choices.cache.entries[choices.cache.key('kompositie', -1)]
+        self.assertEqual(len(entry['memo']), 2)
+
+    def test_memo_size(self):
+        for limit in range(1, choices.MEMO_SIZE + 10):
+            get_kompositie_json(-1, 1, limit)
+        entry = choices.cache.entries[choices.cache.key('kompositie', -1)]
+        self.assertEqual(len(entry['memo']), choices.MEMO_SIZE)
+
+    def test_etag(self):
+        response = self.client.get(f'/kompositie/lookup?komponist={self.bach}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['total'], 3)
+        etag = response.headers['ETag']
+        response = self.client.get(f'/kompositie/lookup?komponist={self.bach}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        # A changed kompositie gives a new document for both komponisten.
+        nid = get_kompositie_pairs(self.bach)[0][0]
+        Kompositie.update(id=nid, naam="Requiem", komponist_id=self.mozart)
+        response = self.client.get(f'/kompositie/lookup?komponist={self.bach}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['total'], 2)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        response = self.client.get(f'/kompositie/lookup?komponist={self.mozart}')
+        self.assertEqual(response.json['komposities'], [[nid, "Requiem"]])
+        self.assertEqual(self.client.get('/kompositie/lookup').json['total'], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
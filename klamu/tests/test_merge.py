@@ -0,0 +1,62 @@
+"""
+This procedure will test the merge of duplicate records.
+"""
+
+import io
+import unittest
+
+from base import AppTestCase
+from config import TestConfig
+from klamu.lib import importer, search
+from klamu.lib.db_model import *
+
+TRACKLIST = """cd_titel;cd_identificatie;uitgever;volgnummer;komponist_naam;komponist_voornaam;kompositie;uitvoerders
+Symfonieën;DG 1;DG;1;Beethoven;Ludwig van;Symfonie 5;Berliner Philharmoniker
+Symfonieën;DG 1;DG;2;van Beethoven;Ludwig;Symfonie nr. 5;Berliner Phil.
+Symfonieën;DG 1;DG;3;van Beethoven;Ludwig;Symfonie 6;Berliner Phil.
+"""
+
+
+class MergeConfig(TestConfig):
+    WTF_CSRF_ENABLED = False
+
+
+class TestMerge(AppTestCase):
+    config = MergeConfig
+
+    def setUp(self):
+        super().setUp()
+        importer.Importer(report=lambda msg: None).run(importer.read_rows(io.StringIO(TRACKLIST), 'csv'))
+
+    def test_dry_run(self):
+        res = merge('uitvoerders', 2, 1, dry_run=True)
+        self.assertEqual(res['rows'], dict(uitvoering=2, uitvoerders=1))
+        self.assertEqual(Uitvoerders.query.count(), 2)
+
+    def test_merge(self):
+        self.assertEqual(merge('komponist', 2, 1)['status'], "success")
+        self.assertEqual(Komponist.query.count(), 1)
+        beethoven = Komponist.query.one()
+        self.assertEqual((beethoven.komposities, beethoven.items), (3, 3))
+        self.assertEqual(sorted(pair[0] for pair in get_kompositie_pairs(beethoven.id)), [1, 2, 3])
+        self.assertEqual(merge('kompositie', 2, 1)['status'], "success")
+        self.assertEqual(Kompositie.query.filter_by(id=1).one().items, 2)
+        self.assertEqual(Komponist.query.one().komposities, 2)
+        found = dict((kind, sorted(result['nid'] for result in results)) for _, kind, results in search.search("Symfonie"))
+        self.assertEqual(found['kompositie'], [1, 3])
+
+    def test_errors(self):
+        self.assertEqual(merge('dirigent', 1, 1)['status'], "error")
+        self.assertEqual(merge('uitgever', 5, 1)['status'], "error")
+
+    def test_route(self):
+        client = self.login('merge')
+        self.assertEqual(client.get('/merge/komponist/2/1').status_code, 200)
+        # IDs that are not numbers are not found, for the dry run and for the merge.
+        self.assertEqual(client.get('/merge/komponist/abc/1').status_code, 404)
+        self.assertEqual(client.post('/merge/komponist/2/x1').status_code, 404)
+        self.assertEqual(Komponist.query.count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
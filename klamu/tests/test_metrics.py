@@ -0,0 +1,123 @@
+"""
+This procedure will test the metrics and the health and readiness probes.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from base import AppTestCase
+from config import TestConfig
+from klamu import create_app, db
+from klamu.lib import metrics
+
+METRICS_DIR = tempfile.mkdtemp()
+
+
+class MultiprocessConfig(TestConfig):
+    METRICS_DIR = METRICS_DIR
+
+
+class TestMetrics(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        metrics.registry.clear()
+        super().tearDown()
+
+    def test_exposition(self):
+        registry = metrics.Registry()
+        labels = (('endpoint', 'main.index'),)
+        registry.observe('klamu_request_duration_seconds', labels, 0.02)
+        registry.observe('klamu_request_duration_seconds', labels, 20)
+        registry.inc('klamu_requests_total', labels + (('status', 'a "b"'),))
+        text = metrics.exposition(metrics.merge([(True, registry.snapshot())]))
+        self.assertIn('# TYPE klamu_request_duration_seconds histogram', text)
+        self.assertIn('klamu_request_duration_seconds_bucket{endpoint="main.index",le="0.01"} 0', text)
+        self.assertIn('klamu_request_duration_seconds_bucket{endpoint="main.index",le="0.025"} 1', text)
+        self.assertIn('klamu_request_duration_seconds_bucket{endpoint="main.index",le="+Inf"} 2', text)
+        self.assertIn('klamu_request_duration_seconds_count{endpoint="main.index"} 2', text)
+        self.assertIn('klamu_requests_total{endpoint="main.index",status="a \\"b\\""} 1', text)
+
+    def test_merge(self):
+        # Counters of all processes are added up, gauges only for running processes.
+        registry = metrics.Registry()
+        registry.inc('klamu_requests_total', (('endpoint', 'main.index'),), 2)
+        registry.inc('klamu_requests_in_progress')
+        snapshot = registry.snapshot()
+        values = metrics.merge([(True, snapshot), (False, snapshot)])
+        self.assertEqual(values[('klamu_requests_total', (('endpoint', 'main.index'),))], 4)
+        self.assertEqual(values[('klamu_requests_in_progress', ())], 1)
+
+    def test_metrics(self):
+        self.client.get('/login')
+        self.client.get('/login')
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('klamu_requests_total{endpoint="main.login",method="GET",status="200"} 2', text)
+        self.assertIn('klamu_response_size_bytes_count{endpoint="main.login"} 2', text)
+        self.assertIn('klamu_sql_statements_total{endpoint="main.login"}', text)
+        self.assertIn('klamu_cache_hits_total{cache="pages"}', text)
+        # The request for the metrics is in progress.
+        self.assertIn('klamu_requests_in_progress 1', text)
+
+    def test_streamed(self):
+        # A streamed page is not collected for the response size.
+        self.app.config.update(DATATABLES_SERVER_SIDE=False, STREAM_ROUTES=['main.show_cds'])
+        with self.app.test_request_context('/cds'):
+            response = self.app.full_dispatch_request()
+            self.assertTrue(response.is_streamed)
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertNotIn('klamu_response_size_bytes_count{endpoint="main.show_cds"}', text)
+
+    def test_probes(self):
+        self.assertEqual(self.client.get('/health').json['status'], 'ok')
+        response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json['databases']['default']['ready'])
+        db.drop_all()
+        response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertIsNotNone(response.json['databases']['default']['error'])
+        db.create_all()
+
+
+class TestMultiprocess(unittest.TestCase):
+
+    def setUp(self):
+        # Initialize Environment
+        self.app = create_app(MultiprocessConfig)
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        metrics.registry.clear()
+        metrics.clear(METRICS_DIR)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        metrics.registry.clear()
+        metrics.clear(METRICS_DIR)
+        self.app_ctx.pop()
+
+    def test_processes(self):
+        # Metrics file of a worker that stopped, pid -1 is not a running process.
+        registry = metrics.Registry()
+        registry.inc('klamu_requests_total', (('endpoint', 'main.login'), ('method', 'GET'), ('status', '200')), 5)
+        registry.inc('klamu_requests_in_progress', value=3)
+        with open(os.path.join(METRICS_DIR, 'metrics_stopped.json'), 'w') as fh:
+            json.dump(dict(pid=-1, samples=registry.snapshot()), fh)
+        client = self.app.test_client()
+        client.get('/login')
+        text = client.get('/metrics').get_data(as_text=True)
+        self.assertIn('klamu_requests_total{endpoint="main.login",method="GET",status="200"} 6', text)
+        self.assertIn('klamu_requests_in_progress 1', text)
+        self.assertTrue(os.path.exists(os.path.join(METRICS_DIR, f'metrics_{os.getpid()}.json')))
+
+
+if __name__ == "__main__":
+    unittest.main()
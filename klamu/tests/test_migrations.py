@@ -0,0 +1,94 @@
+"""
+This procedure will test the schema migrations on a database with the schema before the first migration.
+"""
+
+import unittest
+from unittest import mock
+
+from base import AppTestCase
+from klamu import db
+from klamu.lib import migrations
+from sqlalchemy import inspect, text
+
+# Columns and indexes that the migrations add to the baseline schema.
+COUNTERS = dict(cd=['items_cnt'], dirigent=['items_cnt'], komponist=['komposities_cnt', 'items_cnt'],
+                kompositie=['items_cnt'], uitgever=['items_cnt'], uitvoerders=['items_cnt'])
+INDEXES = dict(cd=['ix_cd_uitgever_id'], kompositie=['ix_kompositie_komponist_id'],
+               uitvoering=['ix_uitvoering_cd_volgnummer', 'ix_uitvoering_dirigent_id', 'ix_uitvoering_kompositie_id',
+                           'ix_uitvoering_uitvoerders_id'])
+
+
+class TestMigrations(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Baseline schema: without the counter columns, the search index, the foreign key indexes and data versions.
+        for indexes in INDEXES.values():
+            for index in indexes:
+                db.session.execute(text(f"DROP INDEX {index}"))
+        for table, columns in COUNTERS.items():
+            for column in columns:
+                db.session.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        db.session.execute(text("DROP TABLE IF EXISTS search_index"))
+        db.session.execute(text("DROP TABLE data_version"))
+        db.session.execute(text("INSERT INTO komponist (id, created, modified, naam, voornaam) "
+                                "VALUES (1, 0, 100, 'Bach', 'Johann Sebastian')"))
+        db.session.execute(text("INSERT INTO kompositie (id, naam, komponist_id) VALUES (1, 'Hohe Messe', 1)"))
+        db.session.execute(text("INSERT INTO kompositie (id, naam, komponist_id) VALUES (2, 'Magnificat', 1)"))
+        db.session.commit()
+
+    def test_upgrade(self):
+        self.assertEqual(migrations.get_version(), 0)
+        messages = migrations.check_indexes()
+        for index in INDEXES['uitvoering']:
+            self.assertTrue(any(index in message for message in messages), index)
+        self.assertIn("Foreign key kompositie.komponist_id has no index.", messages)
+        self.assertIn("Table data_version is missing.", messages)
+        self.assertEqual(migrations.upgrade(), [1, 2, 3, 4])
+        # A second run finds no pending migrations and does not change the database.
+        self.assertEqual(migrations.upgrade(), [])
+        self.assertEqual(migrations.get_version(), migrations.latest_version())
+        self.assertEqual(db.session.execute(text("PRAGMA user_version")).scalar(), 4)
+        inspector = inspect(db.session.connection())
+        for table, columns in COUNTERS.items():
+            existing = [col['name'] for col in inspector.get_columns(table)]
+            for column in columns:
+                self.assertIn(column, existing, table)
+        for table, indexes in INDEXES.items():
+            existing = [idx['name'] for idx in inspector.get_indexes(table)]
+            for index in indexes:
+                self.assertIn(index, existing, table)
+        self.assertEqual(migrations.check_indexes(), [])
+        # The counters are filled from the data, the data versions are seeded.
+        counts = db.session.execute(text("SELECT komposities_cnt FROM komponist WHERE id = 1")).scalar()
+        self.assertEqual(counts, 2)
+        self.assertEqual(db.session.execute(text("SELECT modified FROM data_version WHERE name = 'komponist'"))
+                         .scalar(), 100)
+        self.assertEqual(db.session.execute(text("SELECT count(*) FROM search_index")).scalar(), 3)
+
+    def test_counters_with_indexes(self):
+        # The counters are rebuilt after the indexes are created, the count subqueries use them.
+        indexes = []
+
+        def rebuild():
+            inspector = inspect(db.session.connection())
+            indexes.extend(idx['name'] for idx in inspector.get_indexes('uitvoering'))
+            rebuild_counters()
+
+        rebuild_counters = migrations.ds.rebuild_counters
+        with mock.patch.object(migrations.ds, 'rebuild_counters', side_effect=rebuild):
+            migrations.upgrade()
+        self.assertEqual(sorted(indexes), INDEXES['uitvoering'])
+
+    def test_new_database(self):
+        db.drop_all()
+        db.session.execute(text("DROP TABLE IF EXISTS search_index"))
+        db.session.commit()
+        self.assertEqual(migrations.upgrade(), [])
+        self.assertEqual(migrations.get_version(), migrations.latest_version())
+        self.assertEqual(migrations.pending(), [])
+        self.assertEqual(migrations.check_indexes(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
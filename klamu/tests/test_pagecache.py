@@ -0,0 +1,54 @@
+"""
+This procedure will test the page cache for anonymous visitors.
+"""
+
+import unittest
+
+from base import AppTestCase
+from config import TestConfig
+from klamu.lib import pagecache
+from klamu.lib.db_model import *
+
+
+class PageCacheConfig(TestConfig):
+    PAGE_CACHE_SIZE = 10
+    DATATABLES_SERVER_SIDE = False
+
+
+class TestPageCache(AppTestCase):
+    config = PageCacheConfig
+
+    def setUp(self):
+        super().setUp()
+        pagecache.cache.clear()
+        self.client = self.app.test_client()
+
+    def test_lru(self):
+        cache = pagecache.PageCache()
+        for url in ['/a', '/b', '/c']:
+            cache.put('ep', url, (1,), ['cd'], url.encode(), 'text/html', 60, 2)
+        self.assertIsNone(cache.get('ep', '/a', (1,)))
+        self.assertEqual(cache.get('ep', '/b', (1,))['data'], b'/b')
+        # Other data version is stale, time to live 0 is expired.
+        self.assertIsNone(cache.get('ep', '/c', (2,)))
+        cache.put('ep', '/d', (1,), ['cd'], b'/d', 'text/html', 0, 2)
+        self.assertIsNone(cache.get('ep', '/d', (1,)))
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['endpoints']['ep'], dict(hits=1, misses=1, expired=1, stale=1))
+
+    def test_anonymous(self):
+        Komponist.update(naam="Brahms", voornaam="Johannes")
+        # The list page is streamed, it is stored in the cache when it is sent completely.
+        self.assertIn(b'Brahms', self.client.get('/komponisten').data)
+        resp = self.client.get('/komponisten')
+        self.assertIn(b'Brahms', resp.data)
+        self.assertEqual(pagecache.cache.stats()['hits'], 1)
+        Komponist.update(naam="Bruckner", voornaam="Anton")
+        self.assertEqual(pagecache.cache.stats()['entries'], 0)
+        resp = self.client.get('/komponisten')
+        self.assertIn(b'Bruckner', resp.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+This procedure will test the routing of reads to the read replica.
+"""
+
+import os
+import tempfile
+import unittest
+
+from base import AppTestCase
+from config import TestConfig
+from flask import session
+from klamu import db
+from klamu.lib import replica
+from klamu.lib.db_model import *
+from sqlalchemy import text
+
+DBDIR = tempfile.mkdtemp()
+
+
+class ReplicaConfig(TestConfig):
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(DBDIR, 'primary.db')}"
+    SQLALCHEMY_BINDS = {'replica': f"sqlite:///{os.path.join(DBDIR, 'replica.db')}"}
+
+
+class TestReplica(AppTestCase):
+    config = ReplicaConfig
+
+    def setUp(self):
+        # The metadata for the bind is kept on db, remove it for the tests without replica, also if setUp fails.
+        self.addCleanup(db.metadatas.pop, replica.BIND, None)
+        super().setUp()
+        Uitgever.update(naam="DG")
+        # The replica is a copy of the primary database, later changes are on the primary only.
+        db.engines['replica'].dispose()
+        os.remove(os.path.join(DBDIR, 'replica.db'))
+        db.session.execute(text("VACUUM INTO :path"), dict(path=os.path.join(DBDIR, 'replica.db')))
+        Uitgever.update(naam="Decca")
+        Komponist.update(naam="Bach", voornaam="Johann Sebastian")
+
+    def tearDown(self):
+        super().tearDown()
+        os.remove(os.path.join(DBDIR, 'replica.db'))
+
+    def test_reads(self):
+        self.assertTrue(replica.reads(select(Uitgever.id)))
+        self.assertTrue(replica.reads(text(" select 1")))
+        self.assertFalse(replica.reads(update(Uitgever).values(naam="x")))
+        self.assertFalse(replica.reads(text("DELETE FROM uitgever")))
+
+    def test_get_request(self):
+        with self.app.test_request_context(method='GET'):
+            replica.before_request()
+            self.assertEqual(Uitgever.query.count(), 1)
+            self.assertNotIn('primary_until', session)
+            # After a write the request reads from the primary.
+            Uitgever.update(naam="EMI")
+            self.assertEqual(Uitgever.query.count(), 3)
+            replica.after_request(None)
+            self.assertIn('primary_until', session)
+            replica.teardown_request(None)
+            # Read your writes: the next GET of the user reads from the primary.
+            replica.before_request()
+            self.assertEqual(Uitgever.query.count(), 3)
+
+    def test_post_request(self):
+        with self.app.test_request_context(method='POST'):
+            replica.before_request()
+            self.assertEqual(Uitgever.query.count(), 2)
+
+    def test_choices(self):
+        # The replica has no komponisten, the cached choice lists are read from the primary.
+        with self.app.test_request_context(method='GET'):
+            replica.before_request()
+            self.assertEqual(Komponist.query.count(), 0)
+            self.assertEqual(get_komponist_pairs(), [(1, "Bach Johann Sebastian")])
+            self.assertEqual(Komponist.query.count(), 0)
+            replica.teardown_request(None)
+        # Read your writes for all users: a new komponist is in the cached list on the next GET.
+        with self.app.test_request_context(method='POST'):
+            replica.before_request()
+            Komponist.update(naam="Mozart", voornaam="Wolfgang Amadeus")
+            replica.teardown_request(None)
+        with self.app.test_request_context(method='GET'):
+            replica.before_request()
+            self.assertEqual(len(get_komponist_pairs()), 2)
+            self.assertEqual(len(get_kompositie_pairs(-1)), 0)
+
+    def test_delete(self):
+        # The CD of uitgever DG is not on the replica yet, the delete checks the references on the primary.
+        dg = Uitgever.query.filter_by(naam="DG").one().id
+        cd = Cd.update(titel="Missen", identificatie="", uitgever_id=str(dg))
+        with self.app.test_request_context(method='GET'):
+            replica.before_request()
+            self.assertEqual(Cd.query.count(), 0)
+            self.assertEqual(Uitgever.delete(dg)['status'], "error")
+            self.assertEqual(Cd.delete(cd)['status'], "success")
+            replica.teardown_request(None)
+        self.assertEqual(Uitgever.query.count(), 2)
+
+    def test_reading(self):
+        with replica.reading():
+            self.assertEqual(Uitgever.query.count(), 1)
+        self.assertEqual(Uitgever.query.count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+This procedure will test the full-text search index.
+"""
+
+import unittest
+
+from base import AppTestCase
+from klamu import db
+from klamu.lib import search
+from klamu.lib.db_model import *
+
+
+class TestSearch(AppTestCase):
+
+    def test_match_query(self):
+        self.assertEqual(search.match_query('beeth sym'), '"beeth"* "sym"*')
+        self.assertEqual(search.match_query('"*('), None)
+
+    def test_incremental(self):
+        res = Komponist.update(naam="Dvořák", voornaam="Antonín")
+        results = search.search("dvor")
+        self.assertEqual(results[0][1], 'komponist')
+        self.assertEqual(results[0][2][0]['nid'], res['nid'])
+        Komponist.update(id=res['nid'], naam="Smetana", voornaam="Bedřich")
+        self.assertEqual(search.search("dvor"), [])
+        Komponist.delete(res['nid'])
+        self.assertEqual(search.search("smet"), [])
+
+    def test_rebuild(self):
+        Uitvoerders.update(naam="Wiener Philharmoniker")
+        Dirigent.update(naam="Kleiber", voornaam="Carlos")
+        db.session.execute(db.text("DELETE FROM search_index"))
+        self.assertEqual(search.rebuild(), 2)
+        kinds = [kind for _, kind, _ in search.search("wien")]
+        self.assertEqual(kinds, ['uitvoerders'])
+
+    def test_limit_per_kind(self):
+        # More komposities match than the limit for all kinds together, the matching CD is still found.
+        komponist = Komponist.update(naam="Mahler", voornaam="Gustav")['nid']
+        with unit_of_work():
+            for nr in range(12):
+                Kompositie.update(naam=f"Symfonie {nr}", komponist_id=komponist)
+        # The long title ranks lower than all komposities.
+        titel = "Verzamelde werken met liederen, concerten, kamermuziek en symfonieën van het orkest"
+        Cd.update(titel=titel, identificatie="", uitgever_id='-1')
+        results = {kind: rows for _, kind, rows in search.search("symfon", limit=2)}
+        self.assertEqual(len(results['kompositie']), 2)
+        self.assertEqual([row['label'] for row in results['cd']], [titel])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+This procedure will test the SQLite connection setup.
+"""
+
+import os
+import tempfile
+import unittest
+
+from base import AppTestCase
+from config import TestConfig
+from klamu import db
+from klamu.lib import sqlite
+from klamu.lib.db_model import init_session
+from sqlalchemy import text
+
+DBDIR = tempfile.mkdtemp()
+
+
+class SqliteConfig(TestConfig):
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(DBDIR, 'klamu.db')}"
+
+
+class TestSqlite(AppTestCase):
+    config = SqliteConfig
+
+    def test_statements(self):
+        statements = sqlite.pragma_statements(dict(temp_store='MEMORY', journal_mode='WAL', cache_size=None))
+        self.assertEqual(statements, ["PRAGMA journal_mode = WAL", "PRAGMA temp_store = MEMORY"])
+
+    def test_settings(self):
+        settings = sqlite.settings(db.engine)
+        self.assertEqual(settings['journal_mode'], 'wal')
+        self.assertEqual(settings['synchronous'], 1)
+        self.assertEqual(settings['busy_timeout'], 5000)
+        self.assertEqual(settings['cache_size'], -20000)
+        self.assertEqual(settings['temp_store'], 2)
+        self.assertIn(db.engine, sqlite.configured)
+
+    def test_init_session(self):
+        session = init_session(os.path.join(DBDIR, 'script.db'))
+        self.assertEqual(session.execute(text("PRAGMA journal_mode")).scalar(), 'wal')
+        session.close()
+        session.get_bind().dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
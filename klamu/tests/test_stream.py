@@ -0,0 +1,91 @@
+"""
+This procedure will test the streamed list pages.
+"""
+
+import unittest
+
+from base import AppTestCase
+from config import Config, TestConfig
+from klamu import db
+from klamu.lib import synthetic
+from klamu.lib.db_model import *
+from sqlalchemy import event
+
+# List pages with all rows in the page.
+PAGES = ['/cds', '/dirigenten', '/komponisten', '/komposities', '/uitgevers', '/uitvoerders', '/uitvoeringen']
+
+
+class StreamConfig(TestConfig):
+    DATATABLES_SERVER_SIDE = False
+    STREAM_ROUTES = Config.STREAM_ROUTES
+    STREAM_ROWS = 20
+    STREAM_BUFFER = 5
+    PAGE_CACHE_SIZE = 0
+
+
+class TestStream(AppTestCase):
+    config = StreamConfig
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+        self.statements = 0
+        event.listen(db.engine, 'before_cursor_execute', self.count)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count)
+        super().tearDown()
+
+    def count(self, *args, **kwargs):
+        self.statements += 1
+
+    def get(self, url, stream=True):
+        """
+        Request a page streamed or rendered at once, and return the body and the number of SQL statements.
+        """
+        self.app.config['STREAM_ROUTES'] = StreamConfig.STREAM_ROUTES if stream else []
+        self.statements = 0
+        response = self.client.get(url)
+        body = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, 200, url)
+        # A streamed page has no content length, the length is not known when the headers are sent.
+        self.assertEqual('Content-Length' not in response.headers, stream, url)
+        return body, self.statements
+
+    def catalog(self, uitvoeringen):
+        db.drop_all()
+        db.create_all()
+        synthetic.generate(uitvoeringen, report=lambda msg: None)
+        db.session.remove()
+
+    def test_body(self):
+        self.catalog(60)
+        nid = db.session.execute(select(Komponist.id).order_by(Komponist.items_cnt.desc())).scalar()
+        for url in PAGES + [f'/komponist/{nid}']:
+            body, _ = self.get(url)
+            self.assertEqual(body, self.get(url, stream=False)[0], url)
+            self.assertIn('</html>', body, url)
+
+    def test_flash(self):
+        with self.client.session_transaction() as session:
+            session['_flashes'] = [('info', 'Uitvoering is aangepast.'), ('error', 'Komponist is niet gevonden.')]
+        body, _ = self.get('/uitvoeringen')
+        self.assertIn('Uitvoering is aangepast.', body)
+        self.assertIn('Komponist is niet gevonden.', body)
+        # The flashed messages are removed from the session before the page is streamed.
+        body, _ = self.get('/uitvoeringen')
+        self.assertNotIn('Uitvoering is aangepast.', body)
+
+    def test_statements(self):
+        # The number of statements does not depend on the number of rows: the rows are fetched in chunks, with the
+        # relations eager loaded.
+        counts = {}
+        for uitvoeringen in (40, 200):
+            self.catalog(uitvoeringen)
+            counts[uitvoeringen] = {url: self.get(url)[1] for url in PAGES}
+        for url in PAGES:
+            self.assertLessEqual(counts[200][url], counts[40][url] + 200 // StreamConfig.STREAM_ROWS, url)
+
+
+if __name__ == "__main__":
+    unittest.main()
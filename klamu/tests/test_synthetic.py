@@ -0,0 +1,43 @@
+"""
+This procedure will test the synthetic catalog.
+"""
+
+import unittest
+
+from base import AppTestCase
+from klamu import db
+from klamu.lib import search, synthetic
+from klamu.lib.db_model import *
+from sqlalchemy import func, select
+
+
+class TestSynthetic(AppTestCase):
+
+    def test_catalog(self):
+        # The same arguments give the same catalog, another seed gives another catalog.
+        first = synthetic.catalog(500, seed=3)
+        self.assertEqual(first, synthetic.catalog(500, seed=3))
+        self.assertNotEqual(first['uitvoering'][1], synthetic.catalog(500, seed=4)['uitvoering'][1])
+        self.assertEqual(len(first['uitvoering'][1]), 500)
+        self.assertEqual(len(first['kompositie'][1]), 100)
+        self.assertEqual(len(first['komponist'][1]), synthetic.MINIMUM)
+        # Names are unique, also when there are more records than combinations of the name parts.
+        names = [row['naam'] for row in synthetic.catalog(20000)['uitvoerders'][1]]
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_generate(self):
+        counts = synthetic.generate(1000, report=lambda msg: None)
+        self.assertEqual(counts['uitvoering'], 1000)
+        self.assertEqual(db.session.execute(select(func.count()).select_from(Uitvoering)).scalar(), 1000)
+        # Counters and search index are filled.
+        self.assertEqual(db.session.execute(select(func.sum(Cd.items_cnt))).scalar(), 1000)
+        self.assertEqual(db.session.execute(select(func.sum(Komponist.komposities_cnt))).scalar(),
+                         counts['kompositie'])
+        self.assertTrue(search.search('symfonie'))
+        # The catalog is only added to an empty database.
+        with self.assertRaises(ValueError):
+            synthetic.generate(1000, report=lambda msg: None)
+
+
+if __name__ == "__main__":
+    unittest.main()
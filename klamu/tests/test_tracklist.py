@@ -0,0 +1,62 @@
+"""
+This procedure will test the tracklist editor of a CD.
+"""
+
+import io
+import unittest
+
+from base import AppTestCase
+from klamu.lib import importer
+from klamu.lib.db_model import *
+
+TRACKLIST = """cd_titel;cd_identificatie;uitgever;volgnummer;komponist_naam;komponist_voornaam;kompositie;uitvoerders
+Symfonieën;DG 1;DG;1;Brahms;Johannes;Symfonie 1;Berliner Philharmoniker
+Symfonieën;DG 1;DG;2;Brahms;Johannes;Symfonie 2;Berliner Philharmoniker
+Symfonieën;DG 1;DG;3;Beethoven;Ludwig van;Symfonie 5;Wiener Philharmoniker
+"""
+
+
+class TestTracklist(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        importer.Importer(report=lambda msg: None).run(importer.read_rows(io.StringIO(TRACKLIST), 'csv'))
+        self.cd = Cd.query.one()
+
+    def tracks(self):
+        return [dict(id=row.id, volgnummer=row.volgnummer, kompositie_id=row.kompositie_id,
+                     uitvoerders_id=row.uitvoerders_id, dirigent_id=row.dirigent_id)
+                for row in Uitvoering.query.filter_by(cd_id=self.cd.id).order_by(Uitvoering.volgnummer)]
+
+    def test_update_tracklist(self):
+        tracks = self.tracks()
+        symfonie_5 = tracks[2]['kompositie_id']
+        tracks[0]['delete'] = True
+        tracks[1]['volgnummer'] = 5
+        tracks.append(dict(id=None, volgnummer=4, kompositie_id=symfonie_5, uitvoerders_id=-1, dirigent_id=-1))
+        tracks.append(dict(id=None, volgnummer=6, kompositie_id=-1, uitvoerders_id=-1, dirigent_id=-1))
+        res = Uitvoering.update_tracklist(self.cd.id, tracks, renumber=True)
+        self.assertEqual(res['status'], "success")
+        rows = [(row['volgnummer'], row['kompositie_id']) for row in self.tracks()]
+        self.assertEqual(rows, [(1, symfonie_5), (2, symfonie_5), (3, tracks[1]['kompositie_id'])])
+        self.assertEqual(Cd.query.one().items, 3)
+        self.assertEqual(Kompositie.query.filter_by(id=symfonie_5).one().items, 2)
+        brahms = Komponist.query.filter_by(naam="Brahms").one()
+        self.assertEqual(brahms.items, 1)
+        berliner = Uitvoerders.query.filter_by(naam="Berliner Philharmoniker").one()
+        self.assertEqual(berliner.items, 1)
+
+    def test_unchanged(self):
+        res = Uitvoering.update_tracklist(self.cd.id, self.tracks())
+        self.assertEqual(res['status'], "info")
+
+    def test_other_cd(self):
+        tracks = self.tracks()
+        tracks[0]['id'] = 999
+        res = Uitvoering.update_tracklist(self.cd.id, tracks)
+        self.assertEqual(res['status'], "error")
+        self.assertEqual(len(self.tracks()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+This procedure will test the unit of work for the model updates.
+"""
+
+import unittest
+
+from base import AppTestCase
+from klamu import db
+from klamu.lib.db_model import *
+from sqlalchemy import event
+
+
+class TestUnitOfWork(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.commits = 0
+        event.listen(db.session, 'after_commit', self.count_commit)
+
+    def tearDown(self):
+        event.remove(db.session, 'after_commit', self.count_commit)
+        super().tearDown()
+
+    def count_commit(self, session):
+        self.commits += 1
+
+    def test_single_call(self):
+        Dirigent.update(naam="Karajan", voornaam="Herbert von")
+        self.assertEqual(self.commits, 1)
+
+    def test_one_commit(self):
+        self.assertEqual(get_dirigent_pairs(), [])
+        with unit_of_work() as unit:
+            komponist = Komponist.update(naam="Brahms", voornaam="Johannes")
+            self.assertGreater(komponist['nid'], 0)
+            kompositie = Kompositie.update(naam="Symfonie 1", komponist_id=komponist['nid'])
+            dirigent = Dirigent.update(naam="Karajan", voornaam="Herbert von")
+            cd = Cd.update(titel="Symfonieën", identificatie="", uitgever_id='-1')
+            Uitvoering.update(volgnummer=1, cd_id=cd, kompositie_id=kompositie['nid'], uitvoerders_id=-1,
+                              dirigent_id=dirigent['nid'])
+            self.assertEqual(self.commits, 0)
+        self.assertEqual(self.commits, 1)
+        self.assertIn('komponist', unit['tables'])
+        self.assertEqual(get_versions()['uitvoering'][0], 1)
+        self.assertEqual(Komponist.query.one().items, 1)
+        # The choice list is invalidated after the commit.
+        self.assertEqual(len(get_dirigent_pairs()), 1)
+
+    def test_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with unit_of_work():
+                Dirigent.update(naam="Karajan", voornaam="Herbert von")
+                with unit_of_work():
+                    Uitvoerders.update(naam="Berliner Philharmoniker")
+                raise RuntimeError("Stop")
+        self.assertEqual(self.commits, 0)
+        self.assertEqual(Dirigent.query.count(), 0)
+        self.assertEqual(Uitvoerders.query.count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+This procedure will test the warmup of a new process and the gunicorn hooks.
+"""
+
+import os
+import runpy
+import tempfile
+import types
+import unittest
+
+# The base module sets the environment for config.
+import base
+from config import TestConfig
+from klamu import create_app, db
+from klamu.lib import choices, migrations, synthetic, warmup
+
+DBDIR = tempfile.mkdtemp()
+GUNICORN_CONF = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, 'gunicorn.conf.py')
+
+
+class WarmupConfig(TestConfig):
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(DBDIR, 'warmup.db')}"
+
+
+class TestWarmup(unittest.TestCase):
+
+    def setUp(self):
+        # Initialize Environment
+        self.app = create_app(WarmupConfig)
+        with self.app.app_context():
+            migrations.upgrade()
+            synthetic.generate(50, report=lambda msg: None)
+            db.session.remove()
+        choices.cache.clear()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            for engine in db.engines.values():
+                engine.dispose()
+        choices.cache.clear()
+
+    def test_warm(self):
+        result = warmup.warm(self.app, connections=3)
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['connections'], dict(default=3))
+        self.assertGreater(result['templates'], 0)
+        self.assertEqual(choices.cache.stats()['entries'], 4)
+        with self.app.app_context():
+            pool = db.engine.pool
+            self.assertEqual(pool.checkedin(), 3)
+            # A forked process drops the connections.
+            warmup.dispose(self.app)
+            self.assertEqual(db.engine.pool.checkedin(), 0)
+
+    def test_no_tables(self):
+        with self.app.app_context():
+            db.drop_all()
+        result = warmup.warm(self.app)
+        self.assertIsNotNone(result['error'])
+        self.assertEqual(choices.cache.stats()['entries'], 0)
+
+    def test_gunicorn_hooks(self):
+        conf = runpy.run_path(GUNICORN_CONF)
+        self.assertTrue(conf['preload_app'])
+        self.assertGreater(conf['max_requests'], 0)
+        messages = []
+        worker = types.SimpleNamespace(pid=os.getpid(), wsgi=self.app, app=types.SimpleNamespace(wsgi=lambda: self.app),
+                                       cfg=types.SimpleNamespace(threads=2),
+                                       log=types.SimpleNamespace(info=messages.append))
+        conf['post_fork'](types.SimpleNamespace(cfg=types.SimpleNamespace(preload_app=True)), worker)
+        conf['post_worker_init'](worker)
+        self.assertEqual(len(messages), 1)
+        with self.app.app_context():
+            self.assertEqual(db.engine.pool.checkedin(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()